@@ -21,6 +21,8 @@ def mcp_tools_to_tool_list(tool_list: list[dict]) -> list:
     }
     for key, value in tool["inputSchema"]["properties"].items():
       tmp["function"]["parameters"]["properties"][key] = {"type": value["type"], "description": value["description"]}
+      if "items" in value:
+        tmp["function"]["parameters"]["properties"][key]["items"] = value["items"]
     res.append(tmp)
   return res
 
@@ -39,6 +39,12 @@ load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), "..", ".env"))
 message_history = {}
 conversation_context = {}  # Track general context (db or rag) per conversation
 
+# RAG and uploaded-table tools whose search scope is filled in from the conversation
+SCOPED_RAG_TOOLS = {"rag_query", "rag_query_many", "rag_ingestion_status"}
+SCOPED_TABLE_TOOLS = {"table_list_tables", "table_get_schema", "table_query_db"}
+# Maintenance tools and monitoring resources that are never offered to the LLM
+ADMIN_TOOLS = {"rag_delete_document", "rag_compact_collections_now", "rag_tune_index", "sql+db://sql/pool_stats", "sql+db://sql/stats"}
+
 # --- Global queue for processing messages asynchronously ---
 message_queue = asyncio.Queue()
 
@@ -107,6 +113,8 @@ def get_dynamic_sys_prompt(context_type=None, context_name=None):
        - Bạn PHẢI TRUY VẤN DỮ LIỆU liên quan trước tiên bằng cách sử dụng `sql_query_db` hoặc `rag_query`.
        - Sau khi có được dữ liệu, hãy định dạng phần 'data' của kết quả SQL/RAG (là một danh sách các danh sách hoặc danh sách các dict) thành một chuỗi JSON đại diện cho một danh sách các từ điển cho tham số `data_json` của `chart_create_chart`.
        - Đảm bảo rằng tên cột trong `data_json` (ví dụ: 'headers' từ kết quả SQL) được ánh xạ chính xác tới `x_column` và `y_column`.
+       - Với câu hỏi ước lượng, khám phá (ví dụ: 'khoảng bao nhiêu', 'tỷ trọng doanh thu theo vùng') trên bảng lớn, có thể gọi `sql_query_db` với `approximate` là true (nếu máy chủ bật chế độ này) để có kết quả ước tính nhanh kèm sai số (`error_bounds`); chỉ chạy lại với `approximate` là false khi người dùng cần số chính xác.
+       - Với nhiều dòng dữ liệu, có thể gọi `sql_query_db` với `result_format` là 'columnar' và truyền nguyên kết quả vào `data_json`, hoặc 'arrow' và truyền `arrow_ipc_base64` vào `data_arrow` (khi đó `data_json` là chuỗi rỗng).
        - Cung cấp `title`, `x_label` và `y_label` có ý nghĩa.
        - Sau khi tạo biểu đồ, hãy mô tả ngắn gọn biểu đồ cho người dùng.
        - Nếu câu hỏi ngụ ý dữ liệu dựa trên tài liệu (ví dụ: 'tóm tắt từ báo cáo'), hãy sử dụng `rag_query`.
@@ -128,30 +136,51 @@ def get_dynamic_sys_prompt(context_type=None, context_name=None):
 
     Các công cụ có sẵn:
     - `sql_query_db`: Thực thi các truy vấn SQL trên cơ sở dữ liệu
+    - `sql_query_many`: Chạy song song nhiều truy vấn SQL chỉ đọc độc lập (ví dụ: tổng theo năm, top sản phẩm và số lượng) trong một lần gọi
     - `list_databases`: Liệt kê các cơ sở dữ liệu có sẵn
     - `list_tables`: Liệt kê các bảng trong một cơ sở dữ liệu cụ thể
     - `get_schema`: Lấy schema của một cơ sở dữ liệu cụ thể
-    - `rag_query`: Truy vấn cơ sở kiến thức tài liệu
+    - `sql_get_relevant_schema`: Chỉ lấy các bảng và cột liên quan đến câu hỏi (ưu tiên dùng thay cho `get_schema` với cơ sở dữ liệu lớn)
+    - `rag_query`: Truy vấn cơ sở kiến thức tài liệu (tài liệu dùng chung và tệp tải lên trong cuộc trò chuyện này; đặt `scope` là "owner" để tìm cả trong các tệp người dùng đã tải lên ở cuộc trò chuyện khác)
+    - `rag_query_many`: Truy vấn nhiều câu hỏi con cùng lúc (ví dụ: so sánh doanh thu 2021, 2022, 2023) trong một lần gọi
+    - `rag_ingestion_status`: Xem tiến độ và thời gian còn lại của các tệp vừa tải lên đang được lập chỉ mục
     - `rag_get_collection_info`: Lấy thông tin về các bộ sưu tập tài liệu
     - `chart_create_chart`: Tạo các loại biểu đồ khác nhau (đường, cột, phân tán) từ dữ liệu được cung cấp
+    - `table_list_tables`: Liệt kê các bảng tạo từ tệp CSV/Excel/Parquet người dùng đã tải lên
+    - `table_get_schema`: Lấy các cột và kiểu dữ liệu của các bảng từ tệp tải lên
+    - `table_query_db`: Chạy truy vấn SQL (cú pháp DuckDB) trên các bảng từ tệp tải lên; dùng cho câu hỏi về dữ liệu trong tệp CSV/Excel/Parquet
 
     TÊN GỌI CÔNG CỤ (cho LLM):
     - `sql_query_db`
+    - `sql_query_many`
     - `sql+db://sql/list_databases`
     - `sql+db://sql/list_tables/{db_name}`
     - `sql+db://sql/schema/{db_name}`
+    - `sql_get_relevant_schema`
     - `rag_query`
+    - `rag_query_many`
+    - `rag_ingestion_status`
     - `rag_get_collection_info`
     - `chart_create_chart`
+    - `table_list_tables`
+    - `table_get_schema`
+    - `table_query_db`
 
     Tên gọi công cụ hợp lệ (chỉ khớp chính xác):
     - `sql_query_db`
+    - `sql_query_many`
     - `sql+db://sql/list_databases`
     - `sql+db://sql/list_tables/{db_name}`
     - `sql+db://sql/schema/{db_name}`
+    - `sql_get_relevant_schema`
     - `rag_query`
+    - `rag_query_many`
+    - `rag_ingestion_status`
     - `rag_get_collection_info`
     - `chart_create_chart`
+    - `table_list_tables`
+    - `table_get_schema`
+    - `table_query_db`
 
     QUY TRÌNH LÀM VIỆC (LLM PHẢI TUÂN THỦ):
     1. Phân tích câu hỏi và lịch sử hội thoại để suy luận ý định của người dùng.
@@ -231,7 +260,7 @@ class AISocketServer:
 
             return [ErrorResult(str(e))]
 
-    async def execute_tool_calls_parallel(self, tool_calls, client, tool_lookup):
+    async def execute_tool_calls_parallel(self, tool_calls, client, tool_lookup, conversation_id=None):
         """Execute multiple tool calls in parallel for better performance"""
         chart_base64_data = None  # Initialize outside to capture chart data
         
@@ -251,6 +280,13 @@ class AISocketServer:
                     "tool_call_id": tool_call.id,
                 }
 
+            # Document and uploaded-table search is scoped by the current conversation, never by a user the LLM names;
+            # rag tools add shared documents and, with scope="owner", the conversation user's other uploads
+            if tool_name in SCOPED_RAG_TOOLS | SCOPED_TABLE_TOOLS and isinstance(arguments, dict):
+                arguments.pop("user_id", None)
+                if conversation_id is not None:
+                    arguments["conversation_id"] = str(conversation_id)
+
             if tool_name not in tool_lookup:
                 logger.error(f"Unknown tool name: {tool_name}")
                 return {
@@ -465,6 +501,8 @@ class AISocketServer:
 
             tools_formatted = []
             for tool in tool_list:
+                if tool.name in ADMIN_TOOLS:
+                    continue
                 try:
                     tool_dict = json.loads(tool.model_dump_json())
                     tools_formatted.append(tool_dict)
@@ -473,6 +511,8 @@ class AISocketServer:
 
             resources_formatted = []
             for resource in resource_list:
+                if str(resource.uri) in ADMIN_TOOLS:
+                    continue
                 try:
                     resource_dict = json.loads(resource.model_dump_json())
                     resources_formatted.append(resource_dict)
@@ -604,7 +644,7 @@ class AISocketServer:
                     start_tool_execution = time.time() # Added for logging
                     # Execute all tool calls in parallel and capture chart data
                     tool_results, captured_chart_data = await self.execute_tool_calls_parallel(
-                        choice.message.tool_calls, client, tool_lookup
+                        choice.message.tool_calls, client, tool_lookup, conversation_id
                     )
                     logger.info(f"Tool execution completed in {time.time() - start_tool_execution:.2f} seconds") # Added for logging
 
@@ -0,0 +1,181 @@
+"""Offline benchmark of the Chroma HNSW index used by rag_mcp.
+
+Builds synthetic corpora, compares HNSW results against exact NumPy search
+and reports recall@k, query latency, build time and on-disk index size for
+each combination of HNSW parameters, PCA size and re-ranking copy.
+
+    python benchmark_ann.py --sizes 10000 100000 --m 16 32 --ef-search 50 100 200
+    python benchmark_ann.py --sizes 100000 --pca-dims 0 256 128 --rerank none float16 int8
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import chromadb
+import numpy as np
+from chromadb.api.client import SharedSystemClient
+
+from embedding_compression import QUANTIZED_DTYPES, PCAProjection, dequantize, normalize, quantize
+
+
+def make_vectors(n, dim, n_clusters, rng, centers=None):
+    """Unit vectors scattered around cluster centers, closer to real embeddings than uniform noise."""
+    if centers is None:
+        centers = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), n)] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors, centers
+
+
+def exact_neighbors(corpus, queries, k, block_size=256):
+    """Indices of the k nearest corpus vectors of each query by brute force, nearest first."""
+    neighbors = np.empty((len(queries), k), dtype=np.int64)
+    for start in range(0, len(queries), block_size):
+        # For unit vectors the largest dot product is the smallest L2 distance.
+        scores = queries[start:start + block_size] @ corpus.T
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+        neighbors[start:start + block_size] = np.take_along_axis(top, order, axis=1)
+    return neighbors
+
+
+def directory_size(path):
+    return sum(
+        os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names
+    )
+
+
+def build_index(path, corpus, max_neighbors, ef_construction):
+    """Load the corpus into a fresh persistent collection. Returns the build time in seconds."""
+    client = chromadb.PersistentClient(path=path)
+    target = client.create_collection(
+        "benchmark",
+        embedding_function=None,
+        configuration={"hnsw": {"max_neighbors": max_neighbors, "ef_construction": ef_construction}}
+    )
+    batch_size = client.get_max_batch_size()
+    started = time.perf_counter()
+    for start in range(0, len(corpus), batch_size):
+        batch = corpus[start:start + batch_size]
+        target.add(ids=[str(i) for i in range(start, start + len(batch))], embeddings=batch)
+    return time.perf_counter() - started
+
+
+def rerank_copies(corpus, dtype):
+    """Dequantized full-dimension copies as rag_mcp keeps them for re-scoring, and their size in bytes."""
+    if dtype == "none":
+        return None, 0
+    encoded = [quantize(vector, dtype) for vector in corpus]
+    copies = np.stack([dequantize(data, scale, dtype) for data, scale in encoded])
+    return normalize(copies), sum(len(data) for data, _ in encoded)
+
+
+def evaluate(path, index_queries, queries, truth, k, ef_search, copies=None, oversample=3):
+    """Recall@k against the exact neighbours and single query latency percentiles in milliseconds.
+
+    index_queries are the queries in the space the index was built in; with
+    copies, k * oversample candidates are re-scored against them.
+    """
+    client = chromadb.PersistentClient(path=path)
+    client.get_collection("benchmark").modify(configuration={"hnsw": {"ef_search": ef_search}})
+    # Search ef is only read when the index is loaded, so reopen it.
+    SharedSystemClient.clear_system_cache()
+    target = chromadb.PersistentClient(path=path).get_collection("benchmark")
+    hits = 0
+    latencies = []
+    for index_query, query, expected in zip(index_queries, queries, truth):
+        started = time.perf_counter()
+        result = target.query(
+            query_embeddings=[index_query], n_results=k * oversample if copies is not None else k, include=[]
+        )
+        ids = np.array(list(map(int, result["ids"][0])))
+        if copies is not None:
+            ids = ids[np.argsort(-(copies[ids] @ query))[:k]]
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += len(set(ids.tolist()) & set(expected.tolist()))
+    return {
+        "recall": hits / (len(queries) * k),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95))
+    }
+
+
+def run(args):
+    rng = np.random.default_rng(args.seed)
+    results = []
+    for size in args.sizes:
+        corpus, centers = make_vectors(size, args.dim, args.clusters, rng)
+        queries, _ = make_vectors(args.queries, args.dim, args.clusters, rng, centers)
+        truth = exact_neighbors(corpus, queries, args.k)
+        for pca_dims in args.pca_dims:
+            if pca_dims:
+                projection = PCAProjection.fit(corpus[:args.pca_sample], pca_dims)
+                indexed, index_queries = projection.transform(corpus), projection.transform(queries)
+            else:
+                indexed, index_queries = corpus, queries
+            for max_neighbors in args.m:
+                for ef_construction in args.ef_construction:
+                    path = tempfile.mkdtemp(prefix="ann_benchmark_")
+                    try:
+                        build_seconds = build_index(path, indexed, max_neighbors, ef_construction)
+                        index_bytes = directory_size(path)
+                        for rerank in args.rerank:
+                            copies, copy_bytes = rerank_copies(corpus, rerank)
+                            for ef_search in args.ef_search:
+                                row = {
+                                    "size": size,
+                                    "dim": args.dim,
+                                    "pca_dims": pca_dims,
+                                    "rerank": rerank,
+                                    "max_neighbors": max_neighbors,
+                                    "ef_construction": ef_construction,
+                                    "ef_search": ef_search,
+                                    "build_seconds": build_seconds,
+                                    "index_mb": index_bytes / 2 ** 20,
+                                    "rerank_mb": copy_bytes / 2 ** 20,
+                                    **evaluate(
+                                        path, index_queries, queries, truth, args.k, ef_search, copies, args.oversample
+                                    )
+                                }
+                                results.append(row)
+                                print(
+                                    f"n={size:>8} pca={pca_dims or args.dim:>5} rerank={rerank:>7} "
+                                    f"M={max_neighbors:>3} ef_c={ef_construction:>4} ef_s={ef_search:>4} "
+                                    f"recall@{args.k}={row['recall']:.3f} p50={row['p50_ms']:.2f}ms "
+                                    f"p95={row['p95_ms']:.2f}ms build={build_seconds:.1f}s "
+                                    f"index={row['index_mb']:.1f}MB rerank_copy={row['rerank_mb']:.1f}MB",
+                                    flush=True
+                                )
+                    finally:
+                        shutil.rmtree(path, ignore_errors=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000], help="Corpus sizes, up to 1000000.")
+    parser.add_argument("--dim", type=int, default=1024, help="Vector dimension; text-embedding-v3 returns 1024.")
+    parser.add_argument("--clusters", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--m", type=int, nargs="+", default=[16], help="HNSW M (max_neighbors) values.")
+    parser.add_argument("--ef-construction", type=int, nargs="+", default=[100])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[10, 50, 100, 200])
+    parser.add_argument("--pca-dims", type=int, nargs="+", default=[0], help="PCA sizes to index at; 0 indexes full vectors.")
+    parser.add_argument("--pca-sample", type=int, default=10_000, help="Vectors the PCA projection is fitted on.")
+    parser.add_argument("--rerank", nargs="+", default=["none"], choices=["none", *QUANTIZED_DTYPES],
+                        help="Full-dimension copy used to re-score candidates.")
+    parser.add_argument("--oversample", type=int, default=3, help="Candidates fetched per result when re-scoring.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the results to this JSON file.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    run(parse_args())
@@ -0,0 +1,132 @@
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter
+
+# Codes, numbers and words, keeping inner separators so "HPG", "VN30",
+# "1.234,5" and "2021-2022" stay single tokens.
+TOKEN_PATTERN = re.compile(r"\w+(?:[.,/-]\w+)*")
+
+
+def strip_accents(text: str) -> str:
+    """Remove Vietnamese diacritics so unaccented queries match accented text."""
+    text = text.replace("đ", "d").replace("Đ", "D")
+    decomposed = unicodedata.normalize("NFD", text)
+    return "".join(c for c in decomposed if unicodedata.category(c) != "Mn")
+
+
+def tokenize(text: str) -> list:
+    """Split Vietnamese text into index terms.
+
+    Vietnamese words are made of space separated syllables, so besides each
+    syllable we emit syllable bigrams ("doanh_thu") and accent-stripped
+    variants of both.
+    """
+    syllables = TOKEN_PATTERN.findall(unicodedata.normalize("NFC", text).lower())
+    terms = []
+    for i, syllable in enumerate(syllables):
+        terms.append(syllable)
+        if i > 0:
+            terms.append(f"{syllables[i - 1]}_{syllable}")
+    plain_terms = [strip_accents(term) for term in terms]
+    return terms + [plain for term, plain in zip(terms, plain_terms) if plain != term]
+
+
+class BM25Index:
+    """In-memory inverted index scored with Okapi BM25, safe to update while searching."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings = {}
+        self._doc_terms = {}
+        self._doc_lengths = {}
+        self._doc_scopes = {}
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._doc_terms)
+
+    def ids(self):
+        with self._lock:
+            return list(self._doc_terms)
+
+    def add(self, ids, documents, metadatas=None):
+        """Index documents, replacing any previous version with the same id.
+
+        metadatas holds the fields search() can filter on, one dict per document.
+        """
+        metadatas = metadatas or [None] * len(ids)
+        with self._lock:
+            for doc_id, document, metadata in zip(ids, documents, metadatas):
+                self._remove(doc_id)
+                if metadata:
+                    self._doc_scopes[doc_id] = metadata
+                terms = Counter(tokenize(document or ""))
+                self._doc_terms[doc_id] = terms
+                self._doc_lengths[doc_id] = sum(terms.values())
+                self._total_length += self._doc_lengths[doc_id]
+                for term, tf in terms.items():
+                    self._postings.setdefault(term, {})[doc_id] = tf
+
+    def remove(self, ids):
+        with self._lock:
+            for doc_id in ids:
+                self._remove(doc_id)
+
+    def _remove(self, doc_id):
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        self._total_length -= self._doc_lengths.pop(doc_id)
+        self._doc_scopes.pop(doc_id, None)
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+
+    def _in_scope(self, doc_id, where):
+        scope = self._doc_scopes.get(doc_id, {})
+        clauses = [where] if isinstance(where, dict) else where
+        return any(all(scope.get(key) == value for key, value in clause.items()) for clause in clauses)
+
+    def search(self, query: str, k: int, where=None) -> list:
+        """Return up to k (id, score) pairs, best first.
+
+        where restricts results to documents whose metadata equals every given
+        field; with a list of such dicts, any one of them may match.
+        """
+        query_terms = set(tokenize(query))
+        with self._lock:
+            n_docs = len(self._doc_terms)
+            if n_docs == 0 or not query_terms:
+                return []
+            avg_length = self._total_length / n_docs
+            scores = {}
+            for term in query_terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                df = len(postings)
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                for doc_id, tf in postings.items():
+                    if where and not self._in_scope(doc_id, where):
+                        continue
+                    length = self._doc_lengths[doc_id]
+                    norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+
+def reciprocal_rank_fusion(rankings, k: int = 60) -> list:
+    """Fuse several ranked id lists into one, best first."""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
@@ -0,0 +1,63 @@
+import time
+
+from bm25_index import BM25Index
+from rag_scope import scope_of
+
+# Chunks carry the time they were written, and a collection's metadata the
+# time of its last write (changed_at) and last delete (deleted_at), so a
+# process sharing the Chroma server can bring its lexical index up to date
+# without reloading it.
+WRITTEN_FIELD = "written"
+# Chunks written this long before the last change seen are fetched again, in
+# case the clocks of the writing processes differ.
+CLOCK_SKEW_SECONDS = 60
+
+
+def stamp_chunks(metadatas, stamp=None):
+    """Chunk metadatas marked as written at stamp (now by default)."""
+    stamp = time.time() if stamp is None else stamp
+    return [dict(metadata, **{WRITTEN_FIELD: stamp}) for metadata in metadatas]
+
+
+def collection_stamps(target):
+    """(last write, last delete) recorded in a collection's metadata."""
+    metadata = target.metadata or {}
+    return metadata.get("changed_at", 0), metadata.get("deleted_at", 0)
+
+
+def _pages(target, page_size, **request):
+    offset = 0
+    while True:
+        page = target.get(limit=page_size, offset=offset, **request)
+        if not page["ids"]:
+            return
+        yield page
+        offset += len(page["ids"])
+
+
+def load_index(target, page_size=1000):
+    """Build the lexical index of a collection. Returns (index, stamps) for refresh_index."""
+    stamps = collection_stamps(target)
+    index = BM25Index()
+    for page in _pages(target, page_size, include=["documents", "metadatas"]):
+        index.add(page["ids"], page["documents"], [scope_of(metadata or {}) for metadata in page["metadatas"]])
+    return index, stamps
+
+
+def refresh_index(index, target, stamps, page_size=1000):
+    """Apply the chunks written or deleted since stamps to index. Returns the stamps it is now up to date with.
+
+    target must be a freshly fetched handle, so its metadata is current.
+    """
+    current = collection_stamps(target)
+    changed_at, deleted_at = stamps
+    if current[0] != changed_at:
+        written = {WRITTEN_FIELD: {"$gt": changed_at - CLOCK_SKEW_SECONDS}}
+        for page in _pages(target, page_size, where=written, include=["documents", "metadatas"]):
+            index.add(page["ids"], page["documents"], [scope_of(metadata or {}) for metadata in page["metadatas"]])
+    if current[1] != deleted_at:
+        live = set()
+        for page in _pages(target, page_size, include=[]):
+            live.update(page["ids"])
+        index.remove([doc_id for doc_id in index.ids() if doc_id not in live])
+    return current
@@ -9,6 +9,7 @@ import base64 # Không còn cần thiết nếu chỉ trả về link, nhưng v
 from fastmcp import FastMCP
 from typing import Annotated, Literal
 from pydantic import Field
+from result_encoding import decode_arrow, decode_columnar
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -23,22 +24,29 @@ os.makedirs(CHART_OUTPUT_DIR, exist_ok=True) # Tạo thư mục nếu nó chưa
 
 @chart_mcp.tool()
 def create_chart(
-    data_json: Annotated[str, Field(description="JSON string of the data to plot. Expected format is a list of dictionaries, where each dictionary represents a row and keys are column names (e.g., [{'col1': 1, 'col2': 2}, {'col1': 3, 'col2': 4}]).")],
+    data_json: Annotated[str, Field(description="JSON string of the data to plot. Expected format is a list of dictionaries, where each dictionary represents a row and keys are column names (e.g., [{'col1': 1, 'col2': 2}, {'col1': 3, 'col2': 4}]), or a columnar sql_query_db result. Pass an empty string when data_arrow is given.")],
     chart_type: Annotated[Literal["line", "bar", "scatter"], Field(description="The type of chart to create (line, bar, or scatter).")],
     x_column: Annotated[str, Field(description="The name of the column to use for the X-axis.")],
     y_column: Annotated[str, Field(description="The name of the column to use for the Y-axis.")],
     title: Annotated[str, Field(description="The title of the chart.")],
     x_label: Annotated[str, Field(description="The label for the X-axis.", default="")],
-    y_label: Annotated[str, Field(description="The label for the Y-axis.", default="")]
+    y_label: Annotated[str, Field(description="The label for the Y-axis.", default="")],
+    data_arrow: Annotated[str, Field(description="arrow_ipc_base64 of a sql_query_db result with result_format 'arrow', instead of data_json.", default="")]
 ) -> dict:
     """
     Creates a chart (line, bar, or scatter) from provided data and saves it as a PNG image file.
     Returns the file path of the generated image.
-    The data should be provided as a JSON string representing a list of dictionaries.
+    The data should be provided as a JSON string representing a list of dictionaries,
+    or as an Arrow IPC result from sql_query_db.
     """
     try:
-        data = json.loads(data_json)
-        df = pd.DataFrame(data)
+        if data_arrow:
+            df = decode_arrow(data_arrow)
+        else:
+            data = json.loads(data_json)
+            if isinstance(data, dict) and "columns" in data:
+                data = decode_columnar(data)
+            df = pd.DataFrame(data)
 
         if x_column not in df.columns or y_column not in df.columns:
             return {"error": f"Columns '{x_column}' or '{y_column}' not found in data."}
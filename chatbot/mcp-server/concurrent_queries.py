@@ -0,0 +1,27 @@
+import asyncio
+import time
+
+
+def distinct_queries(queries):
+    """The non-blank queries, stripped, each once and in the order first given."""
+    return [text for text in dict.fromkeys(query.strip() for query in queries) if text]
+
+
+async def run_concurrently(queries, run, timeout, timed_out):
+    """Run run(query, deadline) for every query at once, all against one deadline timeout seconds away.
+
+    Returns {"query": query, **response} per query, in the order given. A
+    query that raises gets an error entry of its own instead of failing the
+    others, and one that timed out gets timed_out(timeout), since it was the
+    shared limit that ran out rather than its own remaining time.
+    """
+    deadline = time.monotonic() + timeout
+    responses = await asyncio.gather(*(run(query, deadline) for query in queries), return_exceptions=True)
+    results = []
+    for query, response in zip(queries, responses):
+        if isinstance(response, Exception):
+            response = {"error": str(response)}
+        elif response.get("error_type") == "timeout":
+            response = timed_out(timeout)
+        results.append({"query": query, **response})
+    return results
@@ -0,0 +1,123 @@
+import sqlite3
+import threading
+
+import numpy as np
+
+QUANTIZED_DTYPES = ("float16", "int8")
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+class PCAProjection:
+    """Linear projection of embeddings onto their top principal components."""
+
+    def __init__(self, mean, components):
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.components = np.asarray(components, dtype=np.float32)
+
+    @property
+    def dimensions(self):
+        return self.components.shape[0]
+
+    @property
+    def input_dimensions(self):
+        return self.components.shape[1]
+
+    @classmethod
+    def fit(cls, vectors, dimensions):
+        vectors = normalize(vectors)
+        if dimensions > min(vectors.shape):
+            raise ValueError(f"Need at least {dimensions} vectors of {dimensions}+ dimensions to fit the projection")
+        mean = vectors.mean(axis=0)
+        _, _, vt = np.linalg.svd(vectors - mean, full_matrices=False)
+        return cls(mean, vt[:dimensions])
+
+    def transform(self, vectors):
+        """Project and re-normalize, so cosine distances stay meaningful in the reduced space."""
+        return normalize((normalize(vectors) - self.mean) @ self.components.T)
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            np.savez(f, mean=self.mean, components=self.components)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["mean"], data["components"])
+
+
+def quantize(vector, dtype):
+    """Encode one vector as (bytes, scale); int8 keeps a per-vector scale."""
+    vector = np.asarray(vector, dtype=np.float32)
+    if dtype == "float16":
+        return vector.astype(np.float16).tobytes(), 1.0
+    if dtype == "int8":
+        scale = float(np.abs(vector).max()) / 127 or 1.0
+        return np.round(vector / scale).astype(np.int8).tobytes(), scale
+    raise ValueError(f"Unsupported quantized dtype: {dtype}")
+
+
+def dequantize(data, scale, dtype):
+    return np.frombuffer(data, dtype=np.dtype(dtype)).astype(np.float32) * scale
+
+
+class RerankStore:
+    """Quantized full-dimension copies of stored embeddings, keyed by collection and chunk id.
+
+    The vector index can then hold reduced vectors while candidates are still
+    re-scored against the full embedding.
+    """
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS vectors ("
+                "collection TEXT NOT NULL, id TEXT NOT NULL, dtype TEXT NOT NULL, scale REAL NOT NULL, "
+                "data BLOB NOT NULL, PRIMARY KEY (collection, id))"
+            )
+
+    def put(self, collection, ids, vectors, dtype):
+        rows = []
+        for doc_id, vector in zip(ids, vectors):
+            data, scale = quantize(vector, dtype)
+            rows.append((collection, doc_id, dtype, scale, data))
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO vectors (collection, id, dtype, scale, data) VALUES (?, ?, ?, ?, ?)", rows
+            )
+
+    def get(self, collection, ids):
+        """Return {id: float32 vector} for the ids that have a stored copy."""
+        found = {}
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT id, dtype, scale, data FROM vectors WHERE collection = ? AND id IN ({','.join('?' * len(batch))})",
+                    [collection, *batch]
+                ).fetchall()
+                for doc_id, dtype, scale, data in rows:
+                    found[doc_id] = dequantize(data, scale, dtype)
+        return found
+
+    def delete(self, collection, ids=None):
+        """Delete the given ids of a collection, or all of its vectors."""
+        with self._lock, self._conn:
+            if ids is None:
+                self._conn.execute("DELETE FROM vectors WHERE collection = ?", (collection,))
+            else:
+                self._conn.executemany(
+                    "DELETE FROM vectors WHERE collection = ? AND id = ?", [(collection, doc_id) for doc_id in ids]
+                )
+
+    def stats(self):
+        with self._lock:
+            count, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM vectors").fetchone()
+        return {"vectors": count, "bytes": size}
@@ -0,0 +1,66 @@
+import queue
+import threading
+
+_DONE = object()
+
+
+def iter_chunk_batches(pages, splitter, source_name, file_metadata, batch_size):
+    """Split pages one at a time and yield (ids, documents, metadatas) batches of batch_size chunks."""
+    batch = ([], [], [])
+    chunk_index = 0
+    for page in pages:
+        for chunk in splitter.split_documents([page]):
+            metadata = dict(file_metadata, chunk=chunk_index)
+            if "page" in chunk.metadata:
+                metadata["page"] = chunk.metadata["page"] + 1
+            batch[0].append(f"{source_name}_chunk_{chunk_index}")
+            batch[1].append(chunk.page_content)
+            batch[2].append(metadata)
+            chunk_index += 1
+            if len(batch[0]) == batch_size:
+                yield batch
+                batch = ([], [], [])
+    if batch[0]:
+        yield batch
+
+
+def read_ahead(items, max_items):
+    """Iterate items produced by a background thread that stays at most max_items ahead.
+
+    An exception raised while producing is re-raised by the iterator, and
+    closing the iterator early stops the producer.
+    """
+    buffer = queue.Queue(maxsize=max_items)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put((item, None)):
+                    return
+            put((_DONE, None))
+        except Exception as e:
+            put((_DONE, e))
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        producer.join()
@@ -0,0 +1,172 @@
+import threading
+import time
+
+QUEUED = "queued"
+PROCESSING = "processing"
+DONE = "done"
+FAILED = "failed"
+
+
+class IngestionScheduler:
+    """Orders pending ingestion jobs and tracks their progress.
+
+    A job's priority is its effective size plus the bytes recently ingested for
+    the same owner, so small files go first while no single user monopolises
+    the worker. Waiting lowers the effective size (aging) and conversations
+    someone is actively waiting on jump the queue.
+    """
+
+    def __init__(self, aging_seconds=120.0, fair_half_life_seconds=600.0,
+                 default_bytes_per_second=100_000.0, retention_seconds=3600.0):
+        self.aging_seconds = aging_seconds
+        self.fair_half_life_seconds = fair_half_life_seconds
+        self.bytes_per_second = default_bytes_per_second
+        self.retention_seconds = retention_seconds
+        self._jobs = {}
+        self._served = {}
+        self._waiting = {}
+        self._lock = threading.Lock()
+
+    def submit(self, source, size_bytes, owner=None, conversation=None, run=None):
+        """Queue a job unless the same source is already queued or running. Returns True if queued."""
+        with self._lock:
+            job = self._jobs.get(source)
+            if job is not None and job["status"] in (QUEUED, PROCESSING):
+                job["run"] = run if job["status"] == QUEUED else job["run"]
+                return False
+            self._jobs[source] = {
+                "source": source,
+                "owner": owner,
+                "conversation": conversation,
+                "size_bytes": max(int(size_bytes or 0), 1),
+                "run": run,
+                "status": QUEUED,
+                "enqueued_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "chunks_done": 0,
+                "pages_done": 0,
+                "pages_total": None,
+                "error": None
+            }
+            return True
+
+    def _served_bytes(self, owner, now):
+        served, at = self._served.get(owner, (0.0, now))
+        return served * 0.5 ** ((now - at) / self.fair_half_life_seconds)
+
+    def _is_waited(self, conversation, now):
+        until = self._waiting.get(conversation)
+        return until is not None and until > now
+
+    def _priority(self, job, now):
+        effective_size = job["size_bytes"] / (1 + (now - job["enqueued_at"]) / self.aging_seconds)
+        waited = job["conversation"] is not None and self._is_waited(job["conversation"], now)
+        return (0 if waited else 1, self._served_bytes(job["owner"], now) + effective_size, job["enqueued_at"])
+
+    def _queued_in_order(self, now):
+        queued = [job for job in self._jobs.values() if job["status"] == QUEUED]
+        return sorted(queued, key=lambda job: self._priority(job, now))
+
+    def next_job(self):
+        """Take the highest priority queued job and mark it as processing, or return None."""
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            queued = self._queued_in_order(now)
+            if not queued:
+                return None
+            job = queued[0]
+            job["status"] = PROCESSING
+            job["started_at"] = now
+            return job
+
+    def report(self, source, chunks_done, pages_done=None, pages_total=None):
+        with self._lock:
+            job = self._jobs.get(source)
+            if job is None:
+                return
+            job["chunks_done"] = chunks_done
+            if pages_done is not None:
+                job["pages_done"] = pages_done
+            if pages_total is not None:
+                job["pages_total"] = pages_total
+
+    def finish(self, source, error=None):
+        now = time.time()
+        with self._lock:
+            job = self._jobs.get(source)
+            if job is None:
+                return
+            job["status"] = FAILED if error else DONE
+            job["error"] = str(error) if error else None
+            job["finished_at"] = now
+            job["run"] = None
+            self._served[job["owner"]] = (self._served_bytes(job["owner"], now) + job["size_bytes"], now)
+            elapsed = now - (job["started_at"] or now)
+            if not error and elapsed > 0:
+                self.bytes_per_second = 0.7 * self.bytes_per_second + 0.3 * job["size_bytes"] / elapsed
+
+    def mark_waiting(self, conversation, seconds=300.0):
+        """Boost the jobs of a conversation someone is waiting on for the next few minutes."""
+        if conversation:
+            with self._lock:
+                self._waiting[conversation] = time.time() + seconds
+
+    def pending(self, conversation):
+        with self._lock:
+            return any(
+                job["conversation"] == conversation and job["status"] in (QUEUED, PROCESSING)
+                for job in self._jobs.values()
+            )
+
+    def _expire(self, now):
+        for source in [
+            source for source, job in self._jobs.items()
+            if job["finished_at"] is not None and now - job["finished_at"] > self.retention_seconds
+        ]:
+            del self._jobs[source]
+        for conversation in [c for c, until in self._waiting.items() if until <= now]:
+            del self._waiting[conversation]
+
+    def _remaining_seconds(self, job):
+        fraction_left = 1.0
+        if job["status"] == PROCESSING and job["pages_total"]:
+            fraction_left = max(0.0, 1 - job["pages_done"] / job["pages_total"])
+        return job["size_bytes"] * fraction_left / self.bytes_per_second
+
+    def status(self, conversation=None, source=None):
+        """Progress and ETA of known jobs, optionally only those of a conversation or source."""
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            ahead = sum(
+                self._remaining_seconds(job) for job in self._jobs.values() if job["status"] == PROCESSING
+            )
+            eta = {}
+            for position, job in enumerate(self._queued_in_order(now), start=1):
+                ahead += self._remaining_seconds(job)
+                eta[job["source"]] = (position, ahead)
+
+            report = []
+            for job in self._jobs.values():
+                if conversation is not None and job["conversation"] != conversation:
+                    continue
+                if source is not None and job["source"] != source:
+                    continue
+                entry = {
+                    "source": job["source"],
+                    "status": job["status"],
+                    "chunks_done": job["chunks_done"],
+                    "pages_done": job["pages_done"],
+                    "pages_total": job["pages_total"]
+                }
+                if job["status"] == QUEUED:
+                    entry["queue_position"], eta_seconds = eta[job["source"]]
+                    entry["eta_seconds"] = round(eta_seconds, 1)
+                elif job["status"] == PROCESSING:
+                    entry["eta_seconds"] = round(self._remaining_seconds(job), 1)
+                elif job["status"] == FAILED:
+                    entry["error"] = job["error"]
+                report.append(entry)
+            return report
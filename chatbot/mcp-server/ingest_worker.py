@@ -0,0 +1,15 @@
+"""Ingestion and maintenance without an MCP server, for a shared Chroma server setup.
+
+Run one (or, with RAG_INGEST_SOURCE=minio, several) of these next to MCP
+servers started with RAG_INGEST_ENABLED=false, all with the same RAG_CHROMA_HOST.
+"""
+import os
+
+os.environ["RAG_INGEST_ENABLED"] = "true"
+
+import rag_mcp  # noqa: E402  starts the ingestion and maintenance threads
+
+if __name__ == "__main__":
+    if not rag_mcp.CHROMA_HOST:
+        rag_mcp.logger.warning("RAG_CHROMA_HOST is not set; MCP servers cannot share this worker's index")
+    rag_mcp.t1.join()
@@ -0,0 +1,59 @@
+import time
+
+
+class LeaseLost(Exception):
+    """Another worker took over the object after this worker's lease expired."""
+
+
+class ObjectLease:
+    """A worker's exclusive claim on an upload object, held in the object's checkpoint.
+
+    read(name) returns (checkpoint, etag), or (None, None) if there is none.
+    write(name, checkpoint, etag) stores the checkpoint only if the stored copy
+    still has that etag (or, for etag None, does not exist yet) and returns the
+    new etag, or None if another worker wrote it first. Every write is
+    conditional, so two workers can never both hold the lease.
+    """
+
+    def __init__(self, read, write, name, worker, lease_seconds, clock=time.time):
+        self.read = read
+        self.write = write
+        self.name = name
+        self.worker = worker
+        self.lease_seconds = lease_seconds
+        self.clock = clock
+        self.checkpoint = None
+        self.etag = None
+
+    def claim(self, object_etag):
+        """Take the object over and return its checkpoint, or None if another worker holds a live lease.
+
+        A checkpoint of an earlier version of the object starts over from
+        chunk 0; one already done for this version is returned without claiming.
+        """
+        checkpoint, etag = self.read(self.name)
+        if checkpoint is None or checkpoint.get("etag") != object_etag:
+            checkpoint = {"etag": object_etag, "chunks_done": 0}
+        elif checkpoint.get("status") == "done":
+            return checkpoint
+        elif (
+            checkpoint.get("status") == "processing"
+            and checkpoint.get("worker") != self.worker
+            and self.clock() - checkpoint.get("updated", 0) < self.lease_seconds
+        ):
+            return None
+        checkpoint.update(status="processing", worker=self.worker, updated=self.clock())
+        new_etag = self.write(self.name, checkpoint, etag)
+        if new_etag is None:
+            return None
+        self.checkpoint, self.etag = checkpoint, new_etag
+        return checkpoint
+
+    def save(self, **changes):
+        """Update the claimed checkpoint, renewing the lease. Raises LeaseLost if another worker took over."""
+        checkpoint = dict(self.checkpoint, **changes, updated=self.clock())
+        new_etag = self.write(self.name, checkpoint, self.etag)
+        if new_etag is None:
+            raise LeaseLost(f"{self.name} was taken over by another worker")
+        self.checkpoint, self.etag = checkpoint, new_etag
+        return checkpoint
@@ -0,0 +1,61 @@
+import asyncio
+
+
+class QueryBatcher:
+    """Collects queries submitted within a short window and searches them together.
+
+    search(requests) runs in a worker thread and returns one result per
+    request, in order. A window of 0 searches every query on its own.
+    """
+
+    def __init__(self, search, window_ms, max_batch):
+        self.search = search
+        self.window_seconds = window_ms / 1000
+        self.max_batch = max(1, max_batch)
+        self._pending = []
+        self._timer = None
+        # Flushed batches still being searched; the event loop keeps only weak references to tasks.
+        self._tasks = set()
+        self.stats = {"queries": 0, "batches": 0, "largest_batch": 0}
+
+    async def submit(self, *request):
+        if self.window_seconds <= 0:
+            self._record(1)
+            return (await asyncio.to_thread(self.search, [request]))[0]
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((request, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_seconds, self._flush)
+        return await future
+
+    def _record(self, size):
+        self.stats["queries"] += size
+        self.stats["batches"] += 1
+        self.stats["largest_batch"] = max(self.stats["largest_batch"], size)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        self._record(len(batch))
+        try:
+            results = await asyncio.to_thread(self.search, [request for request, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,113 @@
+import json
+
+# Plan nodes that need every input row before the first output row, so a LIMIT does not stop the scan early.
+BLOCKING_OPERATIONS = ("ordering_operation", "grouping_operation", "duplicates_removal", "windowing")
+# Full scans of tables smaller than this are not worth a suggestion.
+SMALL_TABLE_ROWS = 10000
+
+
+def _number(value, default=0.0):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def summarize_plan(plan) -> dict:
+    """Estimate the work of a statement from MySQL's EXPLAIN FORMAT=JSON output.
+
+    rows_examined sums, over every joined table, the rows read per scan times
+    the rows produced by the tables joined before it.
+    """
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    summary = {
+        "cost": _number(plan.get("query_block", {}).get("cost_info", {}).get("query_cost")),
+        "rows_examined": 0.0,
+        "tables": [],
+        "full_scans": [],
+        "cartesian_joins": [],
+        "blocking": False
+    }
+    _visit(plan, summary)
+    summary["rows_examined"] = int(summary["rows_examined"])
+    return summary
+
+
+def _visit(node, summary):
+    if isinstance(node, list):
+        for item in node:
+            _visit(item, summary)
+        return
+    if not isinstance(node, dict):
+        return
+    for key in BLOCKING_OPERATIONS:
+        operation = node.get(key)
+        if isinstance(operation, dict) and (
+            key == "windowing" or operation.get("using_filesort") or operation.get("using_temporary_table")
+        ):
+            summary["blocking"] = True
+    if "nested_loop" in node:
+        _join(node["nested_loop"], summary)
+    elif isinstance(node.get("table"), dict):
+        _join([node], summary)
+    for key, value in node.items():
+        if key not in ("nested_loop", "table"):
+            _visit(value, summary)
+
+
+def _join(items, summary):
+    prefix_rows = 1.0
+    for position, item in enumerate(items):
+        table = item.get("table") if isinstance(item, dict) else None
+        if not isinstance(table, dict):
+            _visit(item, summary)
+            continue
+        name = table.get("table_name", "?")
+        per_scan = _number(table.get("rows_examined_per_scan"))
+        summary["rows_examined"] += prefix_rows * per_scan
+        summary["tables"].append({
+            "table": name,
+            "access_type": table.get("access_type"),
+            "rows_per_scan": int(per_scan),
+            "filtered": _number(table.get("filtered"), 100.0)
+        })
+        if table.get("access_type") == "ALL":
+            summary["full_scans"].append(name)
+            if position > 0 and "attached_condition" not in table:
+                summary["cartesian_joins"].append(name)
+        prefix_rows = _number(table.get("rows_produced_per_join"), per_scan)
+        # Subqueries and materialized derived tables hang off the table node.
+        _visit(table, summary)
+
+
+def rows_until_limit(summary, limit):
+    """Rows read before a LIMIT is reached, or None if the LIMIT does not cut the scan short.
+
+    That holds for a single table read in plan order with nothing to sort,
+    group or deduplicate.
+    """
+    if summary["blocking"] or len(summary["tables"]) != 1:
+        return None
+    filtered = max(summary["tables"][0]["filtered"], 0.01)
+    return min(summary["rows_examined"], int(limit * 100 / filtered))
+
+
+def suggestions(summary) -> list:
+    """Ways to bring an expensive statement under the limits, for the model to act on."""
+    tips = []
+    for name in summary["cartesian_joins"]:
+        tips.append(f"Add a join condition for table `{name}`; it is joined without one (cartesian product).")
+    for table in summary["tables"]:
+        if (
+            table["access_type"] == "ALL" and table["rows_per_scan"] >= SMALL_TABLE_ROWS
+            and table["table"] not in summary["cartesian_joins"]
+        ):
+            tips.append(
+                f"Filter `{table['table']}` on an indexed column (e.g. its primary key or a date range); "
+                f"it is fully scanned (~{table['rows_per_scan']:,} rows)."
+            )
+    if summary["blocking"]:
+        tips.append("Sorting, grouping or DISTINCT over many rows needs them all; narrow the rows first with WHERE.")
+    tips.append("Aggregate in SQL (COUNT/SUM/AVG with GROUP BY) instead of returning raw rows, or query a smaller time range.")
+    return tips
@@ -0,0 +1,207 @@
+import math
+import re
+import zlib
+
+from sql_text import has_aggregate, strip_comments, without_terminator
+
+# Two-sided 95% normal quantile, for the error margins of estimates.
+CONFIDENCE = 0.95
+Z_SCORE = 1.96
+MAX_IDENTIFIER_LENGTH = 64
+
+QUOTED_PATTERN = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"", re.S)
+IDENTIFIER = r"(?:`[^`]+`|\w+)"
+TABLE_REFERENCE_PATTERN = re.compile(rf"\b(?:FROM|JOIN)\s+({IDENTIFIER}(?:\s*\.\s*{IDENTIFIER})?)", re.I)
+ALIAS_PATTERN = re.compile(rf"\s+(AS\s+)?({IDENTIFIER})", re.I)
+ALIASED_ITEM_PATTERN = re.compile(rf"^(.*\))\s*(?:AS\s+)?{IDENTIFIER}?$", re.I | re.S)
+ESTIMABLE_PATTERN = re.compile(r"^(SUM|COUNT|AVG)\s*\(", re.I)
+UNSUPPORTED_PATTERNS = (
+    (re.compile(r"\bUNION\b", re.I), "UNION is not supported"),
+    (re.compile(r"\bHAVING\b", re.I), "HAVING would filter on unscaled aggregates"),
+    (re.compile(r"\bOVER\s*\(", re.I), "window functions are not supported"),
+    (re.compile(r"^\s*SELECT\s+(?:ALL\s+)?DISTINCT\b", re.I), "SELECT DISTINCT is not supported"),
+)
+# Words that can follow a table reference but are not its alias.
+CLAUSE_KEYWORDS = {
+    "WHERE", "JOIN", "INNER", "LEFT", "RIGHT", "CROSS", "NATURAL", "STRAIGHT_JOIN", "FULL", "ON", "USING", "GROUP",
+    "ORDER", "LIMIT", "HAVING", "WINDOW", "UNION", "FOR", "LOCK", "USE", "IGNORE", "FORCE", "PARTITION", "INTO"
+}
+
+
+def mask_quoted(sql: str) -> str:
+    """sql with string literals blanked out, keeping every other character at its position."""
+    return QUOTED_PATTERN.sub(lambda m: "'" + "_" * (len(m.group(0)) - 2) + "'", sql)
+
+
+def top_level_positions(masked: str, pattern):
+    """Start positions of pattern matches outside any parentheses."""
+    depth, depths = 0, []
+    for char in masked:
+        if char == ")":
+            depth -= 1
+        depths.append(depth)
+        if char == "(":
+            depth += 1
+    return [m.start() for m in pattern.finditer(masked) if depths[m.start()] == 0]
+
+
+def split_top_level(text: str, masked: str) -> list:
+    cuts = top_level_positions(masked, re.compile(","))
+    bounds = zip([-1] + cuts, cuts + [len(text)])
+    return [text[start + 1:end].strip() for start, end in bounds]
+
+
+def closing_parenthesis(masked: str, start: int) -> int:
+    depth = 0
+    for position in range(start, len(masked)):
+        if masked[position] == "(":
+            depth += 1
+        elif masked[position] == ")":
+            depth -= 1
+            if depth == 0:
+                return position
+    return -1
+
+
+def estimable_aggregate(item: str):
+    """(function, argument) if a select item is exactly SUM/COUNT/AVG(expr) [AS alias], else None."""
+    match = ALIASED_ITEM_PATTERN.match(item)
+    expression = match.group(1) if match else item
+    call = ESTIMABLE_PATTERN.match(expression)
+    if not call:
+        return None
+    masked = mask_quoted(expression)
+    if closing_parenthesis(masked, call.end() - 1) != len(expression) - 1:
+        return None
+    argument = expression[call.end():-1].strip()
+    if re.match(r"DISTINCT\b", argument, re.I):
+        return None
+    return call.group(1).upper(), argument
+
+
+def plan_approximation(sql: str) -> dict:
+    """How to estimate an aggregate SELECT from a sample.
+
+    Select items are kept as written and helper aggregates for the variance
+    are appended after them. Raises ValueError with the reason if the query
+    cannot be estimated this way.
+    """
+    text = without_terminator(strip_comments(sql)).strip()
+    masked = mask_quoted(text)
+    if not re.match(r"SELECT\b", masked, re.I):
+        raise ValueError("only a single SELECT can be estimated")
+    if len(re.findall(r"\bSELECT\b", masked, re.I)) > 1:
+        raise ValueError("subqueries are not supported")
+    for pattern, reason in UNSUPPORTED_PATTERNS:
+        if pattern.search(masked):
+            raise ValueError(reason)
+    froms = top_level_positions(masked, re.compile(r"\bFROM\b", re.I))
+    if not froms:
+        raise ValueError("the query reads no table")
+    select_end = re.match(r"SELECT\b", masked, re.I).end()
+    items = split_top_level(text[select_end:froms[0]], masked[select_end:froms[0]])
+
+    kinds, helpers = [], []
+    for item in items:
+        if not has_aggregate(item):
+            kinds.append(("key",))
+            continue
+        aggregate = estimable_aggregate(item)
+        if aggregate is None:
+            raise ValueError(f"'{item}' is not a plain SUM, COUNT or AVG (MIN, MAX and DISTINCT cannot be estimated)")
+        function, argument = aggregate
+        position = len(items) + len(helpers)
+        if function == "COUNT":
+            kinds.append(("count",))
+        elif function == "SUM":
+            kinds.append(("sum", position))
+            helpers.append(f"SUM(({argument}) * ({argument}))")
+        else:
+            kinds.append(("avg", position, position + 1))
+            helpers.extend([f"SUM(({argument}) * ({argument}))", f"COUNT({argument})"])
+    if all(kind[0] == "key" for kind in kinds):
+        raise ValueError("it has no SUM, COUNT or AVG to estimate")
+    helper_columns = "".join(f", {helper} AS approx_helper_{i}" for i, helper in enumerate(helpers))
+    return {
+        "kinds": kinds,
+        "select": f"SELECT {', '.join(items)}{helper_columns} {text[froms[0]:]}",
+    }
+
+
+def table_references(sql: str) -> list:
+    """Tables named after FROM/JOIN: dicts with database (or None), table, span of the name and alias."""
+    references = []
+    masked = mask_quoted(sql)
+    for match in TABLE_REFERENCE_PATTERN.finditer(masked):
+        parts = [part.strip().strip("`") for part in match.group(1).split(".")]
+        alias = ALIAS_PATTERN.match(masked, match.end())
+        if alias and not alias.group(1) and alias.group(2).upper() in CLAUSE_KEYWORDS:
+            alias = None
+        references.append({
+            "database": parts[0] if len(parts) == 2 else None,
+            "table": parts[-1],
+            "span": match.span(1),
+            "alias": alias.group(2).strip("`") if alias else None
+        })
+    return references
+
+
+def substitute_table(sql: str, reference: dict, replacement: str) -> str:
+    """sql reading replacement where it read the referenced table, under the same name or alias."""
+    start, end = reference["span"]
+    alias = "" if reference["alias"] else f" AS `{reference['table']}`"
+    return f"{sql[:start]}{replacement}{alias}{sql[end:]}"
+
+
+def sample_table_name(database: str, table: str) -> str:
+    name = f"{database}__{table}"
+    if len(name) > MAX_IDENTIFIER_LENGTH:
+        name = f"{name[:MAX_IDENTIFIER_LENGTH - 9]}_{zlib.crc32(name.encode()):08x}"
+    return name
+
+
+def _number(value):
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def estimate(plan, headers, rows, scale):
+    """Scale aggregates computed over a sample with scale = population / sample rows.
+
+    Returns (headers, rows, margins): the select items' headers, the estimated
+    rows and, per aggregate column, the 95% margin of error of each row's
+    estimate. SUM and COUNT use the Horvitz-Thompson estimator under
+    Bernoulli sampling; AVG is the sample mean.
+    """
+    width = len(plan["kinds"])
+    margins = {headers[i]: [] for i, kind in enumerate(plan["kinds"]) if kind[0] != "key"}
+    estimated = []
+    for row in rows:
+        values = list(row[:width])
+        for i, kind in enumerate(plan["kinds"]):
+            if kind[0] == "key":
+                continue
+            value = _number(values[i])
+            variance = None
+            if value is None:
+                pass
+            elif kind[0] == "count":
+                values[i] = int(round(value * scale))
+                variance = scale * (scale - 1) * value
+            elif kind[0] == "sum":
+                values[i] = value * scale
+                squares = _number(row[kind[1]])
+                variance = None if squares is None else scale * (scale - 1) * squares
+            else:
+                values[i] = value
+                squares, count = _number(row[kind[1]]), _number(row[kind[2]])
+                if squares is not None and count and count > 1:
+                    sample_variance = max(squares - count * value * value, 0.0) / (count - 1)
+                    variance = (1 - 1 / scale) * sample_variance / count
+            margins[headers[i]].append(None if variance is None else Z_SCORE * math.sqrt(max(variance, 0.0)))
+        estimated.append(values)
+    return headers[:width], estimated, margins
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+
+from sql_text import normalize_sql
+
+# Latency histogram buckets grow by 2^(1/4), so percentiles are within about 10%.
+BUCKET_BASE = 2 ** 0.25
+MAX_FINGERPRINT_TEXT = 2000
+
+STRING_PATTERN = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"", re.S)
+NUMBER_PATTERN = re.compile(r"(?<![\w`])-?(?:0x[0-9a-f]+|\d+(?:\.\d*)?(?:e[+-]?\d+)?)\b", re.I)
+HINT_PATTERN = re.compile(r"/\*\+.*?\*/", re.S)
+LIST_PATTERN = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+VALUES_PATTERN = re.compile(r"\bvalues\s*\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+
+
+def query_fingerprint(sql: str) -> str:
+    """The shape of a statement: literals as ?, value lists collapsed, lower-cased, whitespace normalized."""
+    text = normalize_sql(HINT_PATTERN.sub(" ", sql))
+    text = STRING_PATTERN.sub("?", text)
+    text = NUMBER_PATTERN.sub("?", text).lower()
+    text = LIST_PATTERN.sub("(...)", text)
+    return VALUES_PATTERN.sub("values (...)", text)
+
+
+def fingerprint_id(fingerprint: str) -> str:
+    return hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()[:16]
+
+
+def _bucket(milliseconds):
+    return int(math.floor(math.log(max(milliseconds, 0.01), BUCKET_BASE)))
+
+
+def percentile(histogram, fraction):
+    """Approximate latency in ms below which fraction of the calls in a histogram finished."""
+    total = sum(histogram.values())
+    if not total:
+        return None
+    seen = 0
+    for bucket in sorted(histogram, key=int):
+        seen += histogram[bucket]
+        if seen >= fraction * total:
+            # Geometric middle of the bucket.
+            return round(BUCKET_BASE ** (int(bucket) + 0.5), 2)
+
+
+class QueryStats:
+    """Call counts, latency histograms, rows and errors per statement fingerprint.
+
+    At most max_fingerprints shapes are kept; when full, the least used tenth
+    makes room for new shapes. Saved to and restored from a JSON file.
+    """
+
+    def __init__(self, path, max_fingerprints=1000):
+        self.path = path
+        self.max_fingerprints = max_fingerprints
+        self._entries = {}
+        self._since = time.time()
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._load()
+
+    def record(self, sql, milliseconds, rows=0, error=False, timeout=False):
+        """Account one execution of sql; returns its fingerprint id."""
+        fingerprint = query_fingerprint(sql)
+        key = fingerprint_id(fingerprint)
+        bucket = str(_bucket(milliseconds))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                if len(self._entries) >= self.max_fingerprints:
+                    self._evict()
+                entry = self._entries[key] = {
+                    "fingerprint": fingerprint[:MAX_FINGERPRINT_TEXT],
+                    "calls": 0, "errors": 0, "timeouts": 0, "rows": 0,
+                    "total_ms": 0.0, "max_ms": 0.0, "histogram": {}, "first_seen": time.time()
+                }
+            entry["calls"] += 1
+            entry["errors"] += 1 if error else 0
+            entry["timeouts"] += 1 if timeout else 0
+            entry["rows"] += rows
+            entry["total_ms"] += milliseconds
+            entry["max_ms"] = max(entry["max_ms"], milliseconds)
+            entry["histogram"][bucket] = entry["histogram"].get(bucket, 0) + 1
+            entry["last_seen"] = time.time()
+            self._dirty = True
+        return key
+
+    def _evict(self):
+        ranked = sorted(self._entries, key=lambda k: (self._entries[k]["calls"], self._entries[k]["last_seen"]))
+        for key in ranked[:max(1, self.max_fingerprints // 10)]:
+            del self._entries[key]
+
+    def summary(self, key, entry) -> dict:
+        calls = entry["calls"]
+        return {
+            "id": key,
+            "fingerprint": entry["fingerprint"],
+            "calls": calls,
+            "p50_ms": percentile(entry["histogram"], 0.5),
+            "p95_ms": percentile(entry["histogram"], 0.95),
+            "p99_ms": percentile(entry["histogram"], 0.99),
+            "max_ms": round(entry["max_ms"], 2),
+            "total_ms": round(entry["total_ms"], 2),
+            "avg_rows": round(entry["rows"] / calls, 1),
+            "error_rate": round(entry["errors"] / calls, 4),
+            "timeouts": entry["timeouts"],
+            "last_seen": entry["last_seen"]
+        }
+
+    def top(self, limit=10) -> dict:
+        """The slowest (by p95 latency), most frequent and most time-consuming fingerprints."""
+        with self._lock:
+            summaries = [self.summary(key, dict(entry, histogram=dict(entry["histogram"]))) for key, entry in self._entries.items()]
+            since = self._since
+        return {
+            "since": since,
+            "fingerprints": len(summaries),
+            "calls": sum(item["calls"] for item in summaries),
+            "top_slow": sorted(summaries, key=lambda item: item["p95_ms"], reverse=True)[:limit],
+            "top_frequent": sorted(summaries, key=lambda item: item["calls"], reverse=True)[:limit],
+            "top_total_time": sorted(summaries, key=lambda item: item["total_ms"], reverse=True)[:limit]
+        }
+
+    def flush(self):
+        """Write the stats to disk if they changed since the last flush."""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps({"since": self._since, "entries": self._entries})
+            self._dirty = False
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + ".tmp", "w") as f:
+            f.write(data)
+        os.replace(self.path + ".tmp", self.path)
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            self._entries = data["entries"]
+            self._since = data["since"]
+        except (OSError, ValueError, KeyError):
+            pass
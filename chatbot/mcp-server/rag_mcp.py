@@ -1,15 +1,35 @@
+import asyncio
+import io
+import socket
 import threading
 import os
+import json
 import time
 import logging
+from contextlib import closing
 from fastmcp import FastMCP
 from langchain_community.document_loaders import PyMuPDFLoader
+from langchain_community.document_loaders.parsers import PyMuPDFParser
+from langchain_core.document_loaders import Blob
+from minio import Minio
+from minio.error import S3Error
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 import chromadb.utils.embedding_functions as embedding_functions
 import chromadb
-from typing import Annotated
+from chromadb.api.shared_system_client import SharedSystemClient
+from typing import Annotated, Literal
 from dotenv import load_dotenv
 from pydantic import Field
+from bm25_index import BM25Index, reciprocal_rank_fusion
+from bm25_sync import load_index, refresh_index, stamp_chunks
+from ingest_pipeline import iter_chunk_batches, read_ahead
+from ingest_scheduler import IngestionScheduler
+from object_lease import LeaseLost, ObjectLease
+from query_batcher import QueryBatcher
+from embedding_compression import PCAProjection, RerankStore, normalize
+from rag_postprocess import assign_by_rank, fuse_candidates, mmr, merge_adjacent, pack_passages, parse_chunk_id
+import rag_scope
+from rag_scope import DEFAULT_COLLECTION, chroma_where, document_metadata, scope_of
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -27,110 +47,1249 @@ logger.info(f"Vector store path: {VECTOR_STORE_PATH}")
 
 rag_mcp = FastMCP("RAG")
 
-client = chromadb.PersistentClient(path=VECTOR_STORE_PATH)
+# With RAG_CHROMA_HOST empty the index is opened in-process and only one MCP
+# server may use it. Pointing several MCP servers and a separate ingestion
+# worker (ingest_worker.py) at one Chroma server lets them share the index;
+# set RAG_INGEST_ENABLED=false on the servers that should only answer queries.
+CHROMA_HOST = os.getenv("RAG_CHROMA_HOST", "")
+INGEST_ENABLED = os.getenv("RAG_INGEST_ENABLED", "true").lower() == "true"
+# How often a process sharing the index looks for changes made by the others.
+SHARED_REFRESH_SECONDS = float(os.getenv("RAG_SHARED_REFRESH_SECONDS", "10"))
+
+if CHROMA_HOST:
+    client = chromadb.HttpClient(
+        host=CHROMA_HOST,
+        port=int(os.getenv("RAG_CHROMA_PORT", "8000")),
+        ssl=os.getenv("RAG_CHROMA_SSL", "false").lower() == "true"
+    )
+    logger.info(f"Using Chroma server at {CHROMA_HOST}")
+else:
+    client = chromadb.PersistentClient(path=VECTOR_STORE_PATH)
+
+# Output size of text-embedding-v3 (1024, 768, 512, 256, 128 or 64); unset keeps
+# the model default. Changing it re-embeds every stored chunk on next start.
+EMBEDDING_DIMENSIONS = int(os.getenv("RAG_EMBEDDING_DIMENSIONS") or 0) or None
 
 openai_ef = embedding_functions.OpenAIEmbeddingFunction(
     api_key_env_var="ALIBABA_API_KEY",
     api_base=os.getenv("BASE_API_URL"),
-    model_name="text-embedding-v3"
+    model_name="text-embedding-v3",
+    dimensions=EMBEDDING_DIMENSIONS
 )
 
-collection = client.get_or_create_collection("main", embedding_function=openai_ef)
-text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+# How uploaded documents are split across collections: "none" keeps everything
+# in the main collection, "user" and "conversation" give each owner or
+# conversation a collection of its own so scoped queries only search that shard.
+SHARD_BY = os.getenv("RAG_SHARD_BY", "none").lower()
+SHARD_REGISTRY_PATH = os.path.join(files_dir, "shards.json")
+
+# HNSW parameters of new collections: more neighbours (M) and a larger
+# construction ef give a better graph at the cost of memory and build time;
+# search ef trades query latency for recall. Existing collections keep their
+# parameters until changed with the tune_index tool.
+HNSW_M = int(os.getenv("RAG_HNSW_M", "16"))
+HNSW_CONSTRUCTION_EF = int(os.getenv("RAG_HNSW_CONSTRUCTION_EF", "100"))
+HNSW_SEARCH_EF = int(os.getenv("RAG_HNSW_SEARCH_EF", "100"))
+HNSW_FIELDS = ("space", "max_neighbors", "ef_construction", "ef_search")
+
+_shard_lock = threading.RLock()
+# Serialises writes with compaction, which swaps a collection for a rebuilt copy.
+_write_lock = threading.RLock()
+_collections = {}
+# Lexical indexes kept in step with each collection; built from it on first use.
+_bm25_indexes = {}
+# Per collection: when a shared server was last checked for changes, the
+# stamps the index is up to date with, and a lock held while loading it.
+_bm25_checked = {}
+_bm25_stamps = {}
+_bm25_locks = {}
+
+def default_hnsw_configuration():
+    return {"max_neighbors": HNSW_M, "ef_construction": HNSW_CONSTRUCTION_EF, "ef_search": HNSW_SEARCH_EF}
+
+def hnsw_configuration(target):
+    """The HNSW parameters a collection was built with."""
+    hnsw = (target.configuration or {}).get("hnsw") or {}
+    return {field: hnsw[field] for field in HNSW_FIELDS if field in hnsw}
+
+def get_collection(name, create=False):
+    """Return the named collection, or None if it does not exist and create is False."""
+    with _shard_lock:
+        if name not in _collections:
+            if create:
+                _collections[name] = client.get_or_create_collection(
+                    name, embedding_function=openai_ef, configuration={"hnsw": default_hnsw_configuration()}
+                )
+            else:
+                try:
+                    _collections[name] = client.get_collection(name, embedding_function=openai_ef)
+                except Exception:
+                    return None
+        return _collections[name]
+
+def refresh_collection(name):
+    """Drop the cached handle of a collection another process may have rebuilt and look it up again."""
+    with _shard_lock:
+        _collections.pop(name, None)
+        return get_collection(name)
+
+def reload_indexes():
+    """Reopen the local vector store, so loaded indexes pick up a changed search ef."""
+    global client, collection
+    if CHROMA_HOST:
+        # The Chroma server applies it when it next loads the index.
+        return
+    with _write_lock, _shard_lock:
+        # Searches already holding a handle finish on the old client.
+        SharedSystemClient.clear_system_cache()
+        client = chromadb.PersistentClient(path=VECTOR_STORE_PATH)
+        _collections.clear()
+        collection = get_collection(DEFAULT_COLLECTION, create=True)
+
+def get_bm25_index(name, page_size=1000):
+    """Return the lexical index of a collection, building it from the collection the first time.
+
+    With a shared Chroma server, chunks other processes wrote or deleted are
+    applied to it at most every SHARED_REFRESH_SECONDS. Loading and refreshing
+    only lock the one collection, so other shards stay available meanwhile.
+    """
+    with _shard_lock:
+        lock = _bm25_locks.setdefault(name, threading.Lock())
+    index = _bm25_indexes.get(name)
+    if index is None:
+        with lock:
+            if name not in _bm25_indexes:
+                target = get_collection(name)
+                index, stamps = load_index(target, page_size) if target is not None else (BM25Index(), (0, 0))
+                _bm25_stamps[name] = stamps
+                _bm25_checked[name] = time.time()
+                _bm25_indexes[name] = index
+                logger.info(f"BM25 index for collection '{name}' loaded with {len(index)} chunks")
+            return _bm25_indexes[name]
+    # A search finding another thread refreshing uses the index as it is.
+    if CHROMA_HOST and time.time() - _bm25_checked.get(name, 0) > SHARED_REFRESH_SECONDS and lock.acquire(blocking=False):
+        try:
+            _bm25_checked[name] = time.time()
+            target = refresh_collection(name)
+            if target is None:
+                _bm25_indexes.pop(name, None)
+            else:
+                _bm25_stamps[name] = refresh_index(index, target, _bm25_stamps.get(name, (0, 0)), page_size)
+        finally:
+            lock.release()
+    return index
+
+def _load_conversation_owners():
+    try:
+        with open(SHARD_REGISTRY_PATH, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logger.error(f"Error loading shard registry: {str(e)}")
+        return {}
+
+# conversation id -> owner id, so conversation-scoped queries find their user shard.
+conversation_owners = _load_conversation_owners()
+
+def register_conversation(metadata):
+    owner = metadata.get("owner")
+    conversation = metadata.get("conversation")
+    if not owner or not conversation:
+        return
+    with _shard_lock:
+        if conversation_owners.get(conversation) == owner:
+            return
+        conversation_owners[conversation] = owner
+        with open(SHARD_REGISTRY_PATH, "w") as f:
+            json.dump(conversation_owners, f)
+
+def shard_for(owner=None, conversation=None):
+    """Name of the collection holding documents of this owner/conversation."""
+    return rag_scope.shard_for(SHARD_BY, conversation_owners, owner, conversation)
+
+COMPACTING_SUFFIX = "_compacting"
+
+def recover_compactions():
+    """Finish or undo compactions cut short by a crash, before any collection is opened."""
+    targets = {target.name: target for target in client.list_collections()}
+    for temp_name, copy in targets.items():
+        if not temp_name.endswith(COMPACTING_SUFFIX):
+            continue
+        name = temp_name[:-len(COMPACTING_SUFFIX)]
+        original = targets.get(name)
+        if original is not None and (original.count() or not copy.count()):
+            # The copy was still being filled; the original is intact.
+            client.delete_collection(temp_name)
+            logger.warning(f"Dropped unfinished compaction copy of collection '{name}'")
+            continue
+        # The original was already dropped (or recreated empty since), so the copy is complete.
+        if original is not None:
+            client.delete_collection(name)
+        copy.modify(name=name)
+        logger.warning(f"Restored collection '{name}' from its compaction copy")
+
+# Only the process that ingests and compacts may touch another compaction's copy.
+if INGEST_ENABLED:
+    recover_compactions()
+collection = get_collection(DEFAULT_COLLECTION, create=True)
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
 
 PDF_FOLDER = os.path.join(os.path.dirname(__file__), "data")
 
 MAX_BATCH_SIZE = 10
 BATCH_DELAY_SECONDS = 0.25
+# Chunk batches buffered between PDF parsing and embedding; bounds ingestion memory.
+INGEST_QUEUE_BATCHES = int(os.getenv("RAG_INGEST_QUEUE_BATCHES", "4"))
+
+# Where uploaded PDFs are picked up: "folder" watches PDF_FOLDER, "minio" reads
+# the upload bucket directly so several ingestion workers can share the work.
+INGEST_SOURCE = os.getenv("RAG_INGEST_SOURCE", "folder").lower()
+MINIO_SOURCE_BUCKET = os.getenv("RAG_MINIO_SOURCE_BUCKET", "chat-files")
+MINIO_CHUNK_BUCKET = os.getenv("MINIO_BUCKET", "pdf-chunks")
+MINIO_PERSIST_CHUNKS = os.getenv("RAG_MINIO_PERSIST_CHUNKS", "false").lower() == "true"
+MINIO_USE_NOTIFICATIONS = os.getenv("RAG_MINIO_USE_NOTIFICATIONS", "true").lower() == "true"
+MINIO_POLL_SECONDS = float(os.getenv("RAG_MINIO_POLL_SECONDS", "5"))
+# A worker's claim on an object expires if its checkpoint is not refreshed in time.
+MINIO_LEASE_SECONDS = float(os.getenv("RAG_MINIO_LEASE_SECONDS", "300"))
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}"
+
+# Pending uploads are ingested smallest first, with the bytes recently ingested
+# for a user added to the size of their next file so one user's large uploads
+# cannot hold everyone else up. Waiting shrinks a file's effective size by one
+# size per aging period, and conversations whose user is querying or polling
+# ingestion status go first.
+INGEST_AGING_SECONDS = float(os.getenv("RAG_INGEST_AGING_SECONDS", "120"))
+INGEST_FAIR_HALF_LIFE_SECONDS = float(os.getenv("RAG_INGEST_FAIR_HALF_LIFE_SECONDS", "600"))
+ingestion_scheduler = IngestionScheduler(
+    aging_seconds=INGEST_AGING_SECONDS,
+    fair_half_life_seconds=INGEST_FAIR_HALF_LIFE_SECONDS
+)
+
+# Concurrent queries arriving within this window share one embedding request
+# and one multi-query search. A window of 0 disables batching.
+QUERY_BATCH_WINDOW_MS = float(os.getenv("RAG_QUERY_BATCH_WINDOW_MS", "5"))
+QUERY_BATCH_MAX_SIZE = int(os.getenv("RAG_QUERY_BATCH_MAX_SIZE", str(MAX_BATCH_SIZE)))
+
+# Default size of the context returned by a query. Characters per token is a
+# rough estimate for Vietnamese text under the chat model's tokenizer.
+DEFAULT_MAX_TOKENS = int(os.getenv("RAG_DEFAULT_MAX_TOKENS", "800"))
+CHARS_PER_TOKEN = float(os.getenv("RAG_CHARS_PER_TOKEN", "3"))
+QUERY_MANY_MAX = int(os.getenv("RAG_QUERY_MANY_MAX", "10"))
+# Longest a single ingestion_status call may wait for pending files; keep it
+# below the chat client's 30 second tool timeout.
+INGEST_STATUS_MAX_WAIT_SECONDS = 25
+
+# Hybrid retrieval: both retrievers return this many candidates before fusion,
+# and lexical results are served alone if vector search exceeds the timeout.
+HYBRID_CANDIDATES = int(os.getenv("RAG_HYBRID_CANDIDATES", "10"))
+RRF_K = int(os.getenv("RAG_RRF_K", "60"))
+VECTOR_TIMEOUT_SECONDS = float(os.getenv("RAG_VECTOR_TIMEOUT_SECONDS", "5"))
+# Trade-off between relevance (1.0) and diversity (0.0) when picking passages.
+MMR_LAMBDA = float(os.getenv("RAG_MMR_LAMBDA", "0.7"))
+
+# Deleted chunks stay in the HNSW index until the collection is rebuilt. The
+# maintenance job compacts collections whose deleted share passes the ratio.
+COMPACT_INTERVAL_SECONDS = float(os.getenv("RAG_COMPACT_INTERVAL_SECONDS", "3600"))
+COMPACT_MIN_DELETED_RATIO = float(os.getenv("RAG_COMPACT_MIN_DELETED_RATIO", "0.2"))
+# collection name -> chunks deleted since its last compaction, also kept in the
+# collection's metadata so the count survives restarts.
+deleted_since_compaction = {
+    target.name: int(target.metadata["deleted_since_compaction"])
+    for target in client.list_collections()
+    if (target.metadata or {}).get("deleted_since_compaction")
+}
+
+# The vector index can hold embeddings projected onto their top principal
+# components, fitted locally once enough chunks exist. A float16 or int8 copy
+# of the full embeddings can be kept to re-score the oversampled candidates.
+# Existing collections are rebuilt to match when these settings change.
+PCA_DIMENSIONS = int(os.getenv("RAG_PCA_DIMENSIONS", "0"))
+PCA_FIT_SAMPLE = int(os.getenv("RAG_PCA_FIT_SAMPLE", "10000"))
+RERANK_STORAGE = os.getenv("RAG_RERANK_STORAGE", "none").lower()
+RERANK_OVERSAMPLE = int(os.getenv("RAG_RERANK_OVERSAMPLE", "3"))
+EMBEDDING_LAYOUT_PATH = os.path.join(files_dir, "embedding_layout.json")
+PCA_PATH = os.path.join(files_dir, "pca.npz")
+RERANK_DB_PATH = os.path.join(files_dir, "rerank.db")
+LEGACY_EMBEDDING_LAYOUT = {"embedding_dimensions": None, "pca_dimensions": 0, "rerank_storage": "none"}
+
+def configured_layout():
+    return {
+        "embedding_dimensions": EMBEDDING_DIMENSIONS,
+        "pca_dimensions": PCA_DIMENSIONS,
+        "rerank_storage": RERANK_STORAGE
+    }
+
+def _load_embedding_layout():
+    try:
+        with open(EMBEDDING_LAYOUT_PATH, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return dict(LEGACY_EMBEDDING_LAYOUT)
+
+# How the vectors currently in the index were produced; differs from
+# configured_layout() until migrate_embedding_layout() has run.
+embedding_layout = _load_embedding_layout()
+projection = PCAProjection.load(PCA_PATH) if embedding_layout["pca_dimensions"] else None
+rerank_store = (
+    RerankStore(RERANK_DB_PATH)
+    if RERANK_STORAGE != "none" or embedding_layout["rerank_storage"] != "none" else None
+)
+
+_shared_state = {"checked": 0.0, "layout_mtime": None}
+
+def refresh_shared_state():
+    """With a shared Chroma server, pick up conversations and layout migrations recorded by other processes."""
+    global conversation_owners, embedding_layout, projection, rerank_store
+    now = time.time()
+    if not CHROMA_HOST or now - _shared_state["checked"] < SHARED_REFRESH_SECONDS:
+        return
+    _shared_state["checked"] = now
+    with _shard_lock:
+        conversation_owners = _load_conversation_owners()
+    try:
+        mtime = os.path.getmtime(EMBEDDING_LAYOUT_PATH)
+    except FileNotFoundError:
+        return
+    if mtime == _shared_state["layout_mtime"]:
+        return
+    _shared_state["layout_mtime"] = mtime
+    with _write_lock:
+        embedding_layout = _load_embedding_layout()
+        projection = PCAProjection.load(PCA_PATH) if embedding_layout["pca_dimensions"] else None
+        if embedding_layout["rerank_storage"] != "none" and rerank_store is None:
+            rerank_store = RerankStore(RERANK_DB_PATH)
+
+def index_vectors(embeddings):
+    """Map model embeddings into the space the vector index is stored in."""
+    if projection is None:
+        return embeddings
+    return projection.transform(embeddings).tolist()
+
+def store_rerank_copy(shard, ids, embeddings):
+    if embedding_layout["rerank_storage"] != "none":
+        rerank_store.put(shard, ids, embeddings, embedding_layout["rerank_storage"])
+
+def migrate_legacy_chunks(page_size=1000):
+    """Attach metadata to chunks ingested before it was recorded and move them to their shard.
+
+    Everything needed is encoded in the chunk id, so nothing is re-embedded.
+    """
+    legacy_ids = []
+    offset = 0
+    while True:
+        page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            break
+        legacy_ids.extend(doc_id for doc_id, metadata in zip(page["ids"], page["metadatas"]) if not metadata)
+        offset += len(page["ids"])
+    if not legacy_ids:
+        return
+
+    logger.info(f"Migrating {len(legacy_ids)} chunks without metadata")
+    for i in range(0, len(legacy_ids), page_size):
+        batch = collection.get(ids=legacy_ids[i:i + page_size], include=["documents", "embeddings"])
+        by_shard = {}
+        for doc_id, document, embedding in zip(batch["ids"], batch["documents"], batch["embeddings"]):
+            source, index = parse_chunk_id(doc_id)
+            metadata = document_metadata(source)
+            if index is not None:
+                metadata["chunk"] = index
+            register_conversation(metadata)
+            shard = shard_for(metadata.get("owner"), metadata.get("conversation"))
+            by_shard.setdefault(shard, []).append((doc_id, document, embedding, metadata))
+
+        for shard, rows in by_shard.items():
+            ids = [row[0] for row in rows]
+            metadatas = stamp_chunks([row[3] for row in rows])
+            if shard == DEFAULT_COLLECTION:
+                collection.update(ids=ids, metadatas=metadatas)
+            else:
+                get_collection(shard, create=True).upsert(
+                    ids=ids,
+                    documents=[row[1] for row in rows],
+                    embeddings=[row[2] for row in rows],
+                    metadatas=metadatas
+                )
+                get_bm25_index(shard).add(ids, [row[1] for row in rows], [scope_of(m) for m in metadatas])
+                collection.delete(ids=ids)
+                record_change(shard, changed_at=time.time())
+    record_change(DEFAULT_COLLECTION, changed_at=time.time(), deleted_at=time.time())
+    with _shard_lock:
+        # Rebuilt with the new metadata on next use.
+        _bm25_indexes.pop(DEFAULT_COLLECTION, None)
+    logger.info("Legacy chunk migration finished")
+
+def mark_shared_chunks(page_size=1000):
+    """Flag chunks stored before the shared field existed as shared documents or conversation uploads."""
+    for name in [c.name for c in client.list_collections() if not c.name.endswith(COMPACTING_SUFFIX)]:
+        target = get_collection(name)
+        if target is None:
+            continue
+        ids, metadatas = [], []
+        offset = 0
+        while True:
+            page = target.get(include=["metadatas"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            for doc_id, metadata in zip(page["ids"], page["metadatas"]):
+                if metadata and "shared" not in metadata:
+                    ids.append(doc_id)
+                    metadatas.append(dict(metadata, shared="owner" not in metadata))
+            offset += len(page["ids"])
+        if not ids:
+            continue
+        metadatas = stamp_chunks(metadatas)
+        with _write_lock:
+            for i in range(0, len(ids), page_size):
+                get_collection(name).update(ids=ids[i:i + page_size], metadatas=metadatas[i:i + page_size])
+            record_change(name, changed_at=time.time())
+        with _shard_lock:
+            # Rebuilt with the new metadata on next use.
+            _bm25_indexes.pop(name, None)
+        logger.info(f"Flagged {len(ids)} chunks of '{name}' as shared or uploaded")
+
+def ingest_pages(pages, source_name, start_chunk=0, on_batch=None):
+    """Embed and store the chunks of a document while it is still being read.
+
+    Parsing and splitting run in a producer thread that hands batches over a
+    bounded queue, so memory stays constant whatever the document size.
+    Batches below start_chunk were stored by an earlier run and are skipped;
+    on_batch(ids, documents, metadatas, chunks_done) is called after each
+    stored batch. Returns the number of chunks in the document.
+    """
+    file_metadata = document_metadata(source_name)
+    register_conversation(file_metadata)
+    shard = shard_for(file_metadata.get("owner"), file_metadata.get("conversation"))
+    index = get_bm25_index(shard)
+    if start_chunk == 0:
+        # A re-uploaded document replaces every chunk of its previous version.
+        delete_document_chunks(source_name)
+
+    progress = {"pages_done": 0, "pages_total": None}
+
+    def track(pages):
+        for page in pages:
+            progress["pages_total"] = page.metadata.get("total_pages", progress["pages_total"])
+            yield page
+            progress["pages_done"] += 1
+
+    batches = (
+        (batch, dict(progress))
+        for batch in iter_chunk_batches(track(pages), text_splitter, source_name, file_metadata, MAX_BATCH_SIZE)
+    )
+    total_chunks = 0
+    batch_number = 0
+    with closing(read_ahead(batches, INGEST_QUEUE_BATCHES)) as stream:
+        for (batch_ids, batch_docs, batch_metadatas), pages_read in stream:
+            batch_number += 1
+            if batch_metadatas[-1]["chunk"] < start_chunk:
+                total_chunks += len(batch_ids)
+                ingestion_scheduler.report(source_name, total_chunks, **pages_read)
+                continue
+            logger.info(f"Uploading batch {batch_number} with {len(batch_docs)} chunks to '{shard}'")
+            embeddings = embed_texts(batch_docs)
+            batch_metadatas = stamp_chunks(batch_metadatas)
+            with _write_lock:
+                get_collection(shard, create=True).upsert(
+                    documents=batch_docs,
+                    embeddings=index_vectors(embeddings),
+                    ids=batch_ids,
+                    metadatas=batch_metadatas
+                )
+                store_rerank_copy(shard, batch_ids, embeddings)
+                index.add(batch_ids, batch_docs, [scope_of(m) for m in batch_metadatas])
+                record_change(shard, changed_at=time.time())
+            total_chunks += len(batch_ids)
+            logger.info(f"Uploaded batch {batch_number}")
+            ingestion_scheduler.report(source_name, total_chunks, **pages_read)
+            if on_batch is not None:
+                on_batch(batch_ids, batch_docs, batch_metadatas, total_chunks)
+            time.sleep(BATCH_DELAY_SECONDS)
+    ingestion_scheduler.report(source_name, total_chunks, progress["pages_done"], progress["pages_done"])
+    return total_chunks
+
+def delete_document_chunks(source_name):
+    """Remove every chunk of a document from its shard and lexical index. Returns the number removed."""
+    metadata = document_metadata(source_name)
+    shard = shard_for(metadata.get("owner"), metadata.get("conversation"))
+    with _write_lock:
+        target = get_collection(shard)
+        if target is None:
+            return 0
+        ids = target.get(where={"source": source_name}, include=[])["ids"]
+        if not ids:
+            return 0
+        target.delete(ids=ids)
+        get_bm25_index(shard).remove(ids)
+        if rerank_store is not None:
+            rerank_store.delete(shard, ids)
+        deleted_since_compaction[shard] = deleted_since_compaction.get(shard, 0) + len(ids)
+        record_change(shard, deleted_since_compaction=deleted_since_compaction[shard], deleted_at=time.time())
+    logger.info(f"Deleted {len(ids)} chunks of {source_name} from '{shard}'")
+    return len(ids)
+
+def collection_metadata(target, **changes):
+    """A collection's metadata with changes applied; hnsw: keys are left out since Chroma refuses to modify them."""
+    metadata = {key: value for key, value in (target.metadata or {}).items() if not key.startswith("hnsw:")}
+    metadata.update(changes)
+    return metadata
+
+def record_change(name, **changes):
+    """Apply changes to a collection's metadata, re-read first when other processes share the Chroma server.
+
+    Writers stamp changed_at and deleted_at here so those processes refresh
+    their lexical index of the collection.
+    """
+    target = refresh_collection(name) if CHROMA_HOST else get_collection(name)
+    target.modify(metadata=collection_metadata(target, **changes))
+
+def compact_collection(name, page_size=1000, hnsw=None, transform=None):
+    """Rebuild a collection from its live chunks so the HNSW index drops deleted entries.
+
+    The rebuilt index keeps the collection's HNSW parameters, updated with
+    any given in hnsw. transform(name, ids, documents, embeddings), if given,
+    returns the vectors to store instead. Returns the number of chunks copied.
+    """
+    global collection
+    with _write_lock:
+        source = get_collection(name)
+        if source is None:
+            return 0
+        configuration = dict(hnsw_configuration(source), **(hnsw or {}))
+        temp_name = f"{name}{COMPACTING_SUFFIX}"
+        try:
+            client.delete_collection(temp_name)
+        except Exception:
+            pass
+        rebuilt = client.create_collection(
+            temp_name,
+            embedding_function=openai_ef,
+            configuration={"hnsw": configuration},
+            metadata=collection_metadata(source, deleted_since_compaction=0)
+        )
+        copied = 0
+        while True:
+            page = source.get(include=["documents", "metadatas", "embeddings"], limit=page_size, offset=copied)
+            if not page["ids"]:
+                break
+            embeddings = page["embeddings"]
+            if transform is not None:
+                embeddings = transform(name, page["ids"], page["documents"], embeddings)
+            rebuilt.add(
+                ids=page["ids"],
+                documents=page["documents"],
+                metadatas=page["metadatas"],
+                embeddings=embeddings
+            )
+            copied += len(page["ids"])
+        # Lookups wait for the swap; searches still holding the old handle retry with the new one.
+        # A crash between the two calls is repaired by recover_compactions on the next start.
+        with _shard_lock:
+            client.delete_collection(name)
+            rebuilt.modify(name=name)
+            _collections[name] = rebuilt
+            if name == DEFAULT_COLLECTION:
+                collection = rebuilt
+        deleted_since_compaction[name] = 0
+    logger.info(f"Compacted collection '{name}' with {copied} live chunks")
+    return copied
+
+def tune_collection(name, max_neighbors=None, ef_construction=None, ef_search=None):
+    """Change the HNSW parameters of a collection. Returns the parameters now in effect.
+
+    The graph parameters only apply to a rebuilt index, so changing them
+    rebuilds the collection; search ef is changed in place.
+    """
+    target = get_collection(name)
+    if target is None:
+        raise ValueError(f"Collection '{name}' does not exist")
+    current = hnsw_configuration(target)
+    changes = {
+        field: value
+        for field, value in (("max_neighbors", max_neighbors), ("ef_construction", ef_construction), ("ef_search", ef_search))
+        if value and value != current.get(field)
+    }
+    if changes.keys() - {"ef_search"}:
+        compact_collection(name, hnsw=changes)
+    elif changes:
+        with _write_lock:
+            target.modify(configuration={"hnsw": {"ef_search": changes["ef_search"]}})
+            reload_indexes()
+        logger.info(f"Search ef of collection '{name}' set to {changes['ef_search']}")
+    return hnsw_configuration(refresh_collection(name))
+
+def compact_collections(force=False):
+    """Compact every collection whose deleted share since the last compaction is high enough."""
+    compacted = {}
+    for name, deleted in list(deleted_since_compaction.items()):
+        target = get_collection(name)
+        if target is None or deleted == 0:
+            continue
+        live = target.count()
+        if force or deleted / max(live + deleted, 1) >= COMPACT_MIN_DELETED_RATIO:
+            compacted[name] = compact_collection(name)
+    return compacted
+
+def _model_embeddings(name, ids, documents, stored, layout):
+    """Embeddings of stored chunks at the configured size, re-embedding only those that cannot be recovered."""
+    if layout["embedding_dimensions"] == EMBEDDING_DIMENSIONS:
+        if not layout["pca_dimensions"]:
+            return [list(vector) for vector in stored]
+        if layout["rerank_storage"] != "none":
+            copies = rerank_store.get(name, ids)
+            if len(copies) == len(ids):
+                return [copies[doc_id] for doc_id in ids]
+    return embed_texts(documents)
+
+def _fit_projection(names, layout, page_size=1000):
+    """Fit the PCA projection on up to PCA_FIT_SAMPLE stored chunks; None if there are too few yet."""
+    sample = []
+    for name in names:
+        offset = 0
+        target = get_collection(name)
+        while len(sample) < PCA_FIT_SAMPLE:
+            page = target.get(include=["documents", "embeddings"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            sample.extend(_model_embeddings(name, page["ids"], page["documents"], page["embeddings"], layout))
+            offset += len(page["ids"])
+    if len(sample) < 2 * PCA_DIMENSIONS:
+        logger.info(f"PCA needs {2 * PCA_DIMENSIONS} chunks, {len(sample)} stored; keeping full dimensions for now")
+        return None
+    return PCAProjection.fit(sample[:PCA_FIT_SAMPLE], PCA_DIMENSIONS)
+
+def migrate_embedding_layout():
+    """Rebuild every collection so its vectors match the configured size, PCA and re-ranking copy.
+
+    Embeddings are recovered from the index or the re-ranking copy where the
+    model output size is unchanged, and re-embedded otherwise. Ingestion waits
+    until the migration is done; vector search may fail over to lexical results
+    meanwhile. Returns the layout in effect afterwards.
+    """
+    global embedding_layout, projection, rerank_store
+    with _write_lock:
+        old = embedding_layout
+        target = configured_layout()
+        names = [c.name for c in client.list_collections()]
+        new_projection = projection
+        if target["pca_dimensions"] and (
+            target["pca_dimensions"] != old["pca_dimensions"]
+            or target["embedding_dimensions"] != old["embedding_dimensions"]
+        ):
+            new_projection = _fit_projection(names, old)
+            if new_projection is None:
+                target["pca_dimensions"] = 0
+        if not target["pca_dimensions"]:
+            new_projection = None
+        if target == old:
+            return old
+
+        logger.info(f"Migrating vector storage from {old} to {target}")
+        if target["rerank_storage"] != "none" and rerank_store is None:
+            rerank_store = RerankStore(RERANK_DB_PATH)
+
+        def transform(name, ids, documents, stored):
+            embeddings = _model_embeddings(name, ids, documents, stored, old)
+            if target["rerank_storage"] != "none":
+                rerank_store.put(name, ids, embeddings, target["rerank_storage"])
+            if new_projection is None:
+                return embeddings
+            return new_projection.transform(embeddings).tolist()
+
+        for name in names:
+            compact_collection(name, transform=transform)
+            if target["rerank_storage"] == "none" and rerank_store is not None:
+                rerank_store.delete(name)
+        if new_projection is not None:
+            new_projection.save(PCA_PATH)
+        embedding_layout, projection = target, new_projection
+        with open(EMBEDDING_LAYOUT_PATH, "w") as f:
+            json.dump(embedding_layout, f)
+    logger.info(f"Vector storage migrated to {target}")
+    return target
+
+def remove_deleted_objects():
+    """Drop chunks and checkpoints of upload objects that no longer exist in the bucket."""
+    live = {obj.object_name for obj in minio_client.list_objects(MINIO_SOURCE_BUCKET, recursive=True)}
+    prefix = "checkpoints/"
+    for checkpoint in minio_client.list_objects(MINIO_CHUNK_BUCKET, prefix=prefix, recursive=True):
+        object_name = checkpoint.object_name[len(prefix):-len(".json")]
+        if object_name not in live:
+            remove_object_chunks(object_name)
+
+def remove_object_chunks(object_name):
+    delete_document_chunks(object_name)
+    for stored in minio_client.list_objects(MINIO_CHUNK_BUCKET, prefix=f"chunks/{object_name}/", recursive=True):
+        minio_client.remove_object(MINIO_CHUNK_BUCKET, stored.object_name)
+    minio_client.remove_object(MINIO_CHUNK_BUCKET, _checkpoint_name(object_name))
+
+def maintenanceThread():
+    while True:
+        time.sleep(COMPACT_INTERVAL_SECONDS)
+        try:
+            if INGEST_SOURCE == "minio":
+                remove_deleted_objects()
+            # Picks up a PCA projection that had too few chunks to fit at startup.
+            migrate_embedding_layout()
+            compact_collections()
+        except Exception as e:
+            logger.error(f"Error in maintenance thread: {str(e)}")
+
+def prepare_collections():
+    try:
+        migrate_legacy_chunks()
+        mark_shared_chunks()
+        migrate_embedding_layout()
+        get_bm25_index(DEFAULT_COLLECTION)
+    except Exception as e:
+        logger.error(f"Error preparing collections: {str(e)}")
+
+def submit_ingestion(source_name, size_bytes, run):
+    """Queue an upload for ingestion; run() does the work when the scheduler picks it."""
+    metadata = document_metadata(source_name)
+    return ingestion_scheduler.submit(
+        source_name, size_bytes, metadata.get("owner"), metadata.get("conversation"), run
+    )
+
+def run_next_ingestion():
+    """Run the highest priority pending ingestion job. Returns False if there was none, None if it failed."""
+    job = ingestion_scheduler.next_job()
+    if job is None:
+        return False
+    try:
+        job["run"]()
+        ingestion_scheduler.finish(job["source"])
+        return True
+    except Exception as e:
+        logger.error(f"Error processing file {job['source']}: {str(e)}")
+        ingestion_scheduler.finish(job["source"], e)
+        return None
 
 def loadIntoVectorStoreThread():
     if not os.path.exists(PDF_FOLDER):
         os.makedirs(PDF_FOLDER)
         logger.info(f"Created PDF folder: {PDF_FOLDER}")
 
+    prepare_collections()
+
     processed_files = set()
 
     while True:
         try:
-            files = [f for f in os.listdir(PDF_FOLDER) if f.lower().endswith(".pdf")]
-            if not files:
-                time.sleep(5)
-                continue
+            # The Node delete route drops "<file>.delete" markers for removed uploads
+            for marker in [f for f in os.listdir(PDF_FOLDER) if f.lower().endswith(".pdf.delete")]:
+                filename = marker[:-len(".delete")]
+                try:
+                    delete_document_chunks(filename)
+                    processed_files.discard(filename)
+                    os.remove(os.path.join(PDF_FOLDER, marker))
+                except Exception as e:
+                    logger.error(f"Error deleting file {filename}: {str(e)}")
 
+            files = [f for f in os.listdir(PDF_FOLDER) if f.lower().endswith(".pdf")]
             for filename in files:
                 if filename in processed_files:
                     continue
-
                 filepath = os.path.join(PDF_FOLDER, filename)
-                logger.info(f"Processing file: {filepath}")
 
-                try:
-                    loader = PyMuPDFLoader(filepath)
-                    raw_docs = loader.load()
-                    chunks = text_splitter.split_documents(raw_docs)
-
-                    documents = []
-                    ids = []
-
-                    total_chunks = len(chunks)
-                    for i, chunk in enumerate(chunks):
-                        logger.info(f"Preparing chunk {i + 1}/{total_chunks} from file {filename}")
-                        documents.append(chunk.page_content)
-                        ids.append(f"{filename}_chunk_{i}")
-
-                    for i in range(0, len(documents), MAX_BATCH_SIZE):
-                        batch_docs = documents[i:i + MAX_BATCH_SIZE]
-                        batch_ids = ids[i:i + MAX_BATCH_SIZE]
-                        logger.info(f"Uploading batch {(i // MAX_BATCH_SIZE) + 1} with {len(batch_docs)} chunks")
-                        collection.upsert(
-                            documents=batch_docs,
-                            ids=batch_ids
-                        )
-                        logger.info(f"Uploaded batch {(i // MAX_BATCH_SIZE) + 1}")
-                        time.sleep(BATCH_DELAY_SECONDS)
-
-                    logger.info(f"Processed file: {filename}, added {len(chunks)} chunks")
+                def ingest_file(filepath=filepath, filename=filename):
+                    logger.info(f"Processing file: {filepath}")
+                    total_chunks = ingest_pages(PyMuPDFLoader(filepath).lazy_load(), filename)
+                    logger.info(f"Processed file: {filename}, added {total_chunks} chunks")
                     processed_files.add(filename)
                     os.remove(filepath)
                     logger.info(f"Removed file: {filepath}")
 
-                except Exception as e:
-                    logger.error(f"Error processing file {filename}: {str(e)}")
+                submit_ingestion(filename, os.path.getsize(filepath), ingest_file)
 
-            time.sleep(1)
+            # One job per scan, so a file uploaded meanwhile can jump the queue.
+            ran = run_next_ingestion()
+            if ran is False:
+                time.sleep(5)
+            elif ran is None:
+                time.sleep(1)
 
         except Exception as e:
             logger.error(f"Error in vector store thread: {str(e)}")
             time.sleep(5)
 
-t1 = threading.Thread(target=loadIntoVectorStoreThread)
+minio_client = Minio(
+    os.getenv("MINIO_ENDPOINT", "localhost:9000"),
+    access_key=os.getenv("MINIO_ACCESS_KEY", "minioadmin"),
+    secret_key=os.getenv("MINIO_SECRET_KEY", "minioadmin"),
+    secure=os.getenv("MINIO_SECURE", "false").lower() == "true"
+)
+minio_wakeup = threading.Event()
+
+def _checkpoint_name(object_name):
+    return f"checkpoints/{object_name}.json"
+
+def read_checkpoint(object_name):
+    """Ingestion progress of an upload object and its etag, shared by all workers through the chunk bucket."""
+    try:
+        response = minio_client.get_object(MINIO_CHUNK_BUCKET, _checkpoint_name(object_name))
+    except S3Error as e:
+        if e.code == "NoSuchKey":
+            return None, None
+        raise
+    try:
+        return json.loads(response.read()), response.headers.get("ETag", "").strip('"')
+    finally:
+        response.close()
+        response.release_conn()
+
+def write_checkpoint(object_name, checkpoint, etag):
+    """Store a checkpoint unless another worker changed it since etag was read. Returns the new etag or None."""
+    data = json.dumps(checkpoint).encode("utf-8")
+    headers = {"Content-Type": "application/json"}
+    if etag:
+        headers["If-Match"] = f'"{etag}"'
+    else:
+        headers["If-None-Match"] = "*"
+    try:
+        # put_object sends extra headers as user metadata, so the conditional
+        # write goes through the client's PutObject call directly.
+        return minio_client._put_object(MINIO_CHUNK_BUCKET, _checkpoint_name(object_name), data, headers).etag
+    except S3Error as e:
+        if e.code in ("PreconditionFailed", "ConditionalRequestConflict"):
+            return None
+        raise
+
+def persist_chunk_batch(object_name, ids, documents, metadatas):
+    data = json.dumps({"ids": ids, "documents": documents, "metadatas": metadatas}, ensure_ascii=False).encode("utf-8")
+    minio_client.put_object(
+        MINIO_CHUNK_BUCKET, f"chunks/{object_name}/{metadatas[0]['chunk']:06d}.json", io.BytesIO(data), len(data),
+        content_type="application/json"
+    )
+
+def ingest_minio_object(obj):
+    """Ingest one upload object, resuming from its checkpoint. Returns False if another worker owns it."""
+    object_name = obj.object_name
+    lease = ObjectLease(read_checkpoint, write_checkpoint, object_name, WORKER_ID, MINIO_LEASE_SECONDS)
+    checkpoint = lease.claim(obj.etag)
+    if checkpoint is None:
+        return False
+    if checkpoint["status"] == "done":
+        return True
+    # The claim is a conditional write, so no other worker is storing chunks
+    # of this object when ingest_pages clears them to start over.
+    logger.info(f"Processing object: {MINIO_SOURCE_BUCKET}/{object_name} from chunk {checkpoint['chunks_done']}")
+
+    # PDFs need random access, so the object is read into memory; pages are
+    # still parsed and embedded one batch at a time.
+    response = minio_client.get_object(MINIO_SOURCE_BUCKET, object_name)
+    try:
+        data = response.read()
+    finally:
+        response.close()
+        response.release_conn()
+    pages = PyMuPDFParser(mode="page").lazy_parse(Blob.from_data(data, path=object_name))
+
+    def on_batch(ids, documents, metadatas, chunks_done):
+        if MINIO_PERSIST_CHUNKS:
+            persist_chunk_batch(object_name, ids, documents, metadatas)
+        lease.save(chunks_done=chunks_done)
+
+    try:
+        total_chunks = ingest_pages(pages, object_name, checkpoint["chunks_done"], on_batch)
+        lease.save(status="done", chunks_done=total_chunks)
+    except LeaseLost as e:
+        logger.warning(f"Stopped processing {object_name}: {str(e)}")
+        return False
+    logger.info(f"Processed object: {object_name}, {total_chunks} chunks")
+    return True
+
+def listenForMinioEventsThread():
+    """Wake the ingestion loop as soon as an upload lands instead of at the next poll."""
+    while True:
+        try:
+            with minio_client.listen_bucket_notification(
+                MINIO_SOURCE_BUCKET, events=["s3:ObjectCreated:*", "s3:ObjectRemoved:*"]
+            ) as events:
+                for _ in events:
+                    minio_wakeup.set()
+        except Exception as e:
+            logger.warning(f"Bucket notifications unavailable, relying on polling: {str(e)}")
+            time.sleep(MINIO_POLL_SECONDS * 12)
+
+def loadFromMinioThread():
+    prepare_collections()
+    if MINIO_USE_NOTIFICATIONS:
+        threading.Thread(target=listenForMinioEventsThread, daemon=True).start()
+
+    completed = {}  # object name -> etag ingested, saves a checkpoint read per poll
+    leased_elsewhere = {}  # object name -> when another worker was found holding it
+    while True:
+        try:
+            if not minio_client.bucket_exists(MINIO_CHUNK_BUCKET):
+                minio_client.make_bucket(MINIO_CHUNK_BUCKET)
+                logger.info(f"Created MinIO bucket: {MINIO_CHUNK_BUCKET}")
+
+            listed = set()
+            for obj in minio_client.list_objects(MINIO_SOURCE_BUCKET, recursive=True):
+                listed.add(obj.object_name)
+                if not obj.object_name.lower().endswith(".pdf") or completed.get(obj.object_name) == obj.etag:
+                    continue
+                if time.time() - leased_elsewhere.get(obj.object_name, 0) < MINIO_LEASE_SECONDS:
+                    continue
+
+                def ingest_object(obj=obj):
+                    if ingest_minio_object(obj):
+                        completed[obj.object_name] = obj.etag
+                    else:
+                        leased_elsewhere[obj.object_name] = time.time()
+
+                submit_ingestion(obj.object_name, obj.size, ingest_object)
+
+            for object_name in [name for name in completed if name not in listed]:
+                try:
+                    remove_object_chunks(object_name)
+                    del completed[object_name]
+                except Exception as e:
+                    logger.error(f"Error removing chunks of deleted object {object_name}: {str(e)}")
+
+            # One job per listing, so an object uploaded meanwhile can jump the queue.
+            if run_next_ingestion() is True:
+                continue
+
+        except Exception as e:
+            logger.error(f"Error in MinIO ingestion thread: {str(e)}")
+
+        minio_wakeup.wait(MINIO_POLL_SECONDS)
+        minio_wakeup.clear()
+
+t1 = threading.Thread(target=loadFromMinioThread if INGEST_SOURCE == "minio" else loadIntoVectorStoreThread)
 t1.daemon = True
-t1.start()
+t2 = threading.Thread(target=maintenanceThread)
+t2.daemon = True
+if INGEST_ENABLED:
+    t1.start()
+    t2.start()
+
+def embed_texts(texts):
+    """Embed texts using as few embedding requests as the API batch limit allows."""
+    embeddings = []
+    for i in range(0, len(texts), MAX_BATCH_SIZE):
+        embeddings.extend(openai_ef(texts[i:i + MAX_BATCH_SIZE]))
+    return embeddings
+
+def vector_search(texts, n_results, shard=DEFAULT_COLLECTION, filters=None, embeddings=None):
+    """Run one multi-query search of a shard for texts and split the result per query."""
+    target = get_collection(shard)
+    if target is None:
+        return [{"ids": [], "documents": [], "metadatas": [], "distances": [], "embeddings": []} for _ in texts]
+    if embeddings is None:
+        embeddings = embed_texts(texts)
+    reranking = embedding_layout["rerank_storage"] != "none"
+    request = {
+        "query_embeddings": index_vectors(embeddings),
+        "n_results": n_results * RERANK_OVERSAMPLE if reranking else n_results,
+        "where": chroma_where(filters or {}),
+        "include": ["documents", "metadatas", "distances", "embeddings"]
+    }
+    try:
+        res = target.query(**request)
+    except Exception:
+        # The collection may have been rebuilt meanwhile, by compaction or another process sharing the server.
+        target = refresh_collection(shard)
+        if target is None:
+            return [{"ids": [], "documents": [], "metadatas": [], "distances": [], "embeddings": []} for _ in texts]
+        res = target.query(**request)
+    results = [
+        {
+            "ids": res["ids"][i],
+            "documents": res["documents"][i],
+            "metadatas": res["metadatas"][i],
+            "distances": res["distances"][i],
+            "embeddings": list(res["embeddings"][i])
+        }
+        for i in range(len(texts))
+    ]
+    if reranking:
+        results = [rerank(shard, result, embedding, n_results) for result, embedding in zip(results, embeddings)]
+    return results
+
+def rerank(shard, result, query_embedding, n_results):
+    """Re-score a search result against the full-dimension copies and keep the best n_results."""
+    copies = rerank_store.get(shard, result["ids"])
+    query_vector = normalize([query_embedding])[0]
+    # Chunks without a copy are scored by cosine similarity of their index vectors,
+    # since the index distance depends on the collection's space (l2, ip or cosine).
+    indexed = normalize(result["embeddings"]) if len(result["embeddings"]) else []
+    indexed_query = normalize(index_vectors([query_embedding]))[0]
+
+    def similarity(i):
+        copy = copies.get(result["ids"][i])
+        if copy is None:
+            return float(indexed[i] @ indexed_query)
+        return float(normalize([copy])[0] @ query_vector)
+
+    order = sorted(range(len(result["ids"])), key=similarity, reverse=True)[:n_results]
+    return {key: [values[i] for i in order] for key, values in result.items()}
+
+def search_batch(requests):
+    """Embed every (text, n_results, shard, filters) request at once, then search each shard/filter group once."""
+    embeddings = embed_texts([request[0] for request in requests])
+    groups = {}
+    for i, (_, _, shard, filters) in enumerate(requests):
+        groups.setdefault((shard, json.dumps(filters, sort_keys=True)), []).append(i)
+
+    results = [None] * len(requests)
+    for members in groups.values():
+        _, _, shard, filters = requests[members[0]]
+        n_results = max(requests[i][1] for i in members)
+        group_results = vector_search(
+            [requests[i][0] for i in members], n_results, shard, filters, [embeddings[i] for i in members]
+        )
+        for i, result in zip(members, group_results):
+            results[i] = {key: values[:requests[i][1]] for key, values in result.items()}
+    logger.info(f"Searched batch of {len(requests)} queries")
+    return results
+
+query_batcher = QueryBatcher(search_batch, QUERY_BATCH_WINDOW_MS, QUERY_BATCH_MAX_SIZE)
+
+async def _search_vectors(texts, n_candidates, shard, filters):
+    """Single queries go through the micro-batcher; query lists are already one batch."""
+    if len(texts) == 1:
+        return [await query_batcher.submit(texts[0], n_candidates, shard, filters)]
+    return await asyncio.to_thread(vector_search, texts, n_candidates, shard, filters)
+
+def _search_lexical(texts, n_candidates, shard, filters):
+    if get_collection(shard) is None:
+        return [[] for _ in texts]
+    index = get_bm25_index(shard)
+    return [index.search(text, n_candidates, filters) for text in texts]
+
+async def hybrid_search(texts, n_candidates, shard=DEFAULT_COLLECTION, filters=None):
+    """Run lexical and vector search concurrently and fuse them with reciprocal-rank fusion.
+
+    Returns, per text, up to n_candidates dicts with id, document, metadata,
+    embedding and fused score, best first.
+    """
+    filters = filters or {}
+    refresh_shared_state()
+    lexical, vectors = await asyncio.gather(
+        asyncio.to_thread(_search_lexical, texts, n_candidates, shard, filters),
+        asyncio.wait_for(_search_vectors(texts, n_candidates, shard, filters), VECTOR_TIMEOUT_SECONDS),
+        return_exceptions=True
+    )
+    if isinstance(lexical, BaseException):
+        logger.error(f"Lexical search failed: {str(lexical)}")
+        lexical = [[] for _ in texts]
+    if isinstance(vectors, BaseException):
+        if not any(lexical):
+            raise vectors
+        logger.warning(f"Vector search unavailable, serving lexical results only: {vectors!r}")
+        vectors = [{"ids": [], "documents": [], "metadatas": [], "embeddings": []} for _ in texts]
+
+    fused = [
+        reciprocal_rank_fusion([vector["ids"], [doc_id for doc_id, _ in hits]], k=RRF_K)[:n_candidates]
+        for hits, vector in zip(lexical, vectors)
+    ]
+    found = {}
+    for vector in vectors:
+        for doc_id, document, metadata, embedding in zip(
+            vector["ids"], vector["documents"], vector["metadatas"], vector["embeddings"]
+        ):
+            found[doc_id] = {"document": document, "metadata": metadata, "embedding": embedding}
+    missing = list(dict.fromkeys(doc_id for ids in fused for doc_id in ids if doc_id not in found))
+    if missing:
+        fetched = await asyncio.to_thread(
+            get_collection(shard).get, ids=missing, include=["documents", "metadatas", "embeddings"]
+        )
+        for doc_id, document, metadata, embedding in zip(
+            fetched["ids"], fetched["documents"], fetched["metadatas"], fetched["embeddings"]
+        ):
+            found[doc_id] = {"document": document, "metadata": metadata, "embedding": embedding}
+
+    return [
+        [
+            {"id": doc_id, "score": 1 / (rank + 1), **found[doc_id]}
+            for rank, doc_id in enumerate(ids) if doc_id in found
+        ]
+        for ids in fused
+    ]
+
+def resolve_scope(user_id, conversation_id, scope="conversation"):
+    """Shards and metadata filters a query searches; see rag_scope.resolve_scope."""
+    return rag_scope.resolve_scope(SHARD_BY, conversation_owners, user_id, conversation_id, scope)
+
+async def scoped_search(texts, n_candidates, targets):
+    """hybrid_search every shard of a scope and fuse the shards' rankings per text."""
+    per_shard = await asyncio.gather(
+        *(hybrid_search(texts, n_candidates, shard, filters) for shard, filters in targets.items())
+    )
+    return [fuse_candidates(candidate_lists, n_candidates, RRF_K) for candidate_lists in zip(*per_shard)]
+
+def pending_ingestion(conversation_id):
+    """Queued or running ingestion jobs of a conversation, moved up the queue since someone is waiting."""
+    if not conversation_id:
+        return []
+    conversation_id = str(conversation_id)
+    if not ingestion_scheduler.pending(conversation_id):
+        return []
+    ingestion_scheduler.mark_waiting(conversation_id)
+    return [
+        job for job in ingestion_scheduler.status(conversation=conversation_id)
+        if job["status"] in ("queued", "processing")
+    ]
+
+def select_passages(candidates, k=None):
+    """Order candidates by MMR, keep the first k and merge neighbouring chunks into passages."""
+    unique = []
+    seen_documents = set()
+    for candidate in candidates:
+        if candidate["document"] not in seen_documents:
+            seen_documents.add(candidate["document"])
+            unique.append(candidate)
+    if not unique:
+        return []
+
+    scores = [candidate["score"] for candidate in unique]
+    selected = mmr(scores, [candidate["embedding"] for candidate in unique], k or len(unique), MMR_LAMBDA)
+    return merge_adjacent([unique[i] for i in selected], CHUNK_OVERLAP)
 
 @rag_mcp.tool()
-def query(
-    query: Annotated[str, Field(description="Query to gather relevant context from uploaded files.")]
+async def query(
+    query: Annotated[str, Field(description="Query to gather relevant context from uploaded files.")],
+    max_tokens: Annotated[int, Field(description="Approximate token budget for the returned context.")] = DEFAULT_MAX_TOKENS,
+    max_chars: Annotated[int, Field(description="Character budget for the returned context; overrides max_tokens when set.")] = 0,
+    scope: Annotated[Literal["conversation", "owner"], Field(description="conversation: files uploaded to this conversation; owner: every file its user uploaded. Shared documents are always searched.")] = "conversation",
+    user_id: Annotated[str, Field(description="User whose files the owner scope covers; defaults to the conversation's user.")] = "",
+    conversation_id: Annotated[str, Field(description="Conversation whose files to search. Filled in by the chat server.")] = ""
 ) -> list:
     try:
-        res = collection.query(query_texts=[query], n_results=3)
-        logger.info(f"Query executed: {query}")
+        budget_chars = max_chars if max_chars > 0 else int(max_tokens * CHARS_PER_TOKEN)
+        candidates = (await scoped_search([query], HYBRID_CANDIDATES, resolve_scope(user_id, conversation_id, scope)))[0]
+        passages = pack_passages(select_passages(candidates), query, budget_chars)
+        logger.info(f"Query executed: {query} ({len(passages)} passages, {sum(len(p['text']) for p in passages)} chars)")
 
-        if res["documents"] and len(res["documents"][0]) > 0:
-            return [res["documents"][0][i] for i in range(len(res["documents"][0]))]
-        else:
-            return [{"message": "No relevant documents found"}]
+        if not passages:
+            passages = [{"message": "No relevant documents found"}]
+        pending = pending_ingestion(conversation_id)
+        if pending:
+            passages.append({"message": "Some uploaded files are still being indexed", "indexing": pending})
+        return passages
 
     except Exception as e:
         logger.error(f"Error querying vector store: {str(e)}")
         return [{"error": str(e)}]
 
+@rag_mcp.tool()
+async def query_many(
+    queries: Annotated[list[str], Field(description="Independent sub-questions to search for at once, e.g. one per year or company being compared.")],
+    max_tokens: Annotated[int, Field(description="Approximate token budget for the context returned per query.")] = DEFAULT_MAX_TOKENS,
+    scope: Annotated[Literal["conversation", "owner"], Field(description="conversation: files uploaded to this conversation; owner: every file its user uploaded. Shared documents are always searched.")] = "conversation",
+    user_id: Annotated[str, Field(description="User whose files the owner scope covers; defaults to the conversation's user.")] = "",
+    conversation_id: Annotated[str, Field(description="Conversation whose files to search. Filled in by the chat server.")] = ""
+) -> dict:
+    """Search several queries with one embedding request and one vector search.
+
+    A passage relevant to several queries is returned once, under the query
+    that ranks it highest.
+    """
+    queries = [text for text in dict.fromkeys(q.strip() for q in queries) if text]
+    if not queries:
+        return {"error": "No queries provided"}
+    if len(queries) > QUERY_MANY_MAX:
+        return {"error": f"At most {QUERY_MANY_MAX} queries can be searched at once"}
+    try:
+        budget_chars = int(max_tokens * CHARS_PER_TOKEN)
+        candidate_lists = await scoped_search(queries, HYBRID_CANDIDATES, resolve_scope(user_id, conversation_id, scope))
+
+        results = [
+            {"query": text, "passages": pack_passages(select_passages(candidates), text, budget_chars)}
+            for text, candidates in zip(queries, assign_by_rank(candidate_lists))
+        ]
+        logger.info(f"Batch query executed for {len(queries)} queries")
+        pending = pending_ingestion(conversation_id)
+        if pending:
+            return {"results": results, "indexing": pending}
+        return {"results": results}
+
+    except Exception as e:
+        logger.error(f"Error querying vector store: {str(e)}")
+        return {"error": str(e)}
+
+@rag_mcp.tool()
+async def ingestion_status(
+    conversation_id: Annotated[str, Field(description="Only report files uploaded to this conversation. Filled in by the chat server.")] = "",
+    source: Annotated[str, Field(description="Only report this file, e.g. '12_34_1750851614786.pdf'.")] = "",
+    wait_seconds: Annotated[float, Field(description=f"Wait up to this many seconds (at most {INGEST_STATUS_MAX_WAIT_SECONDS}) for pending files to finish before answering.")] = 0
+) -> dict:
+    """Progress and estimated seconds left for uploaded files that are queued or being indexed."""
+    try:
+        conversation = str(conversation_id) if conversation_id else None
+        if conversation:
+            ingestion_scheduler.mark_waiting(conversation)
+        deadline = time.monotonic() + min(max(wait_seconds, 0), INGEST_STATUS_MAX_WAIT_SECONDS)
+        while True:
+            files = ingestion_scheduler.status(conversation=conversation, source=source or None)
+            pending = sum(1 for job in files if job["status"] in ("queued", "processing"))
+            if pending == 0 or time.monotonic() >= deadline:
+                return {"pending": pending, "files": files}
+            await asyncio.sleep(1)
+    except Exception as e:
+        logger.error(f"Error getting ingestion status: {str(e)}")
+        return {"error": str(e)}
+
+@rag_mcp.tool()
+def delete_document(
+    source: Annotated[str, Field(description="File name the document was uploaded as, e.g. '12_34_1750851614786.pdf'.")]
+) -> dict:
+    """Delete every indexed chunk of a document. Re-uploading a file under the same name replaces its chunks."""
+    try:
+        return {"source": source, "deleted_chunks": delete_document_chunks(source)}
+    except Exception as e:
+        logger.error(f"Error deleting document {source}: {str(e)}")
+        return {"error": str(e)}
+
+@rag_mcp.tool()
+def compact_collections_now(
+    force: Annotated[bool, Field(description="Compact every collection with deleted chunks, regardless of RAG_COMPACT_MIN_DELETED_RATIO.")] = False
+) -> dict:
+    """Rebuild collections with many deleted chunks so index size tracks the live corpus."""
+    try:
+        return {"compacted": compact_collections(force)}
+    except Exception as e:
+        logger.error(f"Error compacting collections: {str(e)}")
+        return {"error": str(e)}
+
+@rag_mcp.tool()
+def tune_index(
+    collection_name: Annotated[str, Field(description="Collection to tune, as listed by get_collection_info.")] = DEFAULT_COLLECTION,
+    max_neighbors: Annotated[int, Field(description="HNSW M, graph links per vector. Changing it rebuilds the index. 0 keeps the current value.")] = 0,
+    ef_construction: Annotated[int, Field(description="Candidate list size while building the graph. Changing it rebuilds the index. 0 keeps the current value.")] = 0,
+    ef_search: Annotated[int, Field(description="Candidate list size while searching; higher raises recall and latency. Applied without a rebuild. 0 keeps the current value.")] = 0
+) -> dict:
+    """Trade recall against latency and memory for one collection's vector index."""
+    try:
+        return {
+            "collection_name": collection_name,
+            "hnsw": tune_collection(collection_name, max_neighbors, ef_construction, ef_search)
+        }
+    except Exception as e:
+        logger.error(f"Error tuning collection {collection_name}: {str(e)}")
+        return {"error": str(e)}
+
 @rag_mcp.tool()
 def get_collection_info() -> dict:
     try:
-        count = collection.count()
+        collections = client.list_collections()
+        shards = {c.name: c.count() for c in collections}
         return {
-            "total_documents": count,
-            "collection_name": collection.name
+            "total_documents": sum(shards.values()),
+            "collection_name": collection.name,
+            "shard_by": SHARD_BY,
+            "shards": shards,
+            "hnsw": {c.name: hnsw_configuration(c) for c in collections},
+            "embedding_layout": embedding_layout,
+            "rerank_store": rerank_store.stats() if rerank_store is not None else None,
+            "deleted_since_compaction": deleted_since_compaction,
+            "query_batching": query_batcher.stats
         }
     except Exception as e:
         logger.error(f"Error getting collection info: {str(e)}")
@@ -0,0 +1,175 @@
+import re
+
+import numpy as np
+
+from bm25_index import reciprocal_rank_fusion, tokenize
+
+CHUNK_ID_PATTERN = re.compile(r"^(?P<source>.+)_chunk_(?P<index>\d+)$")
+
+# Shortest shared text that counts as chunk overlap when joining neighbours.
+MIN_OVERLAP_CHARS = 20
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?;])\s+|\n+")
+ELLIPSIS = "…"
+
+
+def parse_chunk_id(chunk_id: str):
+    """Split a '<source>_chunk_<n>' id into (source, n); n is None for foreign ids."""
+    match = CHUNK_ID_PATTERN.match(chunk_id)
+    if not match:
+        return chunk_id, None
+    return match.group("source"), int(match.group("index"))
+
+
+def mmr(relevance, embeddings, k: int, lambda_mult: float = 0.7) -> list:
+    """Select k candidate indices by maximal marginal relevance.
+
+    relevance holds one score per candidate (higher is better) and embeddings
+    one vector per candidate; redundancy is the cosine similarity to the
+    candidates already selected.
+    """
+    relevance = np.asarray(relevance, dtype=np.float32)
+    if len(relevance) == 0 or k <= 0:
+        return []
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    vectors = vectors / norms
+    similarity = vectors @ vectors.T
+
+    selected = [int(np.argmax(relevance))]
+    max_similarity = similarity[selected[0]].copy()
+    while len(selected) < min(k, len(relevance)):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        max_similarity = np.maximum(max_similarity, similarity[best])
+    return selected
+
+
+def fuse_candidates(candidate_lists, k: int, rrf_k: int = 60) -> list:
+    """Fuse the ranked candidates several shards returned for one query into the top k, best first."""
+    if len(candidate_lists) == 1:
+        return candidate_lists[0]
+    found = {candidate["id"]: candidate for candidates in candidate_lists for candidate in candidates}
+    ranking = reciprocal_rank_fusion([[candidate["id"] for candidate in candidates] for candidates in candidate_lists], rrf_k)
+    return [dict(found[doc_id], score=1 / (rank + 1)) for rank, doc_id in enumerate(ranking[:k])]
+
+
+def assign_by_rank(candidate_lists) -> list:
+    """Hand out the candidates of several queries round-robin by rank, so each chunk goes to the query ranking it best."""
+    claimed = set()
+    assigned = [[] for _ in candidate_lists]
+    for rank in range(max(map(len, candidate_lists), default=0)):
+        for i, candidates in enumerate(candidate_lists):
+            if rank < len(candidates) and candidates[rank]["id"] not in claimed:
+                claimed.add(candidates[rank]["id"])
+                assigned[i].append(candidates[rank])
+    return assigned
+
+
+def join_overlapping(first: str, second: str, max_overlap: int) -> str:
+    """Concatenate two consecutive chunks, dropping the text they share."""
+    for size in range(min(len(first), len(second), max_overlap), MIN_OVERLAP_CHARS - 1, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return first + "\n" + second
+
+
+def merge_adjacent(hits, max_overlap: int) -> list:
+    """Merge consecutive chunks of the same source into one passage.
+
+    hits are dicts with "id", "document" and optionally "metadata", best
+    first. The merged passage takes the position of its best ranked member.
+    """
+    groups = {}
+    for rank, hit in enumerate(hits):
+        source, index = parse_chunk_id(hit["id"])
+        groups.setdefault(source, []).append((index, rank, hit))
+
+    passages = []
+    for source, members in groups.items():
+        members.sort(key=lambda member: (member[0] is None, member[0] or 0))
+        current = None
+        for index, rank, hit in members:
+            page = (hit.get("metadata") or {}).get("page")
+            if current is not None and index is not None and current["chunks"][-1] == index - 1:
+                current["document"] = join_overlapping(current["document"], hit["document"], max_overlap)
+                current["chunks"].append(index)
+                current["ids"].append(hit["id"])
+                current["rank"] = min(current["rank"], rank)
+                if page is not None:
+                    current["pages"].append(page)
+                continue
+            current = {
+                "source": source,
+                "chunks": [index],
+                "ids": [hit["id"]],
+                "pages": [] if page is None else [page],
+                "document": hit["document"],
+                "rank": rank
+            }
+            passages.append(current)
+    passages.sort(key=lambda passage: passage["rank"])
+    return passages
+
+
+def trim_to_match(text: str, query_terms: set, max_chars: int, context_sentences: int = 1) -> str:
+    """Cut text down to the best matching sentence and its neighbours, within max_chars.
+
+    Passages matched only semantically (no shared terms) keep their opening
+    sentences instead.
+    """
+    sentences = [sentence.strip() for sentence in SENTENCE_BOUNDARY.split(text) if sentence.strip()]
+    if not sentences or max_chars <= 0:
+        return ""
+    scores = [len(query_terms.intersection(tokenize(sentence))) for sentence in sentences]
+    best = max(range(len(sentences)), key=scores.__getitem__)
+    if scores[best] == 0:
+        start, end = 0, len(sentences)
+    else:
+        start = max(0, best - context_sentences)
+        end = min(len(sentences), best + context_sentences + 1)
+
+    excerpt = " ".join(sentences[start:end])
+    if start > 0:
+        excerpt = ELLIPSIS + excerpt
+    if len(excerpt) > max_chars:
+        excerpt = excerpt[:max_chars - len(ELLIPSIS)].rsplit(" ", 1)[0] + ELLIPSIS
+    elif end < len(sentences):
+        excerpt += ELLIPSIS
+    return excerpt if len(excerpt) <= max_chars else ""
+
+
+def format_pages(pages):
+    """Render the pages of a passage as 5 or "5-6"; None when unknown."""
+    if not pages:
+        return None
+    first, last = min(pages), max(pages)
+    return first if first == last else f"{first}-{last}"
+
+
+def pack_passages(passages, query: str, budget_chars: int, min_chars: int = 120) -> list:
+    """Greedily fill budget_chars with trimmed passages, best ranked first.
+
+    Returns compact dicts with "source", "text" and, when known, "page".
+    """
+    query_terms = set(tokenize(query))
+    packed = []
+    used = 0
+    for passage in passages:
+        remaining = budget_chars - used
+        if remaining < min_chars:
+            break
+        text = trim_to_match(passage["document"], query_terms, remaining)
+        if not text:
+            continue
+        entry = {"source": passage["source"]}
+        page = format_pages(passage.get("pages"))
+        if page is not None:
+            entry["page"] = page
+        entry["text"] = text
+        packed.append(entry)
+        used += len(text)
+    return packed
@@ -0,0 +1,79 @@
+import re
+
+DEFAULT_COLLECTION = "main"
+
+# The Node upload route names files "<userId>_<conversationId>_<timestamp>.<ext>".
+UPLOAD_NAME_PATTERN = re.compile(r"^(?P<owner>[^_]+)_(?P<conversation>[^_]+)_\d+\.\w+$")
+# Metadata fields queries can be scoped by; also kept in the lexical index.
+SCOPE_FIELDS = ("owner", "conversation", "shared")
+# Documents that were not uploaded to a conversation, e.g. ingested by an admin.
+SHARED_FILTER = {"shared": True}
+SCOPES = ("conversation", "owner")
+
+
+def document_metadata(filename):
+    """Source, owner and conversation of an uploaded file, as far as its name tells."""
+    metadata = {"source": filename, "shared": True}
+    match = UPLOAD_NAME_PATTERN.match(filename)
+    if match:
+        metadata.update(owner=match.group("owner"), conversation=match.group("conversation"), shared=False)
+    return metadata
+
+
+def scope_of(metadata):
+    return {field: metadata[field] for field in SCOPE_FIELDS if metadata and field in metadata}
+
+
+def shard_for(shard_by, owners, owner=None, conversation=None):
+    """Name of the collection holding documents of this owner/conversation.
+
+    owners maps conversation ids to the user who uploaded to them.
+    """
+    if shard_by == "user":
+        owner = owner or owners.get(conversation)
+        if owner:
+            return f"user_{owner}"
+    elif shard_by == "conversation" and conversation:
+        return f"conversation_{conversation}"
+    return DEFAULT_COLLECTION
+
+
+def resolve_scope(shard_by, owners, user_id=None, conversation_id=None, scope="conversation"):
+    """Where a query searches, as {shard: [filter, ...]}; a chunk matches if it equals any one filter.
+
+    Shared documents are always searched. The conversation scope adds the
+    files uploaded to the conversation, the owner scope every file uploaded by
+    its user (or by user_id when given).
+    """
+    if scope not in SCOPES:
+        raise ValueError(f"Unknown scope '{scope}', expected one of {', '.join(SCOPES)}")
+    conversation = str(conversation_id) if conversation_id else None
+    owner = str(user_id) if user_id else owners.get(conversation)
+    targets = {DEFAULT_COLLECTION: [SHARED_FILTER]}
+
+    def add(shard, clause):
+        targets.setdefault(shard, []).append(clause)
+
+    if scope == "owner" and owner:
+        if shard_by == "conversation":
+            for other, other_owner in owners.items():
+                if other_owner == owner:
+                    add(shard_for(shard_by, owners, owner, other), {"owner": owner})
+        else:
+            add(shard_for(shard_by, owners, owner), {"owner": owner})
+    elif conversation:
+        add(shard_for(shard_by, owners, owner, conversation), {"conversation": conversation})
+    return targets
+
+
+def chroma_where(filters):
+    """Turn {field: value} equality filters, any of which may match, into a Chroma where clause."""
+    if isinstance(filters, dict):
+        filters = [filters]
+    if not filters or not all(filters):
+        return None
+    conditions = []
+    for clause in filters:
+        fields = [{field: value} for field, value in clause.items()]
+        conditions.append(fields[0] if len(fields) == 1 else {"$and": fields})
+    return conditions[0] if len(conditions) == 1 else {"$or": conditions}
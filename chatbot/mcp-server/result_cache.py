@@ -0,0 +1,109 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+def result_size(result) -> int:
+    """Approximate size of a result as the JSON sent back to the client."""
+    return len(json.dumps(result, default=str))
+
+
+class ResultCache:
+    """LRU cache of query results, bounded by their approximate size in bytes.
+
+    Entries expire after ttl_seconds and are dropped when a statement writes to
+    one of the tables they read. Each entry also keeps the change markers of
+    its tables at the time it was stored, so callers can re-validate it.
+    """
+
+    def __init__(self, max_bytes, ttl_seconds=300.0):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "bypassed": 0,
+            "stored": 0,
+            "evictions": 0,
+            "invalidations": 0,
+            "bytes_saved": 0
+        }
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def get(self, key):
+        """The cached entry for key, or None; counts a miss when there is none."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry["stored_at"] > self.ttl_seconds:
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def hit(self, entry):
+        with self._lock:
+            self._stats["hits"] += 1
+            self._stats["bytes_saved"] += entry["size"]
+
+    def bypass(self):
+        with self._lock:
+            self._stats["bypassed"] += 1
+
+    def put(self, key, result, tables, markers=None):
+        size = result_size(result)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = {
+                "result": result,
+                "tables": set(tables),
+                "markers": markers,
+                "size": size,
+                "stored_at": time.time(),
+                "verified_at": time.time()
+            }
+            self._bytes += size
+            self._stats["stored"] += 1
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def verified(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry["verified_at"] = time.time()
+
+    def discard(self, key):
+        with self._lock:
+            if self._drop(key):
+                self._stats["invalidations"] += 1
+
+    def invalidate_tables(self, tables=None):
+        """Drop the entries that read any of the tables, or every entry if tables is None."""
+        with self._lock:
+            for key in [k for k, entry in self._entries.items() if tables is None or entry["tables"] & tables]:
+                self._drop(key)
+                self._stats["invalidations"] += 1
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry["size"]
+        return entry is not None
+
+    @property
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries), bytes=self._bytes, max_bytes=self.max_bytes)
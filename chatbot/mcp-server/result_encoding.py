@@ -0,0 +1,165 @@
+import base64
+import datetime
+import decimal
+import io
+
+FORMATS = ("rows", "columnar", "text", "arrow")
+# Strings are dictionary-encoded when a column has at most this share of distinct values.
+DICTIONARY_MAX_DISTINCT_RATIO = 0.5
+
+
+def _kind(value_type) -> str:
+    if issubclass(value_type, bool):
+        return "bool"
+    if issubclass(value_type, int):
+        return "int"
+    if issubclass(value_type, (float, decimal.Decimal)):
+        return "float"
+    if issubclass(value_type, datetime.datetime):
+        return "datetime"
+    if issubclass(value_type, datetime.date):
+        return "date"
+    if issubclass(value_type, (bytes, bytearray)):
+        return "bytes"
+    return "str"
+
+
+def column_type(values) -> str:
+    """Type of a column from its non-null values; mixed columns are strings."""
+    kinds = {_kind(value_type) for value_type in set(map(type, values)) if value_type is not type(None)}
+    if kinds == {"int", "float"}:
+        return "float"
+    return kinds.pop() if len(kinds) == 1 else ("null" if not kinds else "str")
+
+
+def plain_values(values, kind) -> list:
+    """JSON values of the given column type."""
+    if kind in ("int", "float"):
+        convert = int if kind == "int" else float
+        return [None if value is None else convert(value) for value in values]
+    if kind in ("datetime", "date"):
+        return [None if value is None else value.isoformat() for value in values]
+    if kind == "bytes":
+        return [None if value is None else base64.b64encode(value).decode("ascii") for value in values]
+    if kind in ("str", "null"):
+        return [None if value is None else str(value) for value in values]
+    return values
+
+
+def dictionary_encode(values):
+    """(dictionary, codes) if few enough distinct values repeat, else None."""
+    codes = {}
+    for value in values:
+        if value is not None and value not in codes:
+            codes[value] = len(codes)
+            if len(codes) > len(values) * DICTIONARY_MAX_DISTINCT_RATIO:
+                return None
+    return list(codes), [None if value is None else codes[value] for value in values]
+
+
+def encode_columnar(headers, rows) -> dict:
+    """Column-oriented result: typed value arrays, repeated strings as dictionary + codes."""
+    columns = []
+    for name, values in zip(headers, zip(*rows) if rows else [()] * len(headers)):
+        kind = column_type(values)
+        values = plain_values(values, kind)
+        column = {"name": name, "type": kind}
+        encoded = dictionary_encode(values) if kind == "str" and len(values) > 1 else None
+        if encoded:
+            column["dictionary"], column["codes"] = encoded
+        else:
+            column["values"] = values
+        columns.append(column)
+    return {"row_count": len(rows), "columns": columns}
+
+
+def decode_columnar(result) -> list:
+    """Rows as dicts from an encode_columnar result."""
+    columns = []
+    for column in result["columns"]:
+        if "dictionary" in column:
+            dictionary = column["dictionary"]
+            columns.append([None if code is None else dictionary[code] for code in column["codes"]])
+        else:
+            columns.append(column["values"])
+    names = [column["name"] for column in result["columns"]]
+    return [dict(zip(names, values)) for values in zip(*columns)]
+
+
+def _text_cell(value):
+    if value is None:
+        return "NULL"
+    return str(value).replace("\\", "\\\\").replace("|", "\\|").replace("\n", "\\n")
+
+
+def encode_text(headers, rows) -> str:
+    """Pipe-separated rows under a name:type header line, for reading by the model."""
+    columns = list(zip(*rows)) if rows else [()] * len(headers)
+    kinds = [column_type(values) for values in columns]
+    cells = [[_text_cell(value) for value in plain_values(values, kind)] for values, kind in zip(columns, kinds)]
+    lines = ["|".join(f"{name}:{kind}" for name, kind in zip(headers, kinds))]
+    lines.extend("|".join(row) for row in zip(*cells))
+    return "\n".join(lines)
+
+
+def encode_arrow(headers, rows) -> str:
+    """Base64, zstd-compressed Arrow IPC stream of the result, for programs such as the chart tool."""
+    import pyarrow as pa
+
+    arrays = []
+    for values in (zip(*rows) if rows else [()] * len(headers)):
+        kind = column_type(values)
+        if kind == "float":
+            array = pa.array(plain_values(values, kind), type=pa.float64())
+        elif kind in ("str", "null"):
+            values = plain_values(values, kind)
+            encoded = dictionary_encode(values) if len(values) > 1 else None
+            if encoded:
+                dictionary, codes = encoded
+                index_type = pa.int8() if len(dictionary) < 128 else pa.int16() if len(dictionary) < 32768 else pa.int32()
+                array = pa.DictionaryArray.from_arrays(pa.array(codes, type=index_type), pa.array(dictionary, type=pa.string()))
+            else:
+                array = pa.array(values, type=pa.string())
+        else:
+            array = pa.array(values)
+        arrays.append(array)
+    table = pa.Table.from_arrays(arrays, names=_unique_names(headers))
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema, options=pa.ipc.IpcWriteOptions(compression="zstd")) as writer:
+        writer.write_table(table)
+    return base64.b64encode(sink.getvalue()).decode("ascii")
+
+
+def decode_arrow(data: str):
+    """pandas DataFrame from an encode_arrow result."""
+    import pyarrow as pa
+
+    return pa.ipc.open_stream(base64.b64decode(data)).read_all().to_pandas()
+
+
+def _unique_names(headers):
+    seen = {}
+    names = []
+    for name in headers:
+        count = seen.get(name, 0)
+        seen[name] = count + 1
+        names.append(name if count == 0 else f"{name}_{count}")
+    return names
+
+
+def encode_result(result: dict, result_format: str) -> dict:
+    """Replace headers/data of a query result with the requested encoding, keeping its other fields."""
+    if result_format == "rows" or "data" not in result:
+        return result
+    encoded = {key: value for key, value in result.items() if key not in ("headers", "data")}
+    headers, rows = result["headers"], result["data"]
+    if result_format == "columnar":
+        encoded.update(encode_columnar(headers, rows))
+    elif result_format == "text":
+        encoded.update(row_count=len(rows), text=encode_text(headers, rows))
+    elif result_format == "arrow":
+        encoded.update(row_count=len(rows), arrow_ipc_base64=encode_arrow(headers, rows))
+    else:
+        raise ValueError(f"Unknown result format '{result_format}', expected one of {', '.join(FORMATS)}")
+    encoded["format"] = result_format
+    return encoded
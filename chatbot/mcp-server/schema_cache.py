@@ -0,0 +1,120 @@
+import re
+import threading
+import time
+
+from bm25_index import BM25Index
+
+# Words of snake_case, camelCase and digit-suffixed identifiers, so a question
+# about "order date" matches a column named orderDate or order_date.
+IDENTIFIER_WORD_PATTERN = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+")
+
+
+def split_identifier(name: str) -> list:
+    return [word.lower() for word in IDENTIFIER_WORD_PATTERN.findall(name)]
+
+
+def table_document(table_name: str, columns: dict) -> str:
+    """Searchable text of a table: its name, column names and column descriptions, split into words."""
+    parts = [table_name, " ".join(split_identifier(table_name))]
+    for column_name, description in columns.items():
+        parts.append(column_name)
+        parts.append(" ".join(split_identifier(column_name)))
+        parts.append(description)
+    return "\n".join(parts)
+
+
+class SchemaCache:
+    """Schema descriptions per database, with a keyword index over their tables.
+
+    Each database keeps the fingerprint it was loaded with; callers compare it
+    against a cheap fingerprint query at most every check_seconds and reload
+    the full schema only when it differs. version goes up on every reload.
+    """
+
+    def __init__(self, check_seconds=30.0):
+        self.check_seconds = check_seconds
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "checks": 0, "reloads": 0}
+
+    def get(self, database):
+        with self._lock:
+            return self._entries.get(database)
+
+    def needs_check(self, database) -> bool:
+        entry = self.get(database)
+        return entry is None or time.time() - entry["checked_at"] >= self.check_seconds
+
+    def confirm(self, database, fingerprint) -> bool:
+        """Mark a cached schema as checked; False if the fingerprint changed and it must be reloaded."""
+        with self._lock:
+            self.stats["checks"] += 1
+            entry = self._entries.get(database)
+            if entry is None or entry["fingerprint"] != fingerprint:
+                return False
+            entry["checked_at"] = time.time()
+            return True
+
+    def put(self, database, fingerprint, tables):
+        index = BM25Index()
+        names = [name for name in tables]
+        index.add(names, [table_document(name, tables[name]) for name in names])
+        with self._lock:
+            self.stats["reloads"] += 1
+            previous = self._entries.get(database)
+            entry = {
+                "fingerprint": fingerprint,
+                "tables": tables,
+                "index": index,
+                "version": previous["version"] + 1 if previous else 1,
+                "loaded_at": time.time(),
+                "checked_at": time.time()
+            }
+            self._entries[database] = entry
+        return entry
+
+    def hit(self):
+        with self._lock:
+            self.stats["hits"] += 1
+
+    def relevant_tables(self, database, question, max_tables=5, max_columns=20) -> dict:
+        """The tables best matching a question, each cut to its key and matching columns."""
+        entry = self.get(database)
+        ranked = entry["index"].search(question, max_tables)
+        question_words = set(split_identifier(question)) | set(question.lower().split())
+        tables = {}
+        for table_name, score in ranked:
+            columns = entry["tables"][table_name]
+            if len(columns) > max_columns:
+                columns = self._slice_columns(columns, question_words, max_columns)
+            tables[table_name] = columns
+        return {
+            "database": database,
+            "version": entry["version"],
+            "tables": tables,
+            "other_tables": [name for name in entry["tables"] if name not in tables]
+        }
+
+    @staticmethod
+    def _slice_columns(columns, question_words, max_columns):
+        def matches(column_name):
+            return bool(question_words & ({column_name.lower()} | set(split_identifier(column_name))))
+
+        primary_key = {name.strip() for name in columns.get("primary_key", "").split(",")}
+        chosen = [name for name in columns if name == "primary_key" or name in primary_key or matches(name)]
+        for name in columns:
+            if len(chosen) >= max_columns:
+                break
+            if name not in chosen:
+                chosen.append(name)
+        sliced = {name: columns[name] for name in columns if name in chosen}
+        sliced["omitted_columns"] = len(columns) - len(sliced)
+        return sliced
+
+    def info(self):
+        with self._lock:
+            databases = {
+                name: {"version": entry["version"], "tables": len(entry["tables"]), "loaded_at": entry["loaded_at"]}
+                for name, entry in self._entries.items()
+            }
+            return dict(self.stats, databases=databases)
@@ -1,11 +1,31 @@
+import asyncio
+import json
+import queue
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import mysql.connector
 from fastmcp import FastMCP
-from typing import Annotated
+from typing import Annotated, Literal
 from pydantic import Field
 from dotenv import load_dotenv
 import os
 import logging
 import re
+from concurrent_queries import distinct_queries, run_concurrently
+from query_plan import rows_until_limit, suggestions, summarize_plan
+from query_sample import CONFIDENCE, estimate, plan_approximation, sample_table_name, substitute_table, table_references
+from query_stats import QueryStats
+from result_cache import ResultCache
+from result_encoding import encode_result
+from schema_cache import SchemaCache
+from sql_pool import PoolTimeout
+from sql_sources import load_sources
+from sql_text import (
+    add_execution_time_hint, add_limit, changes_session, count_statement, has_aggregate, is_pageable, is_read_only,
+    is_single_statement, is_volatile, normalize_sql, page_statement, referenced_databases, referenced_tables
+)
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -14,163 +34,1016 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), "../.env"))
 
-# Initialize MySQL connection
-try:
-    mydb = mysql.connector.connect(
-        host=os.getenv("MYSQL_HOST", "localhost"),
-        user=os.getenv("MYSQL_USER", "root"),
-        password=os.getenv("MYSQL_PASSWORD", ""),
-        connection_timeout=600
-    )
-    logger.info("Successfully connected to MySQL database")
-except mysql.connector.Error as e:
-    logger.error(f"Failed to connect to MySQL: {str(e)}")
-    raise Exception(f"MySQL connection failed: {str(e)}")
+# Connections are pooled so tool calls from different conversations run in
+# parallel. Pooled connections run in autocommit mode and carry no session
+# state between calls; a connection that ran USE/SET is closed after use.
+SQL_POOL_SIZE = int(os.getenv("SQL_POOL_SIZE", "8"))
+SQL_POOL_TIMEOUT_SECONDS = float(os.getenv("SQL_POOL_TIMEOUT_SECONDS", "10"))
+# Idle connections older than this are pinged before reuse.
+SQL_POOL_PING_AFTER_SECONDS = float(os.getenv("SQL_POOL_PING_AFTER_SECONDS", "5"))
+# Client errors meaning the server connection is gone (server gone away, lost
+# connection during query, not connected).
+LOST_CONNECTION_ERRNOS = {2006, 2013, 2055}
+# Client errors for a server that cannot be reached at all (refused, unknown host).
+CONNECT_ERRNOS = {2003, 2005}
+
+# Each database in tool_source.json is served by the data source named in its
+# "source" field (the MYSQL_* server by default), each with its own primary,
+# read replicas and pools; see sql_sources.load_sources. Read-only statements
+# go to a replica and fail over to the primary. A replica that fails, or lags
+# more than SQL_REPLICA_MAX_LAG_SECONDS at the check every
+# SQL_REPLICA_CHECK_SECONDS, is skipped for SQL_REPLICA_RETRY_SECONDS. After a
+# write, reads of that source stay on the primary for SQL_READ_AFTER_WRITE_SECONDS.
+SQL_REPLICA_MAX_LAG_SECONDS = float(os.getenv("SQL_REPLICA_MAX_LAG_SECONDS", "30"))
+SQL_REPLICA_CHECK_SECONDS = float(os.getenv("SQL_REPLICA_CHECK_SECONDS", "10"))
+SQL_REPLICA_RETRY_SECONDS = float(os.getenv("SQL_REPLICA_RETRY_SECONDS", "30"))
+SQL_READ_AFTER_WRITE_SECONDS = float(os.getenv("SQL_READ_AFTER_WRITE_SECONDS", "5"))
+
+# Statements run on a bounded worker pool and get this long, including time
+# spent waiting for a worker or a connection. SELECTs carry a
+# MAX_EXECUTION_TIME hint so MySQL aborts them itself; anything still running
+# at the deadline is stopped with KILL QUERY. Keep it below the chat client's
+# 30 second tool timeout.
+SQL_QUERY_TIMEOUT_SECONDS = float(os.getenv("SQL_QUERY_TIMEOUT_SECONDS", "25"))
+SQL_WORKERS = int(os.getenv("SQL_WORKERS", str(SQL_POOL_SIZE)))
+# Server errors for a statement stopped by KILL QUERY or MAX_EXECUTION_TIME.
+INTERRUPTED_ERRNOS = {1317, 3024}
+
+# query_db returns at most SQL_PAGE_ROWS rows (callers may ask for up to
+# SQL_MAX_PAGE_ROWS) plus a token for the next page. SELECTs are paged on the
+# server with LIMIT/OFFSET; other statements are read with an unbuffered
+# cursor and the connection is dropped rather than drained when more than
+# SQL_DRAIN_ROWS rows are left over.
+SQL_PAGE_ROWS = int(os.getenv("SQL_PAGE_ROWS", "200"))
+SQL_MAX_PAGE_ROWS = int(os.getenv("SQL_MAX_PAGE_ROWS", "1000"))
+SQL_DRAIN_ROWS = int(os.getenv("SQL_DRAIN_ROWS", "1000"))
+SQL_PAGE_TOKEN_TTL_SECONDS = float(os.getenv("SQL_PAGE_TOKEN_TTL_SECONDS", "900"))
+SQL_MAX_PAGE_TOKENS = int(os.getenv("SQL_MAX_PAGE_TOKENS", "1000"))
+# Total row counts are only reported when COUNT(*) finishes within this time.
+SQL_COUNT_TIMEOUT_SECONDS = float(os.getenv("SQL_COUNT_TIMEOUT_SECONDS", "2"))
+DUPLICATE_COLUMN_ERRNO = 1060
+
+# Schemas are cached per database and re-validated with a one-row fingerprint
+# query at most every SQL_SCHEMA_CHECK_SECONDS; the databases listed in
+# tool_source.json are loaded at startup.
+SQL_SCHEMA_CHECK_SECONDS = float(os.getenv("SQL_SCHEMA_CHECK_SECONDS", "30"))
+SQL_SCHEMA_SLICE_TABLES = int(os.getenv("SQL_SCHEMA_SLICE_TABLES", "5"))
+SQL_SCHEMA_SLICE_COLUMNS = int(os.getenv("SQL_SCHEMA_SLICE_COLUMNS", "20"))
+TOOL_SOURCE_PATH = os.path.join(os.path.dirname(__file__), "tool_source.json")
+# Changes to any column definition, and table re-creation, change the fingerprint.
+SCHEMA_FINGERPRINT_QUERY = """
+    SELECT COUNT(*),
+           SUM(CRC32(CONCAT_WS('|', TABLE_NAME, COLUMN_NAME, ORDINAL_POSITION, COLUMN_TYPE, IS_NULLABLE,
+                               COLUMN_DEFAULT, COLUMN_KEY, COLUMN_COMMENT))),
+           (SELECT MAX(CREATE_TIME) FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_SCHEMA = %s)
+    FROM INFORMATION_SCHEMA.COLUMNS
+    WHERE TABLE_SCHEMA = %s
+"""
+schema_cache = SchemaCache(check_seconds=SQL_SCHEMA_CHECK_SECONDS)
+
+# Read-only query_db results are cached by normalized SQL (0 MB disables it).
+# Entries expire after SQL_RESULT_CACHE_TTL_SECONDS, are dropped by writes made
+# through query_db, and older than SQL_RESULT_CACHE_VERIFY_SECONDS are checked
+# against the CREATE_TIME/UPDATE_TIME of their tables before reuse (set
+# information_schema_stats_expiry=0 on the server for up-to-date times).
+# Queries using NOW(), RAND(), SQL_NO_CACHE and the like are never cached.
+SQL_RESULT_CACHE_MB = float(os.getenv("SQL_RESULT_CACHE_MB", "64"))
+SQL_RESULT_CACHE_TTL_SECONDS = float(os.getenv("SQL_RESULT_CACHE_TTL_SECONDS", "300"))
+SQL_RESULT_CACHE_VERIFY_SECONDS = float(os.getenv("SQL_RESULT_CACHE_VERIFY_SECONDS", "10"))
+result_cache = ResultCache(int(SQL_RESULT_CACHE_MB * 1024 * 1024), SQL_RESULT_CACHE_TTL_SECONDS)
+
+# Before a new SELECT runs, EXPLAIN FORMAT=JSON estimates the rows it reads
+# and its optimizer cost; over either limit (0 disables a limit) it is
+# rejected with suggestions, unless its page LIMIT stops the scan early.
+SQL_GUARD_MAX_ROWS_EXAMINED = int(float(os.getenv("SQL_GUARD_MAX_ROWS_EXAMINED", "5000000")))
+SQL_GUARD_MAX_COST = float(os.getenv("SQL_GUARD_MAX_COST", "0"))
+guard_stats = {"checked": 0, "rejected": 0, "allowed_by_limit": 0, "explain_failures": 0}
+
+# query_many runs its queries side by side, each on its own pooled connection,
+# so keep this at or below SQL_POOL_SIZE.
+SQL_QUERY_MANY_MAX = int(os.getenv("SQL_QUERY_MANY_MAX", str(SQL_POOL_SIZE)))
+
+# query_db(approximate=True) estimates SUM/COUNT/AVG aggregates over tables of
+# at least SQL_SAMPLE_MIN_ROWS rows from deterministic hash samples of about
+# SQL_SAMPLE_ROWS rows. The samples live in SQL_SAMPLE_SCHEMA and are rebuilt
+# in the background every SQL_SAMPLE_REFRESH_SECONDS. Building them scans the
+# large tables on each source's primary, so it is off unless SQL_SAMPLE_ROWS is set.
+SQL_SAMPLE_ROWS = int(os.getenv("SQL_SAMPLE_ROWS", "0"))
+SQL_SAMPLE_MIN_ROWS = int(os.getenv("SQL_SAMPLE_MIN_ROWS", "1000000"))
+SQL_SAMPLE_SCHEMA = os.getenv("SQL_SAMPLE_SCHEMA", "chatbot_samples")
+SQL_SAMPLE_REFRESH_SECONDS = float(os.getenv("SQL_SAMPLE_REFRESH_SECONDS", "3600"))
+SAMPLE_HASH_BUCKETS = 1000000
+sampling_enabled = SQL_SAMPLE_ROWS > 0 and bool(re.match(r'^[a-zA-Z0-9_]+$', SQL_SAMPLE_SCHEMA))
+# (database, table) -> the sample standing in for it in approximate queries.
+samples = {}
+sample_requests = queue.Queue()
+sample_errors = {}
+sample_stats = {"built": 0, "build_failures": 0, "estimated": 0, "answered_exactly": 0, "unsupported": 0, "not_ready": 0}
+
+# Every statement is recorded under its fingerprint (literals replaced by ?)
+# with call count, latency histogram, rows and errors, and the stats are saved
+# every SQL_STATS_FLUSH_SECONDS. Statements slower than SQL_SLOW_QUERY_MS are
+# logged with their fingerprint id; full statement text is only logged at DEBUG.
+SQL_STATS_PATH = os.getenv("SQL_STATS_PATH", os.path.join(os.path.dirname(__file__), "files", "sql_stats.json"))
+SQL_STATS_FLUSH_SECONDS = float(os.getenv("SQL_STATS_FLUSH_SECONDS", "60"))
+SQL_STATS_MAX_FINGERPRINTS = int(os.getenv("SQL_STATS_MAX_FINGERPRINTS", "1000"))
+SQL_STATS_TOP = int(os.getenv("SQL_STATS_TOP", "10"))
+SQL_SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS", "1000"))
+query_stats = QueryStats(SQL_STATS_PATH, SQL_STATS_MAX_FINGERPRINTS)
+
+sql_executor = ThreadPoolExecutor(max_workers=SQL_WORKERS, thread_name_prefix="sql")
+execution_stats = {"queries": 0, "timeouts": 0, "cancelled_before_start": 0, "killed": 0, "kill_failures": 0}
+
+class QueryTimeout(Exception):
+    """The statement's deadline passed before it could start."""
+
+sources, unknown_sources = load_sources(
+    TOOL_SOURCE_PATH,
+    {"size": SQL_POOL_SIZE, "checkout_timeout": SQL_POOL_TIMEOUT_SECONDS, "ping_after_seconds": SQL_POOL_PING_AFTER_SECONDS},
+    SQL_READ_AFTER_WRITE_SECONDS,
+    shared_schemas=[SQL_SAMPLE_SCHEMA]
+)
+for name in unknown_sources:
+    logger.error(f"Data source '{name}' in {TOOL_SOURCE_PATH} is not listed in SQL_SOURCES, using the default source")
+
+# Connect once up front so a misconfiguration shows in the log; the pools keep
+# retrying on later calls, so the other MCP servers still start without MySQL.
+for source in sources:
+    for server in source.servers:
+        try:
+            server.pool.release(server.pool.acquire())
+            logger.info(f"Successfully connected to MySQL server {server.name} ({server.host}:{server.port})")
+        except (mysql.connector.Error, PoolTimeout) as e:
+            logger.error(f"Failed to connect to MySQL server {server.name}: {str(e)}")
 
 sql_mcp = FastMCP("SQL")
 
-@sql_mcp.tool()
-def query_db(query: Annotated[str, Field(description="The SQL query to be executed, remember to fetch the schema via the tool beforehand and connect to the database")]) -> dict:
-    """Execute the SQL query and return results as a dictionary."""
-    cursor = None
+class RunningQuery:
+    """Tracks the server and connection a statement runs on, so a timeout only ever kills that statement."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.server = None
+        self.connection_id = None
+        self.cancelled = False
+
+    def attach(self, server, connection_id):
+        with self._lock:
+            if self.cancelled:
+                raise QueryTimeout("Query was cancelled before it started")
+            self.server = server
+            self.connection_id = connection_id
+
+    def detach(self):
+        with self._lock:
+            self.connection_id = None
+
+    def cancel(self):
+        """Stop the statement. Returns True if a running statement was killed."""
+        with self._lock:
+            self.cancelled = True
+            if self.connection_id is None:
+                return False
+            kill_query(self.server, self.connection_id)
+            return True
+
+def kill_query(server, connection_id):
+    """Abort the statement running on a connection, from a separate connection to the same server."""
+    connection = server.connect()
     try:
-        cursor = mydb.cursor()
-        cursor.execute(query)
-        rows = cursor.fetchall()
-        if cursor.description is None:
-            logger.warning(f"Query '{query}' returned no metadata")
-            return {"headers": [], "data": []}
-        headers = [field_md[0] for field_md in cursor.description]
-        logger.info(f"Query executed successfully: {query}")
-        return {"headers": headers, "data": rows}
-    except mysql.connector.Error as e:
-        logger.error(f"Error executing query '{query}': {str(e)}")
-        return {"error": str(e)}
+        cursor = connection.cursor()
+        cursor.execute(f"KILL QUERY {int(connection_id)}")
+        cursor.close()
     finally:
-        if cursor:
-            cursor.close()
+        connection.close()
+
+def fetch_rows(cursor, skip, max_rows):
+    """Read max_rows rows after skipping skip rows; returns (rows, more, drained)."""
+    while skip > 0:
+        skipped = cursor.fetchmany(min(skip, SQL_DRAIN_ROWS))
+        if not skipped:
+            return [], False, True
+        skip -= len(skipped)
+    rows = cursor.fetchmany(max_rows + 1)
+    if len(rows) <= max_rows:
+        return rows, False, True
+    # Finish small leftovers so the connection can be reused.
+    leftover = cursor.fetchmany(SQL_DRAIN_ROWS)
+    return rows[:max_rows], True, len(leftover) < SQL_DRAIN_ROWS
+
+def run_query(query: str, params=None, running=None, deadline=None, skip=0, max_rows=None, source=None) -> dict:
+    """Run a statement on a pooled connection of its data source and fetch its rows.
+
+    Read-only statements run on a replica when the source has one; if that
+    server cannot be reached they move on to the next one and finally to the
+    primary, where they are retried once on a fresh connection if the server
+    dropped the one they ran on. With a deadline (time.monotonic() based) the
+    connection wait and the server-side execution time are bounded by it.
+    With max_rows only that many rows (after skip) are read from the
+    unbuffered cursor, and "more" tells whether the result had further rows.
+    """
+    source = source or sources.for_databases(referenced_databases(query))
+    read_only = is_read_only(query)
+    servers = source.route(read_only)
+    for attempt, server in enumerate(servers):
+        last = attempt + 1 == len(servers)
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+            raise QueryTimeout("Query deadline passed before it could start")
+        try:
+            connection = server.pool.acquire(None if remaining is None else min(SQL_POOL_TIMEOUT_SECONDS, remaining))
+        except (mysql.connector.Error, PoolTimeout) as e:
+            if last or server is servers[attempt + 1]:
+                raise
+            if isinstance(e, mysql.connector.Error):
+                source.mark_down(server, SQL_REPLICA_RETRY_SECONDS, e)
+            logger.warning(f"Cannot use {server.name}, running query on {servers[attempt + 1].name}: {str(e)}")
+            continue
+        broken = changes_session(query)
+        cursor = None
+        try:
+            if running is not None:
+                running.attach(server, connection.connection_id)
+            statement = query if remaining is None else add_execution_time_hint(query, remaining)
+            cursor = connection.cursor(buffered=False)
+            if params:
+                cursor.execute(statement, params)
+            else:
+                cursor.execute(statement)
+            if cursor.description is None:
+                logger.warning(f"Query '{query}' returned no metadata")
+                return {"headers": [], "data": []}
+            headers = [field_md[0] for field_md in cursor.description]
+            if max_rows is None:
+                rows = cursor.fetchall()
+                logger.debug(f"Query executed successfully: {query}")
+                return {"headers": headers, "data": rows}
+            rows, more, drained = fetch_rows(cursor, skip, max_rows)
+            broken = broken or not drained
+            logger.debug(f"Query executed successfully: {query}")
+            return {"headers": headers, "data": rows, "more": more}
+        except (mysql.connector.InterfaceError, mysql.connector.OperationalError) as e:
+            broken = True
+            # Errors without an errno come from the client when the socket is already gone.
+            if not last and e.errno in LOST_CONNECTION_ERRNOS | CONNECT_ERRNOS | {None, -1}:
+                source.mark_down(server, SQL_REPLICA_RETRY_SECONDS, e)
+                logger.warning(f"Connection to {server.name} lost running '{query}', retrying on {servers[attempt + 1].name}: {str(e)}")
+                continue
+            raise
+        finally:
+            if running is not None:
+                running.detach()
+            if cursor:
+                try:
+                    cursor.close()
+                except mysql.connector.Error:
+                    broken = True
+            server.pool.release(connection, broken)
+            if not read_only:
+                source.wrote()
+
+def time_left(deadline):
+    """Seconds until a time.monotonic() deadline, as a statement timeout; None without a deadline."""
+    if deadline is None:
+        return None
+    return max(deadline - time.monotonic(), 0.001)
+
+def multiple_statements_error():
+    return {
+        "error": "Only one statement can run per query; send the statements separately.",
+        "error_type": "multiple_statements"
+    }
+
+def timeout_error(timeout):
+    return {
+        "error": f"Query exceeded the {timeout:g}s time limit and was cancelled. "
+                 "Narrow it down with filters, aggregates or a LIMIT and try again.",
+        "error_type": "timeout",
+        "timeout": True
+    }
+
+async def cost_guard(query, statement, limit, deadline=None):
+    """A structured error if statement (query as it will run) is estimated too expensive, else None."""
+    if not (SQL_GUARD_MAX_ROWS_EXAMINED or SQL_GUARD_MAX_COST):
+        return None
+    guard_stats["checked"] += 1
+    res = await execute_query_with_params(f"EXPLAIN FORMAT=JSON {statement}", timeout=time_left(deadline))
+    if "error" in res or not res["data"]:
+        # Let the statement run; it reports its own error if it is invalid.
+        guard_stats["explain_failures"] += 1
+        logger.warning(f"EXPLAIN failed, running query unchecked: {res.get('error')}")
+        return None
+    try:
+        summary = summarize_plan(res["data"][0][0])
+    except (ValueError, TypeError, AttributeError) as e:
+        guard_stats["explain_failures"] += 1
+        logger.warning(f"Could not read query plan, running query unchecked: {str(e)}")
+        return None
+    too_many_rows = SQL_GUARD_MAX_ROWS_EXAMINED and summary["rows_examined"] > SQL_GUARD_MAX_ROWS_EXAMINED
+    too_costly = SQL_GUARD_MAX_COST and summary["cost"] > SQL_GUARD_MAX_COST
+    if not (too_many_rows or too_costly):
+        return None
+    early_stop = None if has_aggregate(query) else rows_until_limit(summary, limit)
+    if early_stop is not None and (not SQL_GUARD_MAX_ROWS_EXAMINED or early_stop <= SQL_GUARD_MAX_ROWS_EXAMINED):
+        guard_stats["allowed_by_limit"] += 1
+        return None
+    guard_stats["rejected"] += 1
+    logger.warning(f"Query rejected by cost guard ({summary['rows_examined']} rows, cost {summary['cost']}): {query}")
+    return {
+        "error": f"Query not run: it would read about {summary['rows_examined']:,} rows "
+                 f"(estimated cost {summary['cost']:,.0f}), over this server's limits. Refine it and try again.",
+        "error_type": "query_too_expensive",
+        "estimate": {
+            "rows_examined": summary["rows_examined"],
+            "cost": summary["cost"],
+            "full_scans": summary["full_scans"],
+            "cartesian_joins": summary["cartesian_joins"]
+        },
+        "limits": {"max_rows_examined": SQL_GUARD_MAX_ROWS_EXAMINED or None, "max_cost": SQL_GUARD_MAX_COST or None},
+        "suggestions": suggestions(summary)
+    }
+
+# Continuation tokens handed out by query_db and query_many: token -> next page of a query.
+page_tokens = {}
+
+def issue_page_token(query, offset, max_rows, total_rows):
+    now = time.monotonic()
+    for token in [t for t, page in page_tokens.items() if page["expires"] < now]:
+        del page_tokens[token]
+    while len(page_tokens) >= SQL_MAX_PAGE_TOKENS:
+        del page_tokens[next(iter(page_tokens))]
+    token = secrets.token_urlsafe(9)
+    page_tokens[token] = {
+        "query": query,
+        "offset": offset,
+        "max_rows": max_rows,
+        "total_rows": total_rows,
+        "expires": now + SQL_PAGE_TOKEN_TTL_SECONDS
+    }
+    return token
+
+async def table_markers(tables, source):
+    """Creation and update times of the named tables, or None if they cannot be read.
 
-def execute_query_with_params(query: str, params=None) -> dict:
-    """Execute SQL query with optional parameters - internal helper function."""
-    cursor = None
+    They are read from the primary, as replicas each keep their own update times.
+    """
+    if not tables:
+        return []
+    names = sorted(tables)
+    res = await execute_query_with_params(
+        "SELECT TABLE_SCHEMA, TABLE_NAME, CREATE_TIME, UPDATE_TIME FROM INFORMATION_SCHEMA.TABLES "
+        f"WHERE LOWER(TABLE_NAME) IN ({', '.join(['%s'] * len(names))})",
+        tuple(names),
+        source=source.primary_only
+    )
+    if "error" in res:
+        return None
+    return sorted([str(value) for value in row] for row in res["data"])
+
+async def cached_result(query, part, load, use_cache=True) -> dict:
+    """load() through the result cache; part tells apart different results of the same query."""
+    try:
+        source = sources.for_databases(referenced_databases(query))
+    except ValueError:
+        source = None
+    if not (result_cache.enabled and use_cache and is_read_only(query) and source) or is_volatile(query):
+        result_cache.bypass()
+        return await load()
+    key = (source.name, normalize_sql(query), part)
+    entry = result_cache.get(key)
+    if entry is not None:
+        if entry["markers"] is None or time.time() - entry["verified_at"] < SQL_RESULT_CACHE_VERIFY_SECONDS:
+            result_cache.hit(entry)
+            return dict(entry["result"], cached=True)
+        if await table_markers(entry["tables"], source) == entry["markers"]:
+            result_cache.verified(key)
+            result_cache.hit(entry)
+            return dict(entry["result"], cached=True)
+        result_cache.discard(key)
+    tables = referenced_tables(query)
+    # Read the markers first, so a change made while the query runs shows up at the next check.
+    markers = await table_markers(tables, source)
+    res = await load()
+    if "error" not in res:
+        result_cache.put(key, dict(res), tables, markers)
+    return res
+
+async def count_rows(query, use_cache=True, deadline=None):
+    """Total rows of a SELECT, or None if counting is not cheap."""
+    timeout = min(SQL_COUNT_TIMEOUT_SECONDS, time_left(deadline) or SQL_COUNT_TIMEOUT_SECONDS)
+    res = await cached_result(
+        query, ("count",),
+        lambda: execute_query_with_params(count_statement(query), timeout=timeout),
+        use_cache
+    )
+    if "error" in res or not res["data"]:
+        return None
+    return int(res["data"][0][0])
+
+async def fetch_page(query, offset, max_rows, guard=False, deadline=None, source=None) -> dict:
+    """One page of a query's rows; with guard, expensive SELECTs are rejected before they run."""
+    statement = query
+    if is_pageable(query):
+        paged = page_statement(query, offset, max_rows + 1)
+        rejection = await cost_guard(query, paged, offset + max_rows + 1, deadline) if guard else None
+        if rejection:
+            return rejection
+        res = await execute_query_with_params(paged, timeout=time_left(deadline), max_rows=max_rows, source=source)
+        if res.get("errno") != DUPLICATE_COLUMN_ERRNO:
+            return res
+        # SELECT * over a derived table fails on duplicate column names (e.g. a join's two ids),
+        # so bound the query itself instead.
+        statement = add_limit(query, offset + max_rows + 1)
+        rejection = await cost_guard(query, statement, offset + max_rows + 1, deadline) if guard else None
+        if rejection:
+            return rejection
+    return await execute_query_with_params(statement, timeout=time_left(deadline), skip=offset, max_rows=max_rows, source=source)
+
+@sql_mcp.tool()
+async def query_db(
+    query: Annotated[str, Field(description="The SQL query to be executed, remember to fetch the schema via the tool beforehand and connect to the database")] = "",
+    page_token: Annotated[str, Field(description="next_page_token from a previous result, to fetch the following rows of the same query")] = "",
+    max_rows: Annotated[int, Field(description=f"Rows per page, at most {SQL_MAX_PAGE_ROWS}")] = SQL_PAGE_ROWS,
+    use_cache: Annotated[bool, Field(description="Set to false when the result must reflect the latest data")] = True,
+    result_format: Annotated[
+        Literal["rows", "columnar", "text", "arrow"],
+        Field(description="rows: headers + row lists; columnar: typed column arrays with repeated strings dictionary-encoded; "
+                          "text: compact pipe-separated table; arrow: base64 Arrow IPC stream for programs such as the chart tool")
+    ] = "rows",
+    approximate: Annotated[bool, Field(description="Estimate SUM/COUNT/AVG aggregates over large tables from a sample in under a second, "
+                                                   "with error margins; for rough or exploratory figures only")] = False
+) -> dict:
+    """Execute the SQL query and return results as a dictionary.
+
+    Large results come back one page at a time with a next_page_token.
+    Repeated read-only queries may be answered from cache ("cached": true).
+    Approximate results carry error_bounds and exact_available.
+    """
+    if not is_single_statement(query):
+        return multiple_statements_error()
+    if approximate and not page_token:
+        return encoded(await approximate_query(query, max(1, min(max_rows, SQL_MAX_PAGE_ROWS))), result_format)
+    return encoded(await paged_query(query, page_token, max_rows, use_cache), result_format)
+
+def encoded(res, result_format) -> dict:
+    try:
+        return encode_result(res, result_format)
+    except ImportError:
+        return {"error": "The arrow format needs pyarrow installed on the server; use columnar instead"}
+
+async def approximate_query(query, max_rows) -> dict:
+    """Estimate an aggregate query from the sample of its largest table; queries over small tables run exactly."""
+    if not sampling_enabled:
+        return {"error": "Approximate mode is disabled on this server, run the query with approximate=false"}
     try:
-        cursor = mydb.cursor()
-        if params:
-            cursor.execute(query, params)
+        plan = plan_approximation(query)
+    except ValueError as e:
+        sample_stats["unsupported"] += 1
+        return {
+            "error": f"This query cannot be estimated from a sample: {str(e)}. Run it with approximate=false.",
+            "error_type": "approximation_unsupported",
+            "exact_available": True
+        }
+    references = table_references(plan["select"])
+    sampled = [(reference, samples[key]) for reference in references if (key := sample_key(reference)) in samples]
+    if not sampled:
+        return await unsampled_query(query, references, max_rows)
+    reference, sample = max(sampled, key=lambda item: item[1]["population"])
+    if sum(1 for other, _ in sampled if other["table"] == reference["table"]) > 1:
+        sample_stats["unsupported"] += 1
+        return {
+            "error": f"A query joining `{reference['table']}` to itself cannot be estimated from a sample. "
+                     "Run it with approximate=false.",
+            "error_type": "approximation_unsupported",
+            "exact_available": True
+        }
+    statement = substitute_table(plan["select"], reference, f"`{SQL_SAMPLE_SCHEMA}`.`{sample['sample_table']}`")
+    # Every source keeps the samples of its own databases in the sample schema.
+    source = sources.for_database(sample["database"])
+    res, exact_available = await asyncio.gather(fetch_page(statement, 0, max_rows, source=source), exact_allowed(query, max_rows))
+    if "error" in res:
+        return dict(res, exact_available=exact_available)
+    scale = sample["population"] / sample["sample_rows"]
+    headers, rows, margins = estimate(plan, res["headers"], res["data"], scale)
+    sample_stats["estimated"] += 1
+    age_minutes = (time.time() - sample["refreshed_at"]) / 60
+    message = (
+        f"Estimated from a {100 / scale:.2g}% sample of {sample['database']}.{sample['table']} "
+        f"({sample['sample_rows']:,} of {sample['population']:,} rows, refreshed {age_minutes:.0f} min ago); "
+        f"error_bounds holds {CONFIDENCE:.0%} margins. Run with approximate=false for exact values."
+    )
+    if res.get("more"):
+        message += f" Only the first {max_rows} rows are shown."
+    return {
+        "headers": headers,
+        "data": rows,
+        "approximate": True,
+        "exact_available": exact_available,
+        "error_bounds": {"confidence": CONFIDENCE, "margins": margins},
+        "sample": {
+            "table": f"{sample['database']}.{sample['table']}",
+            "sample_rows": sample["sample_rows"],
+            "population_rows": sample["population"],
+            "refreshed_at": sample["refreshed_at"]
+        },
+        "message": message
+    }
+
+def sample_key(reference):
+    """The samples key of a table reference; unqualified names match a sampled table of that name."""
+    if reference["database"]:
+        matches = [key for key in list(samples) if key[0] == reference["database"] and key[1].lower() == reference["table"].lower()]
+    else:
+        matches = [key for key in list(samples) if key[1].lower() == reference["table"].lower()]
+    return matches[0] if len(matches) == 1 else None
+
+async def exact_allowed(query, max_rows):
+    """Whether the cost guard lets the exact query run."""
+    return await cost_guard(query, page_statement(query, 0, max_rows + 1), max_rows + 1) is None
+
+async def unsampled_query(query, references, max_rows) -> dict:
+    """Answer exactly when the query only reads small tables, else ask for samples of the large ones."""
+    databases = sorted({reference["database"] for reference in references if reference["database"]})
+    named = {(reference["database"], reference["table"].lower()) for reference in references}
+    large = []
+    for source, names in sources_of(databases):
+        res = await execute_query_with_params(*table_sizes_statement(names), source=source)
+        if "error" in res:
+            return res
+        large += [(db, table) for db, table, rows in res["data"] if (db, table.lower()) in named and (rows or 0) >= SQL_SAMPLE_MIN_ROWS]
+    if not large:
+        sample_stats["answered_exactly"] += 1
+        res = await paged_query(query, "", max_rows, True)
+        if "error" not in res:
+            res.update(approximate=False, exact_available=True)
+        return res
+    sample_stats["not_ready"] += 1
+    failures = [f"{db}.{table}: {sample_errors[(db, table)]}" for db, table in large if (db, table) in sample_errors]
+    for key in large:
+        sample_requests.put(key)
+    names = ", ".join(f"{db}.{table}" for db, table in large)
+    return {
+        "error": f"No sample of {names} could be built: {'; '.join(failures)}" if failures else
+                 f"No sample of {names} is ready yet; it is being built. Run the query with approximate=false "
+                 "for the exact answer, or try approximate mode again in a few minutes.",
+        "error_type": "sample_not_ready",
+        "exact_available": await exact_allowed(query, max_rows)
+    }
+
+async def paged_query(query, page_token, max_rows, use_cache, deadline=None) -> dict:
+    offset, total_rows = 0, None
+    if page_token:
+        page = page_tokens.get(page_token)
+        if page is None or page["expires"] < time.monotonic():
+            return {"error": "Unknown or expired page_token, run the query again"}
+        query, offset, max_rows, total_rows = page["query"], page["offset"], page["max_rows"], page["total_rows"]
+    elif not query.strip():
+        return {"error": "Either query or page_token is required"}
+    max_rows = max(1, min(max_rows, SQL_MAX_PAGE_ROWS))
+
+    res = await cached_result(
+        query, ("page", offset, max_rows), lambda: fetch_page(query, offset, max_rows, not page_token, deadline), use_cache
+    )
+    if not is_read_only(query):
+        result_cache.invalidate_tables(referenced_tables(query) or None)
+    if "error" in res:
+        return res
+    more = res.pop("more", False)
+    if not more and not offset:
+        return res
+    res["offset"] = offset
+    if not more:
+        res["total_rows"] = offset + len(res["data"])
+        return res
+    if total_rows is None and is_pageable(query):
+        total_rows = await count_rows(query, use_cache, deadline)
+    if total_rows is not None:
+        res["total_rows"] = total_rows
+    res["next_page_token"] = issue_page_token(query, offset + max_rows, max_rows, total_rows)
+    res["message"] = f"Showing rows {offset + 1}-{offset + len(res['data'])}; pass next_page_token to get more"
+    return res
+
+@sql_mcp.tool()
+async def query_many(
+    queries: Annotated[list[str], Field(description="Independent read-only queries to run at once, e.g. totals per year, top products and a row count")],
+    max_rows: Annotated[int, Field(description=f"Rows per page of each result, at most {SQL_MAX_PAGE_ROWS}")] = SQL_PAGE_ROWS,
+    use_cache: Annotated[bool, Field(description="Set to false when the results must reflect the latest data")] = True,
+    result_format: Annotated[
+        Literal["rows", "columnar", "text", "arrow"],
+        Field(description="Encoding of every result, as in query_db")
+    ] = "rows",
+    timeout_seconds: Annotated[float, Field(description=f"Time limit for all queries together, at most {SQL_QUERY_TIMEOUT_SECONDS:g}")] = SQL_QUERY_TIMEOUT_SECONDS
+) -> dict:
+    """Run several read-only queries concurrently on separate connections.
+
+    Takes about as long as the slowest query. Every query gets its own entry
+    in results, with an error if it failed or did not finish in time; large
+    results carry a next_page_token for query_db.
+    """
+    queries = distinct_queries(queries)
+    if not queries:
+        return {"error": "No queries provided"}
+    if len(queries) > SQL_QUERY_MANY_MAX:
+        return {"error": f"At most {SQL_QUERY_MANY_MAX} queries can be run at once"}
+    if not all(is_single_statement(text) for text in queries):
+        return multiple_statements_error()
+    writes = [text for text in queries if not is_read_only(text)]
+    if writes:
+        return {"error": "query_many only runs read-only queries, use query_db for the others", "queries": writes}
+    timeout = min(max(timeout_seconds, 1), SQL_QUERY_TIMEOUT_SECONDS)
+
+    async def run(text, deadline):
+        return encoded(await paged_query(text, "", max_rows, use_cache, deadline), result_format)
+
+    started = time.monotonic()
+    results = await run_concurrently(queries, run, timeout, timeout_error)
+    elapsed_ms = int((time.monotonic() - started) * 1000)
+    failed = sum(1 for res in results if "error" in res)
+    logger.info(f"Ran {len(queries)} queries concurrently in {elapsed_ms}ms, {failed} failed")
+    return {"results": results, "failed": failed, "elapsed_ms": elapsed_ms}
+
+async def execute_query_with_params(query: str, params=None, timeout=None, skip=0, max_rows=None, source=None) -> dict:
+    """Execute SQL query with optional parameters on the worker pool, within timeout seconds - internal helper function.
+
+    Runs on the given data source, by default the one holding the databases the query names.
+    """
+    started = time.monotonic()
+    try:
+        source = source or sources.for_databases(referenced_databases(query))
+    except ValueError as e:
+        return {"error": str(e), "error_type": "cross_source"}
+    res = await run_with_deadline(query, params, timeout or SQL_QUERY_TIMEOUT_SECONDS, skip, max_rows, source)
+    milliseconds = (time.monotonic() - started) * 1000
+    key = query_stats.record(
+        query, milliseconds, len(res.get("data", ())), error="error" in res, timeout=res.get("error_type") == "timeout"
+    )
+    if milliseconds >= SQL_SLOW_QUERY_MS:
+        logger.warning(f"Slow query {key} took {milliseconds:.0f}ms")
+    else:
+        logger.info(f"Query {key} took {milliseconds:.0f}ms")
+    return res
+
+async def run_with_deadline(query, params, timeout, skip, max_rows, source) -> dict:
+    running = RunningQuery()
+    execution_stats["queries"] += 1
+    future = sql_executor.submit(run_query, query, params, running, time.monotonic() + timeout, skip, max_rows, source)
+    result = asyncio.wrap_future(future)
+    # A killed statement still finishes with an error after we stopped waiting for it.
+    result.add_done_callback(lambda f: f.cancelled() or f.exception())
+    try:
+        return await asyncio.wait_for(asyncio.shield(result), timeout)
+    except asyncio.TimeoutError:
+        execution_stats["timeouts"] += 1
+        if future.cancel():
+            execution_stats["cancelled_before_start"] += 1
         else:
-            cursor.execute(query)
-        rows = cursor.fetchall()
-        if cursor.description is None:
-            logger.warning(f"Query '{query}' returned no metadata")
-            return {"headers": [], "data": []}
-        headers = [field_md[0] for field_md in cursor.description]
-        logger.info(f"Query executed successfully: {query}")
-        return {"headers": headers, "data": rows}
-    except mysql.connector.Error as e:
+            try:
+                if await asyncio.to_thread(running.cancel):
+                    execution_stats["killed"] += 1
+            except mysql.connector.Error as e:
+                execution_stats["kill_failures"] += 1
+                logger.error(f"Failed to kill query '{query}': {str(e)}")
+        logger.warning(f"Query timed out after {timeout:g}s: {query}")
+        return timeout_error(timeout)
+    except QueryTimeout:
+        execution_stats["timeouts"] += 1
+        return timeout_error(timeout)
+    except (mysql.connector.Error, PoolTimeout) as e:
+        if getattr(e, "errno", None) in INTERRUPTED_ERRNOS:
+            execution_stats["timeouts"] += 1
+            logger.warning(f"Query stopped by the server at its time limit: {query}")
+            return timeout_error(timeout)
         logger.error(f"Error executing query '{query}': {str(e)}")
-        return {"error": str(e)}
-    finally:
-        if cursor:
-            cursor.close()
+        return {"error": str(e), "errno": getattr(e, "errno", None)}
 
 @sql_mcp.resource(
     "sql+db://schema/{db_name*}",
     description="Returns a JSON describing the database schema, or None if not found|db_name:database name,string",
     mime_type="application/json"
 )
-def get_schema(db_name: Annotated[str, "Database name"]) -> dict:
+async def get_schema(db_name: Annotated[str, "Database name"]) -> dict:
     """Returns a JSON describing the database schema, or None if not found."""
     # Sanitize db_name
     if not re.match(r'^[a-zA-Z0-9_]+$', db_name):
         logger.error(f"Invalid database name: {db_name}")
         return {"error": "Invalid database name"}
     try:
-        # Use parameterized query for safety
-        res = execute_query_with_params(
-            """
-            SELECT TABLE_NAME, COLUMN_NAME, COLUMN_DEFAULT, IS_NULLABLE, COLUMN_TYPE, 
-                   NUMERIC_PRECISION, NUMERIC_SCALE, DATETIME_PRECISION, COLUMN_KEY, 
-                   COLUMN_COMMENT, GENERATION_EXPRESSION
-            FROM INFORMATION_SCHEMA.COLUMNS
-            WHERE TABLE_SCHEMA = %s
-            ORDER BY TABLE_NAME, ORDINAL_POSITION;
-            """,
-            (db_name,)
-        )
-        
-        if "error" in res:
-            logger.error(f"Failed to fetch schema for database '{db_name}': {res['error']}")
-            return {"error": res["error"]}
-
-        if not res["data"]:
-            logger.info(f"No schema found for database '{db_name}'")
-            return {"error": f"Database '{db_name}' not found or has no tables"}
+        entry = await cached_schema(db_name)
+        if "error" in entry:
+            return entry
+        return {"database": db_name, "version": entry["version"], "tables": entry["tables"]}
 
-        # Process schema data
-        tables = {}
-        primary_keys = {}
-        foreign_keys = {}
-        
-        for row in res["data"]:
-            table_name = row[0]
-            column_name = row[1]
-            column_default = row[2]
-            is_nullable = row[3]
-            column_type = row[4]
-            column_key = row[8]
-            column_comment = row[9]
-            
-            if table_name not in tables:
-                tables[table_name] = {}
-            
-            # Build column description
-            column_desc = f"type {column_type}"
-            if is_nullable == "NO":
-                column_desc += ", NOT NULL"
-            if column_default is not None:
-                column_desc += f", default {column_default}"
-            if column_key == "UNI":
-                column_desc += ", unique"
-            if column_comment:
-                column_desc += f", comment: {column_comment}"
-            
-            tables[table_name][column_name] = column_desc
-            
-            # Track primary keys
-            if column_key == "PRI":
-                if table_name not in primary_keys:
-                    primary_keys[table_name] = []
-                primary_keys[table_name].append(column_name)
-        
-        # Add primary key information
-        for table_name, pk_columns in primary_keys.items():
-            tables[table_name]["primary_key"] = ", ".join(pk_columns)
-        
-        logger.info(f"Schema retrieved for database '{db_name}' with {len(tables)} tables")
-        return {"database": db_name, "tables": tables}
-        
     except Exception as e:
         logger.error(f"Error retrieving schema for '{db_name}': {str(e)}")
         return {"error": str(e)}
 
+@sql_mcp.tool()
+async def get_relevant_schema(
+    db_name: Annotated[str, Field(description="Database name")],
+    question: Annotated[str, Field(description="The user's question, or the entities and measures it is about")],
+    max_tables: Annotated[int, Field(description="Maximum number of tables to return")] = SQL_SCHEMA_SLICE_TABLES
+) -> dict:
+    """Return only the tables and columns of a database that are relevant to a question.
+
+    Much smaller than the full schema; other_tables lists the tables left out.
+    """
+    if not re.match(r'^[a-zA-Z0-9_]+$', db_name):
+        logger.error(f"Invalid database name: {db_name}")
+        return {"error": "Invalid database name"}
+    try:
+        entry = await cached_schema(db_name)
+        if "error" in entry:
+            return entry
+        return schema_cache.relevant_tables(db_name, question, max(1, max_tables), SQL_SCHEMA_SLICE_COLUMNS)
+    except Exception as e:
+        logger.error(f"Error selecting schema for '{db_name}': {str(e)}")
+        return {"error": str(e)}
+
+async def schema_fingerprint(db_name):
+    res = await execute_query_with_params(SCHEMA_FINGERPRINT_QUERY, (db_name, db_name), source=sources.for_database(db_name))
+    if "error" in res:
+        return res
+    return {"fingerprint": [str(value) for value in res["data"][0]]}
+
+async def cached_schema(db_name) -> dict:
+    """The cached schema entry of a database, reloaded if its fingerprint changed."""
+    if not schema_cache.needs_check(db_name):
+        schema_cache.hit()
+        return schema_cache.get(db_name)
+    fingerprint = await schema_fingerprint(db_name)
+    if "error" in fingerprint:
+        # Keep serving a cached schema while the server is unreachable.
+        if schema_cache.get(db_name):
+            logger.warning(f"Could not check schema of '{db_name}', serving cached copy: {fingerprint['error']}")
+            return schema_cache.get(db_name)
+        logger.error(f"Failed to fetch schema for database '{db_name}': {fingerprint['error']}")
+        return {"error": fingerprint["error"]}
+    fingerprint = fingerprint["fingerprint"]
+    if schema_cache.confirm(db_name, fingerprint):
+        return schema_cache.get(db_name)
+
+    # Use parameterized query for safety
+    res = await execute_query_with_params(
+        """
+        SELECT TABLE_NAME, COLUMN_NAME, COLUMN_DEFAULT, IS_NULLABLE, COLUMN_TYPE, 
+               NUMERIC_PRECISION, NUMERIC_SCALE, DATETIME_PRECISION, COLUMN_KEY, 
+               COLUMN_COMMENT, GENERATION_EXPRESSION
+        FROM INFORMATION_SCHEMA.COLUMNS
+        WHERE TABLE_SCHEMA = %s
+        ORDER BY TABLE_NAME, ORDINAL_POSITION;
+        """,
+        (db_name,),
+        source=sources.for_database(db_name)
+    )
+
+    if "error" in res:
+        logger.error(f"Failed to fetch schema for database '{db_name}': {res['error']}")
+        return {"error": res["error"]}
+
+    if not res["data"]:
+        logger.info(f"No schema found for database '{db_name}'")
+        return {"error": f"Database '{db_name}' not found or has no tables"}
+
+    tables = describe_schema(res["data"])
+    entry = schema_cache.put(db_name, fingerprint, tables)
+    logger.info(f"Schema loaded for database '{db_name}' with {len(tables)} tables (version {entry['version']})")
+    return entry
+
+def describe_schema(rows) -> dict:
+    """Build {table: {column: description, "primary_key": ...}} from INFORMATION_SCHEMA.COLUMNS rows."""
+    tables = {}
+    primary_keys = {}
+
+    for row in rows:
+        table_name = row[0]
+        column_name = row[1]
+        column_default = row[2]
+        is_nullable = row[3]
+        column_type = row[4]
+        column_key = row[8]
+        column_comment = row[9]
+
+        if table_name not in tables:
+            tables[table_name] = {}
+
+        # Build column description
+        column_desc = f"type {column_type}"
+        if is_nullable == "NO":
+            column_desc += ", NOT NULL"
+        if column_default is not None:
+            column_desc += f", default {column_default}"
+        if column_key == "UNI":
+            column_desc += ", unique"
+        if column_comment:
+            column_desc += f", comment: {column_comment}"
+
+        tables[table_name][column_name] = column_desc
+
+        # Track primary keys
+        if column_key == "PRI":
+            if table_name not in primary_keys:
+                primary_keys[table_name] = []
+            primary_keys[table_name].append(column_name)
+
+    # Add primary key information
+    for table_name, pk_columns in primary_keys.items():
+        tables[table_name]["primary_key"] = ", ".join(pk_columns)
+    return tables
+
+def configured_databases():
+    """Valid database names listed in tool_source.json."""
+    try:
+        with open(TOOL_SOURCE_PATH, "r") as f:
+            databases = [source["name"] for source in json.load(f).get("databases", [])]
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read {TOOL_SOURCE_PATH}: {str(e)}")
+        return []
+    return [db_name for db_name in databases if re.match(r'^[a-zA-Z0-9_]+$', db_name)]
+
+def prewarm_schemas():
+    """Load the schemas of the databases listed in tool_source.json."""
+    databases = configured_databases()
+
+    async def warm():
+        for db_name in databases:
+            await cached_schema(db_name)
+
+    asyncio.run(warm())
+
+threading.Thread(target=prewarm_schemas, daemon=True).start()
+
+def sources_of(databases):
+    """[(source, databases)] grouping databases by the data source serving them."""
+    grouped = {}
+    for database in databases:
+        source = sources.for_database(database)
+        grouped.setdefault(source.name, (source, []))[1].append(database)
+    return list(grouped.values())
+
+def table_sizes_statement(databases):
+    """(statement, params) listing the base tables of databases with their estimated row counts."""
+    return (
+        "SELECT TABLE_SCHEMA, TABLE_NAME, TABLE_ROWS FROM INFORMATION_SCHEMA.TABLES "
+        f"WHERE TABLE_TYPE = 'BASE TABLE' AND TABLE_SCHEMA IN ({', '.join(['%s'] * len(databases))})",
+        tuple(databases)
+    )
+
+def load_samples(source):
+    """Create the sample schema of a data source if needed and read back the samples built there earlier."""
+    primary = source.primary_only
+    run_query(f"CREATE DATABASE IF NOT EXISTS `{SQL_SAMPLE_SCHEMA}`", source=primary)
+    run_query(
+        f"CREATE TABLE IF NOT EXISTS `{SQL_SAMPLE_SCHEMA}`.sample_info ("
+        "source_db VARCHAR(64) NOT NULL, source_table VARCHAR(64) NOT NULL, sample_table VARCHAR(64) NOT NULL, "
+        "population BIGINT NOT NULL, sample_rows BIGINT NOT NULL, refreshed_at DOUBLE NOT NULL, "
+        "PRIMARY KEY (source_db, source_table))",
+        source=primary
+    )
+    res = run_query(
+        "SELECT source_db, source_table, sample_table, population, sample_rows, refreshed_at "
+        f"FROM `{SQL_SAMPLE_SCHEMA}`.sample_info",
+        source=primary
+    )
+    for database, table, sample_table, population, sample_rows, refreshed_at in res["data"]:
+        # Skip samples of databases since moved to another source.
+        if sample_rows and sources.for_database(database) is source:
+            samples[(database, table)] = {
+                "database": database, "table": table, "sample_table": sample_table,
+                "population": int(population), "sample_rows": int(sample_rows), "refreshed_at": float(refreshed_at)
+            }
+
+def sample_key_columns(database, table, source):
+    """Primary key columns of a table, or all its columns if it has none."""
+    res = run_query(
+        "SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE "
+        "WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND CONSTRAINT_NAME = 'PRIMARY' ORDER BY ORDINAL_POSITION",
+        (database, table),
+        source=source
+    )
+    if not res["data"]:
+        res = run_query(
+            "SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS "
+            "WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s ORDER BY ORDINAL_POSITION",
+            (database, table),
+            source=source
+        )
+    return [row[0] for row in res["data"]]
+
+def build_sample(database, table):
+    """Rebuild the sample of a table: the rows whose key hashes below a threshold, so reruns pick the same rows."""
+    # The sample is written next to the table, so every statement runs on its source's primary.
+    primary = sources.for_database(database).primary_only
+    original = f"`{database}`.`{table}`"
+    name = sample_table_name(database, table)
+    target = f"`{SQL_SAMPLE_SCHEMA}`.`{name}`"
+    staging = f"`{SQL_SAMPLE_SCHEMA}`.`{name[:59]}__new`"
+    retired = f"`{SQL_SAMPLE_SCHEMA}`.`{name[:59]}__old`"
+    started = time.monotonic()
+    population = int(run_query(f"SELECT COUNT(*) FROM {original}", source=primary)["data"][0][0])
+    threshold = max(1, int(SAMPLE_HASH_BUCKETS * min(1.0, SQL_SAMPLE_ROWS / max(population, 1))))
+    key = ", ".join(f"`{column}`" for column in sample_key_columns(database, table, primary))
+    run_query(f"DROP TABLE IF EXISTS {staging}", source=primary)
+    run_query(
+        f"CREATE TABLE {staging} AS SELECT * FROM {original} "
+        f"WHERE MOD(CRC32(CONCAT_WS('|', {key})), {SAMPLE_HASH_BUCKETS}) < {threshold}",
+        source=primary
+    )
+    sample_rows = int(run_query(f"SELECT COUNT(*) FROM {staging}", source=primary)["data"][0][0])
+    # Swap the new sample in with one atomic RENAME so queries never miss the table.
+    run_query(f"DROP TABLE IF EXISTS {retired}", source=primary)
+    run_query(f"CREATE TABLE IF NOT EXISTS {target} LIKE {staging}", source=primary)
+    run_query(f"RENAME TABLE {target} TO {retired}, {staging} TO {target}", source=primary)
+    run_query(f"DROP TABLE IF EXISTS {retired}", source=primary)
+    refreshed_at = time.time()
+    run_query(
+        f"DELETE FROM `{SQL_SAMPLE_SCHEMA}`.sample_info WHERE source_db = %s AND source_table = %s",
+        (database, table),
+        source=primary
+    )
+    run_query(
+        f"INSERT INTO `{SQL_SAMPLE_SCHEMA}`.sample_info VALUES (%s, %s, %s, %s, %s, %s)",
+        (database, table, name, population, sample_rows, refreshed_at),
+        source=primary
+    )
+    if sample_rows:
+        samples[(database, table)] = {
+            "database": database, "table": table, "sample_table": name,
+            "population": population, "sample_rows": sample_rows, "refreshed_at": refreshed_at
+        }
+    sample_stats["built"] += 1
+    logger.info(f"Sampled {sample_rows} of {population} rows of {database}.{table} in {time.monotonic() - started:.1f}s")
+
+def refresh_samples():
+    """Keep samples of the large tables of the tool_source.json databases, and of tables asked for, up to date."""
+    loaded = set()
+    wanted = set()
+    while True:
+        for source in sources:
+            if source.name not in loaded:
+                try:
+                    load_samples(source)
+                    loaded.add(source.name)
+                except (mysql.connector.Error, PoolTimeout) as e:
+                    logger.error(f"Failed to load table samples of source '{source.name}': {str(e)}")
+        for source, databases in sources_of(configured_databases()):
+            if source.name not in loaded:
+                continue
+            try:
+                res = run_query(*table_sizes_statement(databases), source=source)
+                wanted.update((db, table) for db, table, rows in res["data"] if (rows or 0) >= SQL_SAMPLE_MIN_ROWS)
+            except (mysql.connector.Error, PoolTimeout) as e:
+                logger.error(f"Failed to refresh table samples on source '{source.name}': {str(e)}")
+        for database, table in sorted(wanted):
+            sample = samples.get((database, table))
+            if sample is not None and time.time() - sample["refreshed_at"] < SQL_SAMPLE_REFRESH_SECONDS:
+                continue
+            if sources.for_database(database).name not in loaded:
+                continue
+            try:
+                build_sample(database, table)
+                sample_errors.pop((database, table), None)
+            except (mysql.connector.Error, PoolTimeout) as e:
+                sample_stats["build_failures"] += 1
+                sample_errors[(database, table)] = str(e)
+                logger.error(f"Failed to sample {database}.{table}: {str(e)}")
+        try:
+            # Retry soon while the sample schema of a source could not be set up.
+            ready = all(source.name in loaded for source in sources)
+            wanted.add(sample_requests.get(timeout=SQL_SAMPLE_REFRESH_SECONDS if ready else SQL_SCHEMA_CHECK_SECONDS))
+            while True:
+                wanted.add(sample_requests.get_nowait())
+        except queue.Empty:
+            pass
+
+if sampling_enabled:
+    threading.Thread(target=refresh_samples, daemon=True).start()
+
 @sql_mcp.resource(
     "sql+db://list_databases",
     description="Show available databases",
     mime_type="application/json"
 )
-def list_databases() -> dict:
+async def list_databases() -> dict:
     """Returns a list of available databases, excluding system databases."""
     try:
-        res = execute_query_with_params(
-            "SHOW DATABASES WHERE `Database` NOT IN ('mysql', 'performance_schema', 'sys', 'information_schema')"
-        )
-        if "error" in res:
-            logger.error(f"Error listing databases: {res['error']}")
-            return {"error": res["error"]}
-        
-        # Extract database names from the result
-        databases = [row[0] for row in res["data"]]
+        databases, unavailable = [], {}
+        for source in sources:
+            res = await execute_query_with_params(
+                "SHOW DATABASES WHERE `Database` NOT IN ('mysql', 'performance_schema', 'sys', 'information_schema')",
+                source=source
+            )
+            if "error" in res:
+                logger.error(f"Error listing databases of source '{source.name}': {res['error']}")
+                unavailable[source.name] = res["error"]
+                continue
+            # A server only answers for the databases routed to its source.
+            databases += [row[0] for row in res["data"] if sources.for_database(row[0]) is source]
+        if len(unavailable) == len(sources.sources):
+            return {"error": "; ".join(unavailable.values())}
+
         logger.info(f"Found {len(databases)} databases: {databases}")
+        if unavailable:
+            return {"databases": databases, "unavailable_sources": unavailable}
         return {"databases": databases}
         
     except Exception as e:
@@ -182,14 +1055,14 @@ def list_databases() -> dict:
     description="Show tables within a database|db_name:database name,string",
     mime_type="application/json"
 )
-def list_tables(db_name: Annotated[str, "Database name"]) -> dict:
+async def list_tables(db_name: Annotated[str, "Database name"]) -> dict:
     """Returns a list of tables in the specified database."""
     # Sanitize db_name
     if not re.match(r'^[a-zA-Z0-9_]+$', db_name):
         logger.error(f"Invalid database name: {db_name}")
         return {"error": "Invalid database name"}
     try:
-        res = execute_query_with_params(f"SHOW TABLES FROM `{db_name}`")
+        res = await execute_query_with_params(f"SHOW TABLES FROM `{db_name}`", source=sources.for_database(db_name))
         if "error" in res:
             logger.error(f"Error listing tables in '{db_name}': {res['error']}")
             return {"error": res["error"]}
@@ -203,11 +1076,61 @@ def list_tables(db_name: Annotated[str, "Database name"]) -> dict:
         logger.error(f"Error listing tables in '{db_name}': {str(e)}")
         return {"error": str(e)}
 
+@sql_mcp.resource(
+    "sql+db://pool_stats",
+    description="Connection pool, worker, query cancellation, cache and cost guard metrics",
+    mime_type="application/json"
+)
+def pool_stats() -> dict:
+    return {
+        "connections": sources.stats,
+        "execution": dict(execution_stats, workers=SQL_WORKERS),
+        "schema_cache": schema_cache.info(),
+        "result_cache": result_cache.stats,
+        "cost_guard": dict(guard_stats),
+        "sampling": dict(sample_stats, samples=len(samples), failed_tables=len(sample_errors))
+    }
+
+@sql_mcp.resource(
+    "sql+db://stats",
+    description="Slowest, most frequent and most time-consuming SQL statement shapes, with latency percentiles and error rates",
+    mime_type="application/json"
+)
+def statement_stats() -> dict:
+    return query_stats.top(SQL_STATS_TOP)
+
+def flush_query_stats():
+    while True:
+        time.sleep(SQL_STATS_FLUSH_SECONDS)
+        try:
+            query_stats.flush()
+        except OSError as e:
+            logger.error(f"Failed to save SQL statement stats: {str(e)}")
+
+threading.Thread(target=flush_query_stats, daemon=True).start()
+
+def check_replicas():
+    """Take lagging or unreachable replicas out of rotation and put recovered ones back."""
+    while True:
+        time.sleep(SQL_REPLICA_CHECK_SECONDS)
+        for source in sources:
+            for replica, reason in source.check_replicas(SQL_REPLICA_MAX_LAG_SECONDS, SQL_REPLICA_RETRY_SECONDS):
+                if reason:
+                    logger.warning(f"Replica {replica.name} taken out of rotation: {reason}")
+                else:
+                    logger.info(f"Replica {replica.name} back in rotation")
+
+if any(source.replicas for source in sources):
+    threading.Thread(target=check_replicas, daemon=True).start()
+
 def close_connection():
-    """Close the MySQL connection."""
+    """Close the pooled MySQL connections."""
     try:
-        if mydb.is_connected():
-            mydb.close()
-            logger.info("MySQL connection closed")
+        query_stats.flush()
+        sql_executor.shutdown(wait=False, cancel_futures=True)
+        for source in sources:
+            for server in source.servers:
+                server.pool.close_all()
+        logger.info("MySQL connections closed")
     except Exception as e:
-        logger.error(f"Error closing MySQL connection: {str(e)}")
\ No newline at end of file
+        logger.error(f"Error closing MySQL connections: {str(e)}")
\ No newline at end of file
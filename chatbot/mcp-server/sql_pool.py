@@ -0,0 +1,139 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import mysql.connector
+
+
+class PoolTimeout(Exception):
+    """No connection became free within the checkout timeout."""
+
+
+class ConnectionPool:
+    """Bounded pool of MySQL connections that are health-checked on checkout.
+
+    connect() opens a new connection. Connections idle for longer than
+    ping_after_seconds are pinged before being handed out and replaced if the
+    server dropped them (e.g. after wait_timeout), so callers always get a
+    live connection.
+    """
+
+    def __init__(self, connect, size=8, checkout_timeout=10.0, ping_after_seconds=5.0, name="default"):
+        self.name = name
+        self.size = size
+        self.checkout_timeout = checkout_timeout
+        self.ping_after_seconds = ping_after_seconds
+        self._connect = connect
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._stats = {
+            "checkouts": 0,
+            "in_use": 0,
+            "max_in_use": 0,
+            "waits": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+            "timeouts": 0,
+            "created": 0,
+            "reconnects": 0,
+            "discarded": 0
+        }
+
+    def _record(self, **changes):
+        with self._lock:
+            for key, value in changes.items():
+                self._stats[key] += value
+            self._stats["max_in_use"] = max(self._stats["max_in_use"], self._stats["in_use"])
+
+    def _new_connection(self):
+        connection = self._connect()
+        self._record(created=1)
+        return connection
+
+    def _take_idle(self):
+        """An idle connection known to be alive, or None if there is none left."""
+        while True:
+            try:
+                connection, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return None
+            if time.monotonic() - last_used < self.ping_after_seconds:
+                return connection
+            try:
+                connection.ping(reconnect=False)
+                return connection
+            except mysql.connector.Error:
+                self._record(reconnects=1)
+                self._close(connection)
+
+    def acquire(self, timeout=None):
+        """Check out a connection, waiting up to timeout seconds for one to be released."""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        started = time.monotonic()
+        if not self._slots.acquire(blocking=False):
+            if not self._slots.acquire(timeout=timeout):
+                self._record(timeouts=1)
+                raise PoolTimeout(f"No free connection in pool '{self.name}' after {timeout}s")
+            waited = time.monotonic() - started
+            self._record(waits=1, wait_seconds_total=waited)
+            with self._lock:
+                self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], waited)
+        try:
+            connection = self._take_idle() or self._new_connection()
+        except Exception:
+            self._slots.release()
+            raise
+        self._record(checkouts=1, in_use=1)
+        return connection
+
+    def release(self, connection, broken=False):
+        """Return a connection; broken ones are closed and replaced on a later checkout.
+
+        Nothing is sent to the server here: a connection dropped while idle is
+        caught by the ping on checkout.
+        """
+        try:
+            if broken:
+                self._record(discarded=1)
+                self._close(connection)
+            else:
+                self._idle.put((connection, time.monotonic()))
+        finally:
+            self._record(in_use=-1)
+            self._slots.release()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        connection = self.acquire(timeout)
+        broken = False
+        try:
+            yield connection
+        except (mysql.connector.InterfaceError, mysql.connector.OperationalError):
+            broken = True
+            raise
+        finally:
+            self.release(connection, broken)
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        while True:
+            try:
+                connection, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close(connection)
+
+    @property
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update(name=self.name, size=self.size, idle=self._idle.qsize())
+        return stats
@@ -0,0 +1,242 @@
+import itertools
+import json
+import os
+import time
+
+import mysql.connector
+
+from sql_pool import ConnectionPool, PoolTimeout
+
+# Schemas every server has, so naming them does not tie a statement to a source.
+SHARED_SCHEMAS = {"information_schema", "mysql", "performance_schema", "sys"}
+
+
+def parse_hosts(text, default_port):
+    """[(host, port)] from "host[:port],host[:port]"."""
+    hosts = []
+    for item in filter(None, (part.strip() for part in (text or "").split(","))):
+        host, _, port = item.partition(":")
+        hosts.append((host, int(port) if port else default_port))
+    return hosts
+
+
+class Server:
+    """One MySQL server of a data source, with its own connection pool."""
+
+    def __init__(self, name, role, host, port, user, password, pool_options):
+        self.name = name
+        self.role = role
+        self.host = host
+        self.port = port
+        self._user = user
+        self._password = password
+        self.pool = ConnectionPool(self.connect, name=name, **pool_options)
+        # Replicas are skipped until this time.monotonic() after a failure or while lagging.
+        self.down_until = 0.0
+        self.lag_seconds = None
+        self.last_error = None
+        self.failovers = 0
+
+    def connect(self):
+        return mysql.connector.connect(
+            host=self.host,
+            port=self.port,
+            user=self._user,
+            password=self._password,
+            connection_timeout=600,
+            autocommit=True
+        )
+
+    @property
+    def available(self):
+        return time.monotonic() >= self.down_until
+
+    @property
+    def stats(self):
+        return dict(
+            self.pool.stats,
+            role=self.role,
+            address=f"{self.host}:{self.port}",
+            available=self.available,
+            lag_seconds=self.lag_seconds,
+            failovers=self.failovers,
+            last_error=self.last_error
+        )
+
+
+def replication_lag(connection):
+    """Seconds a server is behind its source: None if it does not replicate, inf if replication is stopped."""
+    cursor = connection.cursor(dictionary=True)
+    try:
+        # Servers before MySQL 8.0.22 only know SHOW SLAVE STATUS.
+        for statement in ("SHOW REPLICA STATUS", "SHOW SLAVE STATUS"):
+            try:
+                cursor.execute(statement)
+                rows = cursor.fetchall()
+            except (mysql.connector.InterfaceError, mysql.connector.OperationalError):
+                raise
+            except mysql.connector.Error:
+                continue
+            if not rows:
+                return None
+            lag = rows[0].get("Seconds_Behind_Source", rows[0].get("Seconds_Behind_Master"))
+            return float("inf") if lag is None else float(lag)
+        return None
+    finally:
+        cursor.close()
+
+
+class DataSource:
+    """A primary MySQL server and its read replicas.
+
+    Read-only statements go to an available replica, least busy first, and
+    fall back to the primary. Right after a write through this source, reads
+    stay on the primary so they see it.
+    """
+
+    def __init__(self, name, primary, replicas=(), read_after_write_seconds=5.0):
+        self.name = name
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.read_after_write_seconds = read_after_write_seconds
+        self._last_write = float("-inf")
+        self._turn = itertools.count()
+
+    @property
+    def servers(self):
+        return [self.primary] + self.replicas
+
+    def route(self, read_only):
+        """Servers to try a statement on, in order; the primary is tried twice for reads."""
+        if not read_only:
+            return [self.primary]
+        if not self.replicas or time.monotonic() - self._last_write < self.read_after_write_seconds:
+            return [self.primary, self.primary]
+        start = next(self._turn) % len(self.replicas)
+        rotated = self.replicas[start:] + self.replicas[:start]
+        replicas = sorted((replica for replica in rotated if replica.available), key=lambda r: r.pool.stats["in_use"])
+        return replicas + [self.primary, self.primary]
+
+    @property
+    def primary_only(self):
+        """This source without its replicas, for reads that must all come from the same server."""
+        return DataSource(self.name, self.primary)
+
+    def wrote(self):
+        self._last_write = time.monotonic()
+
+    def mark_down(self, server, seconds, error):
+        """Skip a failed replica for a while; the primary stays in use as the last resort."""
+        if server is self.primary:
+            return
+        server.down_until = time.monotonic() + seconds
+        server.last_error = str(error)
+        server.failovers += 1
+
+    def check_replicas(self, max_lag_seconds, retry_seconds):
+        """Ping the replicas and read their lag; returns (server, reason or None) for those whose state changed."""
+        changes = []
+        for replica in self.replicas:
+            was_available = replica.available
+            reason = None
+            try:
+                with replica.pool.connection(timeout=1) as connection:
+                    replica.lag_seconds = replication_lag(connection)
+                if replica.lag_seconds is not None and replica.lag_seconds > max_lag_seconds:
+                    reason = f"replication lag {replica.lag_seconds:g}s"
+            except PoolTimeout:
+                # Every connection is busy, so the replica is serving queries.
+                continue
+            except mysql.connector.Error as e:
+                reason = str(e)
+            if reason:
+                replica.down_until = time.monotonic() + retry_seconds
+                replica.last_error = reason
+            else:
+                replica.down_until = 0.0
+            if was_available != replica.available:
+                changes.append((replica, reason))
+        return changes
+
+    @property
+    def stats(self):
+        return {"primary": self.primary.stats, "replicas": [replica.stats for replica in self.replicas]}
+
+
+class SourceRegistry:
+    """Data sources by name and the source each database lives on."""
+
+    def __init__(self, sources, database_sources, default="default", shared_schemas=()):
+        self.sources = sources
+        self.database_sources = database_sources
+        self.default = sources[default]
+        self.shared_schemas = SHARED_SCHEMAS | {schema.lower() for schema in shared_schemas}
+
+    def __iter__(self):
+        return iter(self.sources.values())
+
+    def for_database(self, database):
+        return self.sources.get(self.database_sources.get(database), self.default)
+
+    def for_databases(self, databases):
+        """The one source holding all the databases; ValueError if they live on different servers."""
+        found = {}
+        for database in databases:
+            if database.lower() not in self.shared_schemas:
+                source = self.for_database(database)
+                found.setdefault(source.name, (source, []))[1].append(database)
+        if len(found) > 1:
+            spread = "; ".join(f"{', '.join(names)} on {name}" for name, (_, names) in found.items())
+            raise ValueError(f"The query reads databases on different servers ({spread}); query each server separately")
+        return next(iter(found.values()))[0] if found else self.default
+
+    @property
+    def stats(self):
+        return {source.name: source.stats for source in self}
+
+
+def load_sources(tool_source_path, pool_options, read_after_write_seconds=5.0, shared_schemas=(), environ=None):
+    """The data sources from the environment, and the database -> source map from tool_source.json.
+
+    The default source is MYSQL_HOST/PORT/USER/PASSWORD with read replicas in
+    MYSQL_REPLICAS ("host[:port],..."). Every name in SQL_SOURCES adds a source
+    set up by SQL_SOURCE_<NAME>_HOST/PORT/USER/PASSWORD/REPLICAS; anything
+    left out is taken from the MYSQL_* settings. A database in tool_source.json
+    is served by the source named in its "source" field, else by the default.
+    Credentials stay in the environment since tool_source.json is shown to
+    the model.
+    """
+    environ = os.environ if environ is None else environ
+
+    def setting(prefix, key, default):
+        return environ.get(f"{prefix}{key}") or environ.get(f"MYSQL_{key}") or default
+
+    sources = {}
+    names = ["default"] + [name.strip() for name in environ.get("SQL_SOURCES", "").split(",") if name.strip()]
+    for name in names:
+        prefix = "MYSQL_" if name == "default" else f"SQL_SOURCE_{name.upper()}_"
+        host = setting(prefix, "HOST", "localhost")
+        port = int(setting(prefix, "PORT", "3306"))
+        user = setting(prefix, "USER", "root")
+        password = environ.get(f"{prefix}PASSWORD", environ.get("MYSQL_PASSWORD", ""))
+        primary = Server(f"{name}/primary", "primary", host, port, user, password, pool_options)
+        replicas = [
+            Server(f"{name}/replica-{i + 1}", "replica", replica_host, replica_port, user, password, pool_options)
+            for i, (replica_host, replica_port) in enumerate(parse_hosts(environ.get(f"{prefix}REPLICAS"), port))
+        ]
+        sources[name] = DataSource(name, primary, replicas, read_after_write_seconds)
+
+    database_sources = {}
+    unknown = set()
+    try:
+        with open(tool_source_path, "r") as f:
+            databases = json.load(f).get("databases", [])
+    except (OSError, ValueError):
+        databases = []
+    for database in databases:
+        source = database.get("source")
+        if source and source in sources:
+            database_sources[database["name"]] = source
+        elif source:
+            unknown.add(source)
+    return SourceRegistry(sources, database_sources, shared_schemas=shared_schemas), sorted(unknown)
@@ -0,0 +1,185 @@
+import re
+
+QUOTED = r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`"
+QUOTED_PATTERN = re.compile(QUOTED, re.S)
+# Quoted strings and identifiers are matched first so a # or -- inside them is kept.
+COMMENT_PATTERN = re.compile(rf"({QUOTED})|/\*.*?\*/|--(?=\s|$)[^\n]*|#[^\n]*", re.S)
+KEYWORD_PATTERN = re.compile(r"[A-Za-z]+")
+READ_ONLY_KEYWORDS = {"SELECT", "SHOW", "DESCRIBE", "DESC", "EXPLAIN", "WITH"}
+WRITE_KEYWORD_PATTERN = re.compile(r"\b(INSERT|UPDATE|DELETE|REPLACE|CREATE|DROP|ALTER|TRUNCATE)\b", re.I)
+# Statements that change the state of the session they run in.
+SESSION_KEYWORDS = {"USE", "SET", "LOCK", "UNLOCK", "START", "BEGIN"}
+
+
+def strip_comments(sql: str) -> str:
+    return COMMENT_PATTERN.sub(lambda m: m.group(1) or " ", sql)
+
+
+def without_literals(sql: str) -> str:
+    """sql with every quoted string and identifier emptied, so keywords and ; inside them are not seen."""
+    return QUOTED_PATTERN.sub(lambda m: m.group(0)[0] * 2, sql)
+
+
+def is_single_statement(sql: str) -> bool:
+    """Whether sql holds one statement: no ; outside quotes and comments other than a trailing one."""
+    return ";" not in without_terminator(without_literals(strip_comments(sql)))
+
+
+def first_keyword(sql: str) -> str:
+    """Upper-cased first keyword of a statement, ignoring comments and opening parentheses."""
+    match = KEYWORD_PATTERN.search(strip_comments(sql))
+    return match.group(0).upper() if match else ""
+
+
+def is_read_only(sql: str) -> bool:
+    """Whether a statement only reads data, so it is safe to retry or run anywhere."""
+    keyword = first_keyword(sql)
+    if keyword not in READ_ONLY_KEYWORDS or not is_single_statement(sql):
+        return False
+    # MySQL allows WITH ... UPDATE/DELETE; SELECT ... INTO OUTFILE is left to the server's privileges.
+    return keyword != "WITH" or not WRITE_KEYWORD_PATTERN.search(without_literals(strip_comments(sql)))
+
+
+def changes_session(sql: str) -> bool:
+    return first_keyword(sql) in SESSION_KEYWORDS
+
+
+SELECT_PATTERN = re.compile(r"^(\s*\(?\s*)SELECT\b", re.I)
+
+
+def add_execution_time_hint(sql: str, seconds: float) -> str:
+    """Give a SELECT a MAX_EXECUTION_TIME optimizer hint so the server aborts it at the deadline."""
+    milliseconds = max(1, int(seconds * 1000))
+    return SELECT_PATTERN.sub(lambda m: f"{m.group(1)}SELECT /*+ MAX_EXECUTION_TIME({milliseconds}) */", sql, count=1)
+
+
+def is_pageable(sql: str) -> bool:
+    """Whether a statement can be wrapped in a derived table to page or count its rows server-side."""
+    return first_keyword(sql) in ("SELECT", "WITH") and is_read_only(sql)
+
+
+def without_terminator(sql: str) -> str:
+    return sql.strip().rstrip(";").rstrip()
+
+
+def page_statement(sql: str, offset: int, limit: int) -> str:
+    return f"SELECT * FROM (\n{without_terminator(sql)}\n) AS page_rows LIMIT {int(limit)} OFFSET {int(offset)}"
+
+
+def count_statement(sql: str) -> str:
+    return f"SELECT COUNT(*) FROM (\n{without_terminator(sql)}\n) AS counted_rows"
+
+
+# Functions whose result changes between calls, so results using them are not cached.
+VOLATILE_PATTERN = re.compile(
+    r"\b(?:(?:NOW|SYSDATE|CURDATE|CURTIME|UTC_DATE|UTC_TIME|UTC_TIMESTAMP|UNIX_TIMESTAMP|RAND|UUID|UUID_SHORT"
+    r"|CONNECTION_ID|LAST_INSERT_ID|FOUND_ROWS|ROW_COUNT|SLEEP|USER)\s*\("
+    r"|(?:CURRENT_DATE|CURRENT_TIME|CURRENT_TIMESTAMP|LOCALTIME|LOCALTIMESTAMP|CURRENT_USER|SQL_NO_CACHE)\b)",
+    re.I
+)
+QUOTED_OR_SPACE_PATTERN = re.compile(r"('(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`)|\s+", re.S)
+TABLE_KEYWORD_PATTERN = re.compile(r"\b(FROM|JOIN|UPDATE|INTO|TABLE)\b", re.I)
+# A table name where a table reference starts; derived tables do not match.
+TABLE_NAME_PATTERN = re.compile(r"\s*((?:`[^`]+`|\w+)(?:\s*\.\s*(?:`[^`]+`|\w+))?)")
+LIST_TOKEN_PATTERN = re.compile(r"`[^`]*`|\w+|[(),;]")
+# Keywords ending a FROM or UPDATE list; joins and their ON conditions carry on to the next comma.
+LIST_END_KEYWORDS = {
+    "WHERE", "GROUP", "ORDER", "HAVING", "LIMIT", "UNION", "EXCEPT", "INTERSECT", "WINDOW", "FOR", "LOCK", "INTO",
+    "SET", "VALUES", "SELECT"
+}
+
+
+def normalize_sql(sql: str) -> str:
+    """Statement text with comments removed and whitespace collapsed outside quoted strings."""
+    def collapse(match):
+        return match.group(1) or " "
+    return QUOTED_OR_SPACE_PATTERN.sub(collapse, without_terminator(strip_comments(sql))).strip()
+
+
+def is_volatile(sql: str) -> bool:
+    return bool(VOLATILE_PATTERN.search(strip_comments(sql)))
+
+
+def _list_item_positions(text: str, start: int):
+    """Where each further item of the FROM or UPDATE list starting at start begins."""
+    depth = 0
+    for token in LIST_TOKEN_PATTERN.finditer(text, start):
+        value = token.group(0)
+        if value == "(":
+            depth += 1
+        elif value == ")":
+            depth -= 1
+            if depth < 0:
+                return
+        elif depth == 0:
+            if value == ",":
+                yield token.end()
+            elif value == ";" or value.upper() in LIST_END_KEYWORDS:
+                return
+
+
+def table_references(sql: str) -> list:
+    """Every table name a statement reads or writes, as written, including the rest of comma-separated lists.
+
+    Subqueries are covered too, since their FROM lists are found like any other.
+    """
+    text = QUOTED_PATTERN.sub(lambda m: m.group(0) if m.group(0)[0] == "`" else m.group(0)[0] * 2, strip_comments(sql))
+    references = []
+    for keyword in TABLE_KEYWORD_PATTERN.finditer(text):
+        positions = [keyword.end()]
+        if keyword.group(1).upper() in ("FROM", "UPDATE"):
+            positions.extend(_list_item_positions(text, keyword.end()))
+        for position in positions:
+            name = TABLE_NAME_PATTERN.match(text, position)
+            if name:
+                references.append(name.group(1))
+    return [
+        reference for reference in references
+        if reference.split(".")[-1].strip().strip("`").upper() not in ("SELECT", "DUAL", "LATERAL")
+    ]
+
+
+def referenced_tables(sql: str) -> set:
+    """Lower-cased table names a statement reads or writes, without their database qualifier."""
+    return {reference.split(".")[-1].strip().strip("`").lower() for reference in table_references(sql)}
+
+
+SHOW_DATABASE_PATTERN = re.compile(r"\b(?:FROM|IN)\s+(`[^`]+`|\w+)", re.I)
+
+
+def referenced_databases(sql: str) -> set:
+    """Databases a statement names, from db.table references (and the last FROM/IN of a SHOW)."""
+    text = strip_comments(sql)
+    databases = set()
+    for reference in table_references(text):
+        parts = reference.split(".")
+        if len(parts) == 2:
+            databases.add(parts[0].strip().strip("`"))
+    shown = SHOW_DATABASE_PATTERN.findall(text) if first_keyword(text) == "SHOW" else []
+    if shown:
+        databases.add(shown[-1].strip("`"))
+    return databases
+
+
+AGGREGATE_PATTERN = re.compile(
+    r"\b(?:COUNT|SUM|AVG|MIN|MAX|GROUP_CONCAT|JSON_ARRAYAGG|JSON_OBJECTAGG|STD|STDDEV|STDDEV_POP|STDDEV_SAMP"
+    r"|VARIANCE|VAR_POP|VAR_SAMP|BIT_AND|BIT_OR|BIT_XOR)\s*\(|\bGROUP\s+BY\b|\bDISTINCT\b|\bUNION\b|\bHAVING\b",
+    re.I
+)
+TRAILING_LIMIT_PATTERN = re.compile(r"\bLIMIT\s+\d+(?:\s*(?:,|OFFSET)\s*\d+)?\s*$", re.I)
+LOCKING_CLAUSE_PATTERN = re.compile(r"\s+(FOR\s+UPDATE|FOR\s+SHARE|LOCK\s+IN\s+SHARE\s+MODE)\s*$", re.I)
+
+
+def has_aggregate(sql: str) -> bool:
+    """Whether a statement aggregates, groups or deduplicates rows (so it reads all of them)."""
+    return bool(AGGREGATE_PATTERN.search(strip_comments(sql)))
+
+
+def add_limit(sql: str, limit: int) -> str:
+    """Bound a SELECT with a LIMIT unless it already ends with one."""
+    sql = without_terminator(strip_comments(sql)).strip()
+    locking = LOCKING_CLAUSE_PATTERN.search(sql)
+    body, suffix = (sql[:locking.start()], locking.group(0)) if locking else (sql, "")
+    if TRAILING_LIMIT_PATTERN.search(body):
+        return sql
+    return f"{body} LIMIT {int(limit)}{suffix}"
@@ -0,0 +1,396 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Annotated, Literal
+
+import duckdb
+from dotenv import load_dotenv
+from fastmcp import FastMCP
+from minio import Minio
+from pydantic import Field
+
+from result_encoding import encode_result
+from sql_text import count_statement, is_pageable, is_read_only, is_single_statement, page_statement
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), "../.env"))
+
+# Uploaded CSV/TSV/Parquet/Excel files are converted once to Parquet under
+# TABLE_CACHE_DIR and queried in-process with DuckDB. Files come from the same
+# place as the PDFs RAG ingests: the data folder, or the MinIO upload bucket.
+TABLE_EXTENSIONS = (".csv", ".tsv", ".parquet", ".xlsx", ".xls")
+TABLE_SOURCE = os.getenv("TABLE_SOURCE", os.getenv("RAG_INGEST_SOURCE", "folder")).lower()
+TABLE_FOLDER = os.path.join(os.path.dirname(__file__), "data")
+TABLE_CACHE_DIR = os.path.join(os.path.dirname(__file__), "files", "table_cache")
+MANIFEST_PATH = os.path.join(TABLE_CACHE_DIR, "manifest.json")
+MINIO_SOURCE_BUCKET = os.getenv("RAG_MINIO_SOURCE_BUCKET", "chat-files")
+TABLE_REFRESH_SECONDS = float(os.getenv("TABLE_REFRESH_SECONDS", "5"))
+TABLE_THREADS = int(os.getenv("TABLE_THREADS") or 0) or os.cpu_count()
+TABLE_MEMORY_LIMIT = os.getenv("TABLE_MEMORY_LIMIT", "2GB")
+TABLE_QUERY_TIMEOUT_SECONDS = float(os.getenv("TABLE_QUERY_TIMEOUT_SECONDS", "25"))
+TABLE_PAGE_ROWS = int(os.getenv("TABLE_PAGE_ROWS", "200"))
+TABLE_MAX_PAGE_ROWS = int(os.getenv("TABLE_MAX_PAGE_ROWS", "1000"))
+# Each conversation queries its own in-memory DuckDB database; only the most
+# recently used TABLE_MAX_OPEN_SCOPES stay open, the others are closed.
+TABLE_MAX_OPEN_SCOPES = int(os.getenv("TABLE_MAX_OPEN_SCOPES", "16"))
+
+# The Node upload route names files "<userId>_<conversationId>_<timestamp>.<ext>";
+# their tables are only visible in that conversation. Other files are shared.
+UPLOAD_NAME_PATTERN = re.compile(r"^(?P<owner>[^_]+)_(?P<conversation>[^_]+)_(?P<timestamp>\d+)\.\w+$")
+SHARED_SCOPE = "shared"
+
+os.makedirs(TABLE_CACHE_DIR, exist_ok=True)
+
+table_mcp = FastMCP("TABLE")
+
+minio_client = Minio(
+    os.getenv("MINIO_ENDPOINT", "localhost:9000"),
+    access_key=os.getenv("MINIO_ACCESS_KEY", "minioadmin"),
+    secret_key=os.getenv("MINIO_SECRET_KEY", "minioadmin"),
+    secure=os.getenv("MINIO_SECURE", "false").lower() == "true"
+)
+
+def _load_manifest():
+    try:
+        with open(MANIFEST_PATH, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+# source file name -> {"signature", "scope", "tables": [{"name", "path", "sheet", "rows", "columns"}]}
+catalog = _load_manifest()
+catalog_lock = threading.Lock()
+catalog_version = 0
+# scope -> {"version": catalog version it was built at, "connection", "users", "retired"}, least recently used first
+scope_connections = OrderedDict()
+# source file name -> signature that failed to convert, retried once the file changes
+failed_files = {}
+
+def save_manifest():
+    with open(MANIFEST_PATH + ".tmp", "w") as f:
+        json.dump(catalog, f)
+    os.replace(MANIFEST_PATH + ".tmp", MANIFEST_PATH)
+
+def identifier(text):
+    name = re.sub(r"\W+", "_", text.lower()).strip("_")
+    return name if name and not name[0].isdigit() else f"t_{name}"
+
+def file_scope(filename):
+    """Scope and base table name of an uploaded file, as far as its name tells."""
+    match = UPLOAD_NAME_PATTERN.match(filename)
+    if match:
+        return identifier(match.group("conversation")), f"upload_{match.group('timestamp')}"
+    return SHARED_SCOPE, identifier(os.path.splitext(filename)[0])
+
+def sql_string(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+def convert_file(path, filename):
+    """Convert a tabular file to one Parquet file per table (one per Excel sheet)."""
+    scope, base_name = file_scope(filename)
+    target_dir = os.path.join(TABLE_CACHE_DIR, scope)
+    os.makedirs(target_dir, exist_ok=True)
+    extension = os.path.splitext(filename)[1].lower()
+    converter = duckdb.connect(config={"threads": TABLE_THREADS, "memory_limit": TABLE_MEMORY_LIMIT})
+    try:
+        if extension in (".csv", ".tsv"):
+            sources = [(None, f"SELECT * FROM read_csv({sql_string(path)}, auto_detect = true)")]
+        elif extension == ".parquet":
+            sources = [(None, f"SELECT * FROM read_parquet({sql_string(path)})")]
+        else:
+            import pandas as pd
+
+            sources = []
+            for sheet, frame in pd.read_excel(path, sheet_name=None).items():
+                view = identifier(f"sheet_{sheet}")
+                converter.register(view, frame)
+                sources.append((sheet, f"SELECT * FROM {view}"))
+
+        tables = []
+        for sheet, select in sources:
+            name = base_name if sheet is None else identifier(f"{base_name}_{sheet}")
+            target = os.path.join(target_dir, f"{name}.parquet")
+            converter.execute(f"COPY ({select}) TO {sql_string(target + '.tmp')} (FORMAT PARQUET, COMPRESSION ZSTD)")
+            os.replace(target + ".tmp", target)
+            rows = converter.execute(f"SELECT COUNT(*) FROM read_parquet({sql_string(target)})").fetchone()[0]
+            columns = [row[0] for row in converter.execute(f"DESCRIBE SELECT * FROM read_parquet({sql_string(target)})").fetchall()]
+            tables.append({"name": name, "path": target, "sheet": sheet, "rows": rows, "columns": len(columns)})
+        return scope, tables
+    finally:
+        converter.close()
+
+def register_file(filename, signature, path):
+    """Convert a file unless the cached tables already match its signature."""
+    global catalog_version
+    entry = catalog.get(filename)
+    if entry and entry["signature"] == signature and all(os.path.exists(t["path"]) for t in entry["tables"]):
+        return
+    if failed_files.get(filename) == signature:
+        return
+    started = time.time()
+    try:
+        scope, tables = convert_file(path, filename)
+    except Exception:
+        failed_files[filename] = signature
+        raise
+    with catalog_lock:
+        catalog[filename] = {"signature": signature, "scope": scope, "tables": tables}
+        catalog_version += 1
+        save_manifest()
+    logger.info(f"Converted '{filename}' to {len(tables)} table(s) in {time.time() - started:.2f}s")
+
+def unregister_missing(present):
+    global catalog_version
+    with catalog_lock:
+        removed = [name for name in catalog if name not in present]
+        for filename in removed:
+            for table in catalog.pop(filename)["tables"]:
+                try:
+                    os.remove(table["path"])
+                except OSError:
+                    pass
+            catalog_version += 1
+            logger.info(f"Removed tables of deleted file '{filename}'")
+        if removed:
+            save_manifest()
+
+def scan_folder():
+    present = set()
+    for filename in os.listdir(TABLE_FOLDER):
+        if not filename.lower().endswith(TABLE_EXTENSIONS):
+            continue
+        present.add(filename)
+        path = os.path.join(TABLE_FOLDER, filename)
+        stat = os.stat(path)
+        try:
+            register_file(filename, f"{stat.st_size}:{stat.st_mtime_ns}", path)
+        except Exception as e:
+            logger.error(f"Error converting {filename}: {str(e)}")
+    unregister_missing(present)
+
+def scan_minio():
+    present = set()
+    download_dir = os.path.join(TABLE_CACHE_DIR, "downloads")
+    os.makedirs(download_dir, exist_ok=True)
+    for obj in minio_client.list_objects(MINIO_SOURCE_BUCKET, recursive=True):
+        if not obj.object_name.lower().endswith(TABLE_EXTENSIONS):
+            continue
+        present.add(obj.object_name)
+        entry = catalog.get(obj.object_name)
+        if (entry and entry["signature"] == obj.etag) or failed_files.get(obj.object_name) == obj.etag:
+            continue
+        path = os.path.join(download_dir, os.path.basename(obj.object_name))
+        try:
+            minio_client.fget_object(MINIO_SOURCE_BUCKET, obj.object_name, path)
+            register_file(obj.object_name, obj.etag, path)
+        except Exception as e:
+            logger.error(f"Error converting {obj.object_name}: {str(e)}")
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+    unregister_missing(present)
+
+def refreshTablesThread():
+    os.makedirs(TABLE_FOLDER, exist_ok=True)
+    while True:
+        try:
+            scan_minio() if TABLE_SOURCE == "minio" else scan_folder()
+        except Exception as e:
+            logger.error(f"Error in table refresh thread: {str(e)}")
+        time.sleep(TABLE_REFRESH_SECONDS)
+
+def scope_tables(scope):
+    """Tables visible in a scope: its own, then shared ones whose names are still free."""
+    with catalog_lock:
+        own, shared = {}, {}
+        for filename, entry in catalog.items():
+            target = own if entry["scope"] == scope else shared if entry["scope"] == SHARED_SCOPE else None
+            if target is None:
+                continue
+            for table in entry["tables"]:
+                target[table["name"]] = dict(table, source=filename)
+        return {**shared, **own}
+
+def open_scope(scope):
+    """The scope's DuckDB database, up to date with the catalog; hand it back with release_scope."""
+    with catalog_lock:
+        entry = scope_connections.get(scope)
+        if entry and entry["version"] == catalog_version:
+            scope_connections.move_to_end(scope)
+            entry["users"] += 1
+            return entry
+        version = catalog_version
+    entry = {"version": version, "connection": build_scope_connection(scope), "users": 1, "retired": False}
+    with catalog_lock:
+        stale = scope_connections.pop(scope, None)
+        if stale:
+            retire_scope(stale)
+        scope_connections[scope] = entry
+        while len(scope_connections) > TABLE_MAX_OPEN_SCOPES:
+            retire_scope(scope_connections.popitem(last=False)[1])
+    return entry
+
+def retire_scope(entry):
+    """Close a scope's database now, or when its last running query releases it. Called with catalog_lock held."""
+    entry["retired"] = True
+    if not entry["users"]:
+        entry["connection"].close()
+
+def release_scope(entry):
+    with catalog_lock:
+        entry["users"] -= 1
+        if entry["retired"] and not entry["users"]:
+            entry["connection"].close()
+
+def release_stopped_query(done, entry):
+    """Done-callback releasing the scope of a query that outlived its call."""
+    # Retrieved so an interrupted query is not reported as an unhandled error.
+    done.exception()
+    release_scope(entry)
+
+@contextmanager
+def scope_connection(scope):
+    entry = open_scope(scope)
+    try:
+        yield entry["connection"]
+    finally:
+        release_scope(entry)
+
+def build_scope_connection(scope):
+    """DuckDB connection that sees only the scope's tables and cannot read other files."""
+    connection = duckdb.connect(config={"threads": TABLE_THREADS, "memory_limit": TABLE_MEMORY_LIMIT})
+    try:
+        for name, table in scope_tables(scope).items():
+            connection.execute(f'CREATE VIEW "{name}" AS SELECT * FROM read_parquet({sql_string(table["path"])})')
+        directories = [os.path.join(TABLE_CACHE_DIR, s) + os.sep for s in {scope, SHARED_SCOPE}]
+        connection.execute(f"SET allowed_directories = [{', '.join(sql_string(d) for d in directories)}]")
+        connection.execute("SET enable_external_access = false")
+        connection.execute("SET lock_configuration = true")
+    except duckdb.Error:
+        connection.close()
+        raise
+    return connection
+
+def scope_of(conversation_id):
+    return identifier(str(conversation_id)) if conversation_id else SHARED_SCOPE
+
+def run_table_query(cursor, query, offset, max_rows):
+    statement = page_statement(query, offset, max_rows + 1) if is_pageable(query) else query
+    cursor.execute(statement)
+    if cursor.description is None:
+        return {"headers": [], "data": []}
+    headers = [column[0] for column in cursor.description]
+    if not is_pageable(query) and offset:
+        cursor.fetchmany(offset)
+    rows = cursor.fetchmany(max_rows + 1)
+    result = {"headers": headers, "data": rows[:max_rows]}
+    if len(rows) > max_rows or offset:
+        result["offset"] = offset
+        if len(rows) > max_rows:
+            result["next_offset"] = offset + max_rows
+            if is_pageable(query):
+                result["total_rows"] = cursor.execute(count_statement(query)).fetchone()[0]
+        else:
+            result["total_rows"] = offset + len(rows)
+    return result
+
+@table_mcp.tool()
+def list_tables(
+    conversation_id: Annotated[str, Field(description="Conversation whose uploaded files to list")] = ""
+) -> dict:
+    """List the tables made from uploaded CSV/Excel/Parquet files, with their source file and size."""
+    tables = [
+        {"table": name, "source": table["source"], "sheet": table["sheet"], "rows": table["rows"], "columns": table["columns"]}
+        for name, table in scope_tables(scope_of(conversation_id)).items()
+    ]
+    return {"tables": tables}
+
+@table_mcp.tool()
+def get_schema(
+    conversation_id: Annotated[str, Field(description="Conversation whose uploaded files to describe")] = "",
+    table_name: Annotated[str, Field(description="Only describe this table")] = ""
+) -> dict:
+    """Column names and types of the uploaded-file tables."""
+    try:
+        with scope_connection(scope_of(conversation_id)) as connection:
+            names = [table_name] if table_name else list(scope_tables(scope_of(conversation_id)))
+            tables = {}
+            for name in names:
+                if not re.match(r'^\w+$', name):
+                    return {"error": "Invalid table name"}
+                rows = connection.cursor().execute(f'DESCRIBE "{name}"').fetchall()
+                tables[name] = {row[0]: row[1] for row in rows}
+            return {"tables": tables}
+    except duckdb.Error as e:
+        logger.error(f"Error describing uploaded tables: {str(e)}")
+        return {"error": str(e)}
+
+@table_mcp.tool()
+async def query_db(
+    query: Annotated[str, Field(description="DuckDB SQL (PostgreSQL-like) over the tables from table_list_tables")],
+    conversation_id: Annotated[str, Field(description="Conversation whose uploaded files to query")] = "",
+    max_rows: Annotated[int, Field(description=f"Rows to return, at most {TABLE_MAX_PAGE_ROWS}")] = TABLE_PAGE_ROWS,
+    offset: Annotated[int, Field(description="Rows to skip, e.g. next_offset from a previous result")] = 0,
+    result_format: Annotated[
+        Literal["rows", "columnar", "text", "arrow"],
+        Field(description="Same encodings as sql_query_db")
+    ] = "rows"
+) -> dict:
+    """Run a read-only query over tables made from uploaded CSV/Excel/Parquet files."""
+    if not is_single_statement(query):
+        return {"error": "Only one statement can run per query; send the statements separately.", "error_type": "multiple_statements"}
+    if not is_read_only(query):
+        return {"error": "Only read-only queries (SELECT, WITH, DESCRIBE, SHOW, EXPLAIN) are allowed"}
+    max_rows = max(1, min(max_rows, TABLE_MAX_PAGE_ROWS))
+    opening = asyncio.ensure_future(asyncio.to_thread(open_scope, scope_of(conversation_id)))
+    try:
+        entry = await asyncio.shield(opening)
+    except asyncio.CancelledError:
+        # Released even if the database finishes opening after the call was cancelled.
+        opening.add_done_callback(lambda done: done.exception() or release_scope(done.result()))
+        raise
+    except duckdb.Error as e:
+        logger.error(f"Error opening uploaded tables: {str(e)}")
+        return {"error": str(e)}
+
+    worker = None
+    try:
+        cursor = entry["connection"].cursor()
+        started = time.time()
+        worker = asyncio.ensure_future(asyncio.to_thread(run_table_query, cursor, query, max(0, offset), max_rows))
+        res = await asyncio.wait_for(asyncio.shield(worker), TABLE_QUERY_TIMEOUT_SECONDS)
+        logger.info(f"Table query executed in {time.time() - started:.3f}s: {query}")
+        return encode_result(res, result_format)
+    except asyncio.TimeoutError:
+        logger.warning(f"Table query timed out after {TABLE_QUERY_TIMEOUT_SECONDS:g}s: {query}")
+        return {
+            "error": f"Query exceeded the {TABLE_QUERY_TIMEOUT_SECONDS:g}s time limit and was cancelled.",
+            "error_type": "timeout",
+            "timeout": True
+        }
+    except duckdb.Error as e:
+        logger.error(f"Error executing table query '{query}': {str(e)}")
+        return {"error": str(e)}
+    except ImportError:
+        return {"error": "The arrow format needs pyarrow installed on the server; use columnar instead"}
+    finally:
+        if worker is None or worker.done():
+            release_scope(entry)
+        else:
+            # A timed-out or cancelled query is interrupted and keeps its database until its thread stops.
+            cursor.interrupt()
+            worker.add_done_callback(lambda done: release_stopped_query(done, entry))
+
+t3 = threading.Thread(target=refreshTablesThread)
+t3.daemon = True
+t3.start()
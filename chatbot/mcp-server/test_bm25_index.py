@@ -0,0 +1,64 @@
+from bm25_index import BM25Index, reciprocal_rank_fusion, strip_accents, tokenize
+
+
+def test_strip_accents():
+    assert strip_accents("Đường doanh thu") == "Duong doanh thu"
+
+
+def test_tokenize_keeps_codes_and_adds_bigrams():
+    terms = tokenize("Doanh thu HPG 2021-2022")
+    assert "hpg" in terms
+    assert "2021-2022" in terms
+    assert "doanh_thu" in terms
+    assert "1.234,5" in tokenize("giá 1.234,5")
+
+
+def test_tokenize_adds_unaccented_variants():
+    terms = tokenize("Lợi nhuận")
+    assert "lợi_nhuận" in terms
+    assert "loi_nhuan" in terms
+    assert terms.count("loi") == 1
+
+
+def test_search_ranks_matching_documents_first():
+    index = BM25Index()
+    index.add(["a", "b", "c"], ["doanh thu quý 1 của HPG", "lợi nhuận của VNM", "thời tiết hôm nay"])
+    results = index.search("doanh thu hpg", 3)
+    assert results[0][0] == "a"
+    assert {doc_id for doc_id, _ in results} == {"a"}
+    assert index.search("loi nhuan", 3)[0][0] == "b"
+    assert index.search("", 3) == []
+
+
+def test_add_replaces_and_remove_forgets():
+    index = BM25Index()
+    index.add(["a"], ["doanh thu"])
+    index.add(["a"], ["lợi nhuận"])
+    assert len(index) == 1
+    assert index.search("doanh thu", 5) == []
+    index.remove(["a", "missing"])
+    assert len(index) == 0
+    assert index._total_length == 0
+    assert index._postings == {}
+
+
+def test_search_filters_on_metadata():
+    index = BM25Index()
+    index.add(["a", "b"], ["doanh thu", "doanh thu"], [{"source": "x.pdf"}, {"source": "y.pdf"}])
+    assert [doc_id for doc_id, _ in index.search("doanh thu", 5, where={"source": "y.pdf"})] == ["b"]
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "c", "a"], ["b"]])
+    assert fused[0] == "b"
+    assert set(fused) == {"a", "b", "c"}
+
+
+def test_search_matches_any_of_several_filters():
+    index = BM25Index()
+    index.add(
+        ["shared", "mine", "other"], ["doanh thu"] * 3,
+        [{"shared": True}, {"conversation": "34", "shared": False}, {"conversation": "35", "shared": False}]
+    )
+    hits = index.search("doanh thu", 5, where=[{"shared": True}, {"conversation": "34"}])
+    assert {doc_id for doc_id, _ in hits} == {"shared", "mine"}
@@ -0,0 +1,78 @@
+from bm25_sync import CLOCK_SKEW_SECONDS, load_index, refresh_index, stamp_chunks
+
+
+class SharedCollection:
+    """A collection on a shared Chroma server, written by another process."""
+
+    def __init__(self):
+        self.chunks = {}
+        self.metadata = {}
+        self.requests = []
+
+    def write(self, ids, documents, metadatas, now):
+        for doc_id, document, metadata in zip(ids, documents, stamp_chunks(metadatas, now)):
+            self.chunks[doc_id] = (document, metadata)
+        self.metadata["changed_at"] = now
+
+    def delete(self, ids, now):
+        for doc_id in ids:
+            del self.chunks[doc_id]
+        self.metadata["deleted_at"] = now
+
+    def get(self, limit, offset, include, where=None):
+        self.requests.append({"include": include, "where": where})
+        rows = [
+            (doc_id, document, metadata) for doc_id, (document, metadata) in self.chunks.items()
+            if where is None or metadata["written"] > where["written"]["$gt"]
+        ][offset:offset + limit]
+        return {"ids": [row[0] for row in rows], "documents": [row[1] for row in rows], "metadatas": [row[2] for row in rows]}
+
+
+def found(index, query):
+    return {doc_id for doc_id, _ in index.search(query, 10)}
+
+
+def test_delete_and_add_of_equal_count_is_picked_up():
+    target = SharedCollection()
+    target.write(["a_0", "a_1"], ["doanh thu HPG", "loi nhuan HPG"], [{"source": "a"}] * 2, now=1000)
+    index, stamps = load_index(target, page_size=1)
+    assert found(index, "HPG") == {"a_0", "a_1"}
+
+    target.delete(["a_0", "a_1"], now=2000)
+    target.write(["b_0", "b_1"], ["doanh thu VNM", "loi nhuan VNM"], [{"source": "b", "shared": True}] * 2, now=2000)
+    stamps = refresh_index(index, target, stamps, page_size=1)
+
+    assert stamps == (2000, 2000)
+    assert len(index) == 2
+    assert found(index, "HPG") == set()
+    assert found(index, "VNM") == {"b_0", "b_1"}
+    assert index.search("VNM", 10, where={"shared": True})
+
+
+def test_rewritten_chunks_with_the_same_ids_are_replaced():
+    target = SharedCollection()
+    target.write(["a_0"], ["doanh thu HPG"], [{"source": "a"}], now=1000)
+    index, stamps = load_index(target)
+
+    target.delete(["a_0"], now=2000)
+    target.write(["a_0"], ["doanh thu VNM"], [{"source": "a"}], now=2000)
+    refresh_index(index, target, stamps)
+    assert found(index, "VNM") == {"a_0"}
+    assert found(index, "HPG") == set()
+
+
+def test_only_recent_chunks_are_fetched():
+    target = SharedCollection()
+    target.write(["a_0"], ["doanh thu HPG"], [{}], now=1000)
+    index, stamps = load_index(target)
+
+    target.requests.clear()
+    assert refresh_index(index, target, stamps) == stamps
+    assert target.requests == []
+
+    target.write(["b_0"], ["doanh thu VNM"], [{}], now=5000)
+    stamps = refresh_index(index, target, stamps)
+    assert {"include": ["documents", "metadatas"], "where": {"written": {"$gt": 1000 - CLOCK_SKEW_SECONDS}}} in target.requests
+    # Nothing was deleted, so the ids are not listed.
+    assert all(request["include"] for request in target.requests)
+    assert found(index, "doanh thu") == {"a_0", "b_0"}
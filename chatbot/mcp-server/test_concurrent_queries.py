@@ -0,0 +1,67 @@
+import asyncio
+import time
+
+from concurrent_queries import distinct_queries, run_concurrently
+
+
+def timed_out(timeout):
+    return {"error": f"over {timeout:g}s", "error_type": "timeout"}
+
+
+def run_all(queries, run, timeout=1.0):
+    return asyncio.run(run_concurrently(queries, run, timeout, timed_out))
+
+
+def test_distinct_queries():
+    assert distinct_queries([" SELECT 1 ", "SELECT 2", "", "SELECT 1", "  "]) == ["SELECT 1", "SELECT 2"]
+
+
+def test_results_keep_the_order_of_the_queries():
+    async def run(query, deadline):
+        # Later queries finish first.
+        await asyncio.sleep(0.03 * (3 - int(query[-1])))
+        return {"data": [[int(query[-1])]]}
+
+    results = run_all(["SELECT 1", "SELECT 2", "SELECT 3"], run)
+    assert results == [
+        {"query": "SELECT 1", "data": [[1]]}, {"query": "SELECT 2", "data": [[2]]}, {"query": "SELECT 3", "data": [[3]]}
+    ]
+
+
+def test_queries_share_one_deadline():
+    deadlines = []
+
+    async def run(query, deadline):
+        deadlines.append(deadline)
+        if query.startswith("slow"):
+            await asyncio.sleep(max(deadline - time.monotonic(), 0))
+            return {"error": "Query exceeded 0.02s", "error_type": "timeout"}
+        return {"data": [[1]]}
+
+    started = time.monotonic()
+    results = run_all(["slow", "fast", "slow 2"], run, timeout=0.2)
+    elapsed = time.monotonic() - started
+
+    assert len(set(deadlines)) == 1
+    assert abs(deadlines[0] - (started + 0.2)) < 0.05
+    # Side by side, so about one timeout rather than one per slow query.
+    assert elapsed < 0.35
+    assert results[1] == {"query": "fast", "data": [[1]]}
+    assert results[0] == {"query": "slow", "error": "over 0.2s", "error_type": "timeout"}
+    assert results[2]["error"] == "over 0.2s"
+
+
+def test_a_failing_query_only_fails_its_own_entry():
+    async def run(query, deadline):
+        if query == "broken":
+            raise RuntimeError("lost connection")
+        if query == "denied":
+            return {"error": "SELECT command denied", "errno": 1142}
+        return {"data": [[1]]}
+
+    results = run_all(["denied", "ok", "broken"], run)
+    assert results == [
+        {"query": "denied", "error": "SELECT command denied", "errno": 1142},
+        {"query": "ok", "data": [[1]]},
+        {"query": "broken", "error": "lost connection"}
+    ]
@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+
+from embedding_compression import PCAProjection, RerankStore, dequantize, normalize, quantize
+
+
+def test_normalize_leaves_zero_vectors():
+    vectors = normalize([[3, 4], [0, 0]])
+    assert np.allclose(vectors, [[0.6, 0.8], [0, 0]])
+
+
+@pytest.mark.parametrize("dtype,tolerance", [("float16", 1e-3), ("int8", 1e-2)])
+def test_quantize_round_trip(dtype, tolerance):
+    vector = np.random.default_rng(0).normal(size=64).astype(np.float32)
+    data, scale = quantize(vector, dtype)
+    restored = dequantize(data, scale, dtype)
+    assert np.max(np.abs(restored - vector)) <= tolerance * np.abs(vector).max()
+    assert quantize(np.zeros(4), "int8")[1] == 1.0
+
+
+def test_quantize_rejects_unknown_dtype():
+    with pytest.raises(ValueError):
+        quantize([1.0], "int4")
+
+
+def test_pca_projection_keeps_neighbours(tmp_path):
+    rng = np.random.default_rng(1)
+    basis = rng.normal(size=(4, 32))
+    vectors = rng.normal(size=(200, 4)) @ basis + 0.01 * rng.normal(size=(200, 32))
+    projection = PCAProjection.fit(vectors, 8)
+    assert (projection.dimensions, projection.input_dimensions) == (8, 32)
+
+    reduced = projection.transform(vectors)
+    assert np.allclose(np.linalg.norm(reduced, axis=1), 1, atol=1e-5)
+    full_scores = normalize(vectors) @ normalize(vectors[:1]).T
+    reduced_scores = reduced @ reduced[:1].T
+    assert np.argsort(-full_scores[:, 0])[1] == np.argsort(-reduced_scores[:, 0])[1]
+
+    path = str(tmp_path / "pca.npz")
+    projection.save(path)
+    assert np.allclose(PCAProjection.load(path).transform(vectors), reduced)
+
+
+def test_pca_fit_needs_enough_vectors():
+    with pytest.raises(ValueError):
+        PCAProjection.fit(np.ones((3, 16)), 8)
+
+
+def test_rerank_store(tmp_path):
+    store = RerankStore(str(tmp_path / "rerank.sqlite3"))
+    vectors = np.eye(3, dtype=np.float32)
+    store.put("main", ["a", "b", "c"], vectors, "int8")
+    store.put("other", ["a"], vectors[:1], "float16")
+    found = store.get("main", ["a", "c", "missing"])
+    assert set(found) == {"a", "c"}
+    assert np.allclose(found["c"], vectors[2])
+    assert store.stats() == {"vectors": 4, "bytes": 3 * 3 + 3 * 2}
+
+    store.delete("main", ["a"])
+    assert set(store.get("main", ["a", "b"])) == {"b"}
+    store.delete("main")
+    assert store.get("main", ["b", "c"]) == {}
+    assert set(store.get("other", ["a"])) == {"a"}
+
+
+def recall_at(k, found, exact):
+    return len(set(found[:k]) & set(exact[:k])) / k
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_reduced_search_with_rerank_copies_recovers_recall(tmp_path, dtype):
+    rng = np.random.default_rng(2)
+    basis = rng.normal(size=(16, 64))
+    documents = rng.normal(size=(1000, 16)) @ basis + 0.5 * rng.normal(size=(1000, 64))
+    queries = rng.normal(size=(20, 16)) @ basis + 0.5 * rng.normal(size=(20, 64))
+    ids = [f"doc_{i}" for i in range(len(documents))]
+
+    projection = PCAProjection.fit(documents, 8)
+    indexed = projection.transform(documents)
+    store = RerankStore(str(tmp_path / "rerank.sqlite3"))
+    store.put("main", ids, documents, dtype)
+
+    reduced_recall, reranked_recall = [], []
+    for query, full_query in zip(projection.transform(queries), normalize(queries)):
+        exact = list(np.argsort(-(normalize(documents) @ full_query)))
+        reduced = list(np.argsort(-(indexed @ query)))
+        candidates = reduced[:100]
+        copies = store.get("main", [ids[i] for i in candidates])
+        scores = normalize([copies[ids[i]] for i in candidates]) @ full_query
+        reranked = [candidates[i] for i in np.argsort(-scores)]
+        reduced_recall.append(recall_at(10, reduced, exact))
+        reranked_recall.append(recall_at(10, reranked, exact))
+
+    # The reduced index alone loses neighbours that re-scoring its candidates against the full copies gets back.
+    assert np.mean(reduced_recall) < 0.7
+    assert np.mean(reranked_recall) >= 0.95
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_rerank_copies_keep_the_full_ranking(tmp_path, dtype):
+    rng = np.random.default_rng(3)
+    vectors = rng.normal(size=(200, 64)).astype(np.float32)
+    query = normalize(rng.normal(size=(1, 64)))[0]
+    ids = [str(i) for i in range(len(vectors))]
+    store = RerankStore(str(tmp_path / "rerank.sqlite3"))
+    store.put("main", ids, vectors, dtype)
+
+    copies = store.get("main", ids)
+    restored = normalize([copies[doc_id] for doc_id in ids])
+    assert np.allclose(restored, normalize(vectors), atol=1e-2)
+    exact = list(np.argsort(-(normalize(vectors) @ query)))
+    assert recall_at(10, list(np.argsort(-(restored @ query))), exact) >= 0.9
@@ -0,0 +1,90 @@
+import threading
+import time
+from contextlib import closing
+from types import SimpleNamespace
+
+import pytest
+
+from ingest_pipeline import iter_chunk_batches, read_ahead
+
+
+class LineSplitter:
+    """Splits a page into one chunk per line, like a text splitter with tiny chunks."""
+
+    def split_documents(self, documents):
+        return [
+            SimpleNamespace(page_content=line, metadata=document.metadata)
+            for document in documents for line in document.page_content.split("\n")
+        ]
+
+
+def page(number, text):
+    return SimpleNamespace(page_content=text, metadata={"page": number})
+
+
+def test_chunk_batches_carry_ids_pages_and_metadata():
+    pages = [page(0, "a\nb\nc"), page(1, "d\ne")]
+    batches = list(iter_chunk_batches(pages, LineSplitter(), "x.pdf", {"source": "x.pdf", "shared": True}, 2))
+    assert [ids for ids, _, _ in batches] == [
+        ["x.pdf_chunk_0", "x.pdf_chunk_1"], ["x.pdf_chunk_2", "x.pdf_chunk_3"], ["x.pdf_chunk_4"]
+    ]
+    assert [documents for _, documents, _ in batches] == [["a", "b"], ["c", "d"], ["e"]]
+    assert batches[1][2] == [
+        {"source": "x.pdf", "shared": True, "chunk": 2, "page": 1},
+        {"source": "x.pdf", "shared": True, "chunk": 3, "page": 2}
+    ]
+
+
+def test_pages_are_split_lazily():
+    read = []
+
+    def pages():
+        for number in range(100):
+            read.append(number)
+            yield page(number, f"line {number}")
+
+    batches = iter_chunk_batches(pages(), LineSplitter(), "x.pdf", {}, 3)
+    next(batches)
+    assert read == [0, 1, 2]
+
+
+def test_read_ahead_yields_everything_in_order():
+    assert list(read_ahead(iter(range(50)), 4)) == list(range(50))
+    assert list(read_ahead(iter([]), 4)) == []
+
+
+def test_read_ahead_stays_bounded():
+    produced = []
+
+    def items():
+        for i in range(100):
+            produced.append(i)
+            yield i
+
+    with closing(read_ahead(items(), 3)) as stream:
+        assert next(stream) == 0
+        time.sleep(0.1)
+        # One item handed out, three queued and one waiting to be queued.
+        assert len(produced) <= 5
+
+
+def test_read_ahead_reraises_producer_errors():
+    def items():
+        yield 1
+        raise ValueError("corrupt page")
+
+    stream = read_ahead(items(), 2)
+    assert next(stream) == 1
+    with pytest.raises(ValueError, match="corrupt page"):
+        next(stream)
+
+
+def test_closing_read_ahead_stops_the_producer():
+    def items():
+        for i in range(1_000_000):
+            yield i
+
+    before = threading.active_count()
+    with closing(read_ahead(items(), 2)) as stream:
+        next(stream)
+    assert threading.active_count() == before
@@ -0,0 +1,98 @@
+import ingest_scheduler
+from ingest_scheduler import DONE, FAILED, PROCESSING, QUEUED, IngestionScheduler
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+def make_scheduler(monkeypatch, **kwargs):
+    clock = Clock()
+    monkeypatch.setattr(ingest_scheduler.time, "time", clock.time)
+    return IngestionScheduler(**kwargs), clock
+
+
+def test_small_files_go_first(monkeypatch):
+    scheduler, _ = make_scheduler(monkeypatch)
+    scheduler.submit("big.pdf", 10_000_000)
+    scheduler.submit("small.pdf", 1_000)
+    assert scheduler.next_job()["source"] == "small.pdf"
+    assert scheduler.next_job()["source"] == "big.pdf"
+    assert scheduler.next_job() is None
+
+
+def test_duplicate_submit_is_ignored(monkeypatch):
+    scheduler, _ = make_scheduler(monkeypatch)
+    assert scheduler.submit("a.pdf", 100, run="first")
+    assert not scheduler.submit("a.pdf", 100, run="second")
+    assert scheduler.next_job()["run"] == "second"
+    scheduler.finish("a.pdf")
+    assert scheduler.submit("a.pdf", 100)
+
+
+def test_owner_fairness(monkeypatch):
+    scheduler, _ = make_scheduler(monkeypatch)
+    scheduler.submit("alice-1.pdf", 1_000_000, owner="alice")
+    scheduler.next_job()
+    scheduler.finish("alice-1.pdf")
+    scheduler.submit("alice-2.pdf", 1_000, owner="alice")
+    scheduler.submit("bob-1.pdf", 500_000, owner="bob")
+    assert scheduler.next_job()["source"] == "bob-1.pdf"
+
+
+def test_aging_lets_large_files_through(monkeypatch):
+    scheduler, clock = make_scheduler(monkeypatch, aging_seconds=10.0)
+    scheduler.submit("big.pdf", 1_000_000)
+    clock.now += 10_000
+    scheduler.submit("small.pdf", 10_000)
+    assert scheduler.next_job()["source"] == "big.pdf"
+
+
+def test_waited_conversation_jumps_the_queue(monkeypatch):
+    scheduler, clock = make_scheduler(monkeypatch)
+    scheduler.submit("small.pdf", 1_000, conversation="c1")
+    scheduler.submit("big.pdf", 1_000_000, conversation="c2")
+    scheduler.mark_waiting("c2", seconds=60)
+    assert scheduler.next_job()["source"] == "big.pdf"
+    scheduler.submit("other.pdf", 1_000_000, conversation="c2")
+    clock.now += 61
+    assert scheduler.next_job()["source"] == "small.pdf"
+
+
+def test_status_reports_progress_and_eta(monkeypatch):
+    scheduler, clock = make_scheduler(monkeypatch, default_bytes_per_second=1_000.0)
+    scheduler.submit("a.pdf", 10_000, conversation="c1")
+    scheduler.submit("b.pdf", 20_000, conversation="c1")
+    scheduler.next_job()
+    scheduler.report("a.pdf", chunks_done=3, pages_done=1, pages_total=2)
+    by_source = {entry["source"]: entry for entry in scheduler.status(conversation="c1")}
+    assert by_source["a.pdf"]["status"] == PROCESSING
+    assert by_source["a.pdf"]["eta_seconds"] == 5.0
+    assert by_source["b.pdf"]["status"] == QUEUED
+    assert by_source["b.pdf"]["queue_position"] == 1
+    assert by_source["b.pdf"]["eta_seconds"] == 25.0
+    assert scheduler.pending("c1")
+    assert scheduler.status(conversation="c2") == []
+
+    clock.now += 5
+    scheduler.finish("a.pdf")
+    scheduler.next_job()
+    scheduler.finish("b.pdf", error=ValueError("bad file"))
+    by_source = {entry["source"]: entry for entry in scheduler.status(conversation="c1")}
+    assert by_source["a.pdf"]["status"] == DONE
+    assert by_source["b.pdf"]["status"] == FAILED
+    assert by_source["b.pdf"]["error"] == "bad file"
+    assert not scheduler.pending("c1")
+
+
+def test_finished_jobs_expire(monkeypatch):
+    scheduler, clock = make_scheduler(monkeypatch, retention_seconds=60.0)
+    scheduler.submit("a.pdf", 100)
+    scheduler.next_job()
+    scheduler.finish("a.pdf")
+    clock.now += 61
+    assert scheduler.status() == []
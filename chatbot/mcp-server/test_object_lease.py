@@ -0,0 +1,97 @@
+import threading
+
+import pytest
+
+from object_lease import LeaseLost, ObjectLease
+
+
+class ConditionalStore:
+    """Checkpoints in memory with the If-Match / If-None-Match semantics of the chunk bucket."""
+
+    def __init__(self):
+        self.objects = {}
+        self.versions = 0
+        self.lock = threading.Lock()
+
+    def read(self, name):
+        with self.lock:
+            checkpoint, etag = self.objects.get(name, (None, None))
+            return (dict(checkpoint) if checkpoint else None), etag
+
+    def write(self, name, checkpoint, etag):
+        with self.lock:
+            if self.objects.get(name, (None, None))[1] != etag:
+                return None
+            self.versions += 1
+            self.objects[name] = (dict(checkpoint), f"v{self.versions}")
+            return f"v{self.versions}"
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def lease(store, worker, clock=None):
+    return ObjectLease(store.read, store.write, "12_34_1.pdf", worker, 300, clock or Clock())
+
+
+def test_only_one_of_two_concurrent_claimants_wins():
+    for _ in range(50):
+        store = ConditionalStore()
+        claimants = [lease(store, "worker-a"), lease(store, "worker-b")]
+        both_read = threading.Barrier(2)
+        read = store.read
+
+        def read_together(name):
+            result = read(name)
+            both_read.wait()
+            return result
+
+        for claimant in claimants:
+            claimant.read = read_together
+        results = [None, None]
+        threads = [
+            threading.Thread(target=lambda i=i: results.__setitem__(i, claimants[i].claim("etag-1")))
+            for i in range(2)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        winners = [i for i, checkpoint in enumerate(results) if checkpoint is not None]
+        assert len(winners) == 1
+        assert store.read("12_34_1.pdf")[0]["worker"] == claimants[winners[0]].worker
+
+
+def test_live_lease_is_respected_until_it_expires():
+    store, clock = ConditionalStore(), Clock()
+    owner = lease(store, "worker-a", clock)
+    assert owner.claim("etag-1") == {"etag": "etag-1", "chunks_done": 0, "status": "processing", "worker": "worker-a", "updated": 1000.0}
+    owner.save(chunks_done=64)
+
+    clock.now += 299
+    assert lease(store, "worker-b", clock).claim("etag-1") is None
+
+    clock.now += 2
+    successor = lease(store, "worker-b", clock)
+    assert successor.claim("etag-1")["chunks_done"] == 64
+    with pytest.raises(LeaseLost):
+        owner.save(chunks_done=128)
+    assert store.read("12_34_1.pdf")[0]["worker"] == "worker-b"
+
+
+def test_new_version_starts_over_and_done_is_not_reclaimed():
+    store = ConditionalStore()
+    owner = lease(store, "worker-a")
+    owner.claim("etag-1")
+    owner.save(status="done", chunks_done=10)
+    writes = store.versions
+
+    assert lease(store, "worker-b").claim("etag-1")["status"] == "done"
+    assert store.versions == writes
+    assert lease(store, "worker-b").claim("etag-2")["chunks_done"] == 0
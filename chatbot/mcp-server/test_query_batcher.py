@@ -0,0 +1,79 @@
+import asyncio
+import threading
+
+import pytest
+
+from query_batcher import QueryBatcher
+
+
+class RecordingSearch:
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+        self.lock = threading.Lock()
+
+    def __call__(self, requests):
+        with self.lock:
+            self.calls.append(list(requests))
+        if self.fail:
+            raise RuntimeError("search unavailable")
+        return [{"ids": [f"{text}-{n}"]} for text, n in requests]
+
+
+def run_concurrently(batcher, requests):
+    async def main():
+        return await asyncio.gather(*(batcher.submit(*request) for request in requests))
+    return asyncio.run(main())
+
+
+def test_concurrent_queries_share_one_search():
+    search = RecordingSearch()
+    batcher = QueryBatcher(search, window_ms=50, max_batch=10)
+    results = run_concurrently(batcher, [("a", 1), ("b", 2), ("c", 3)])
+    assert results == [{"ids": ["a-1"]}, {"ids": ["b-2"]}, {"ids": ["c-3"]}]
+    assert search.calls == [[("a", 1), ("b", 2), ("c", 3)]]
+    assert batcher.stats == {"queries": 3, "batches": 1, "largest_batch": 3}
+    assert not batcher._tasks
+
+
+def test_full_batches_are_searched_without_waiting():
+    search = RecordingSearch()
+    batcher = QueryBatcher(search, window_ms=60_000, max_batch=2)
+    results = run_concurrently(batcher, [("a", 1), ("b", 1), ("c", 1), ("d", 1)])
+    assert [result["ids"][0] for result in results] == ["a-1", "b-1", "c-1", "d-1"]
+    assert sorted(map(len, search.calls)) == [2, 2]
+
+
+def test_flushed_batches_are_kept_until_done():
+    search = RecordingSearch()
+    batcher = QueryBatcher(search, window_ms=60_000, max_batch=1)
+
+    async def main():
+        pending = asyncio.ensure_future(batcher.submit("a", 1))
+        await asyncio.sleep(0)
+        assert len(batcher._tasks) == 1
+        assert await pending == {"ids": ["a-1"]}
+        await asyncio.sleep(0)
+        assert not batcher._tasks
+
+    asyncio.run(main())
+
+
+def test_search_errors_reach_every_caller():
+    batcher = QueryBatcher(RecordingSearch(fail=True), window_ms=20, max_batch=10)
+
+    async def main():
+        return await asyncio.gather(batcher.submit("a", 1), batcher.submit("b", 1), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_zero_window_searches_each_query_alone():
+    search = RecordingSearch()
+    batcher = QueryBatcher(search, window_ms=0, max_batch=10)
+    results = run_concurrently(batcher, [("a", 1), ("b", 1)])
+    assert [result["ids"][0] for result in results] == ["a-1", "b-1"]
+    assert search.calls == [[("a", 1)], [("b", 1)]] or search.calls == [[("b", 1)], [("a", 1)]]
+    with pytest.raises(RuntimeError):
+        asyncio.run(QueryBatcher(RecordingSearch(fail=True), 0, 10).submit("a", 1))
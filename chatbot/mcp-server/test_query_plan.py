@@ -0,0 +1,74 @@
+import json
+
+from query_plan import rows_until_limit, suggestions, summarize_plan
+
+SINGLE_TABLE = {
+    "query_block": {
+        "cost_info": {"query_cost": "10250.50"},
+        "table": {
+            "table_name": "orders",
+            "access_type": "ALL",
+            "rows_examined_per_scan": 100000,
+            "rows_produced_per_join": 10000,
+            "filtered": "10.00",
+            "attached_condition": "(`shop`.`orders`.`status` = 'new')"
+        }
+    }
+}
+
+CARTESIAN_JOIN = {
+    "query_block": {
+        "cost_info": {"query_cost": "5000"},
+        "ordering_operation": {
+            "using_filesort": True,
+            "nested_loop": [
+                {"table": {"table_name": "a", "access_type": "ALL", "rows_examined_per_scan": 1000,
+                           "rows_produced_per_join": 1000, "filtered": "100.00"}},
+                {"table": {"table_name": "b", "access_type": "ALL", "rows_examined_per_scan": 500,
+                           "rows_produced_per_join": 500000, "filtered": "100.00"}}
+            ]
+        }
+    }
+}
+
+
+def test_summarize_single_table():
+    summary = summarize_plan(json.dumps(SINGLE_TABLE))
+    assert summary["cost"] == 10250.5
+    assert summary["rows_examined"] == 100000
+    assert summary["full_scans"] == ["orders"]
+    assert summary["cartesian_joins"] == []
+    assert not summary["blocking"]
+    assert summary["tables"][0]["filtered"] == 10.0
+
+
+def test_summarize_join_multiplies_prefix_rows():
+    summary = summarize_plan(CARTESIAN_JOIN)
+    assert summary["rows_examined"] == 1000 + 1000 * 500
+    assert summary["cartesian_joins"] == ["b"]
+    assert summary["blocking"]
+
+
+def test_subqueries_under_a_table_are_counted():
+    plan = {"query_block": {"table": {
+        "table_name": "d", "access_type": "ALL", "rows_examined_per_scan": 10,
+        "materialized_from_subquery": {"query_block": {"table": {
+            "table_name": "inner_t", "access_type": "ref", "rows_examined_per_scan": 7
+        }}}
+    }}}
+    summary = summarize_plan(plan)
+    assert [table["table"] for table in summary["tables"]] == ["d", "inner_t"]
+    assert summary["rows_examined"] == 17
+
+
+def test_rows_until_limit():
+    assert rows_until_limit(summarize_plan(SINGLE_TABLE), 100) == 1000
+    assert rows_until_limit(summarize_plan(CARTESIAN_JOIN), 100) is None
+
+
+def test_suggestions():
+    tips = suggestions(summarize_plan(CARTESIAN_JOIN))
+    assert any("join condition for table `b`" in tip for tip in tips)
+    assert any("Sorting" in tip for tip in tips)
+    tips = suggestions(summarize_plan(SINGLE_TABLE))
+    assert any("Filter `orders`" in tip for tip in tips)
@@ -0,0 +1,90 @@
+import math
+
+import pytest
+
+from query_sample import (
+    Z_SCORE, estimable_aggregate, estimate, mask_quoted, plan_approximation, sample_table_name, substitute_table,
+    table_references
+)
+
+
+def test_mask_quoted_keeps_positions():
+    sql = "SELECT 'a,(b' FROM t"
+    assert mask_quoted(sql) == "SELECT '____' FROM t"
+    assert len(mask_quoted(sql)) == len(sql)
+
+
+def test_estimable_aggregate():
+    assert estimable_aggregate("SUM(price * qty) AS revenue") == ("SUM", "price * qty")
+    assert estimable_aggregate("count(*)") == ("COUNT", "*")
+    assert estimable_aggregate("AVG(x) avg_x") == ("AVG", "x")
+    assert estimable_aggregate("SUM(a) / SUM(b)") is None
+    assert estimable_aggregate("COUNT(DISTINCT a)") is None
+    assert estimable_aggregate("MAX(a)") is None
+
+
+def test_plan_approximation_appends_helpers():
+    plan = plan_approximation("SELECT region, COUNT(*), SUM(amount) AS s, AVG(amount) FROM sales GROUP BY region;")
+    assert plan["kinds"] == [("key",), ("count",), ("sum", 4), ("avg", 5, 6)]
+    assert plan["select"] == (
+        "SELECT region, COUNT(*), SUM(amount) AS s, AVG(amount), SUM((amount) * (amount)) AS approx_helper_0, "
+        "SUM((amount) * (amount)) AS approx_helper_1, COUNT(amount) AS approx_helper_2 FROM sales GROUP BY region"
+    )
+
+
+def test_plan_approximation_ignores_keywords_in_literals():
+    plan = plan_approximation("SELECT COUNT(*) FROM t WHERE note = 'UNION, HAVING (SELECT'")
+    assert plan["kinds"] == [("count",)]
+
+
+@pytest.mark.parametrize("sql", [
+    "SHOW TABLES",
+    "SELECT a FROM t",
+    "SELECT MAX(a) FROM t",
+    "SELECT COUNT(*) FROM t HAVING COUNT(*) > 1",
+    "SELECT COUNT(*) FROM t UNION SELECT COUNT(*) FROM u",
+    "SELECT DISTINCT COUNT(*) FROM t",
+    "SELECT COUNT(*) FROM (SELECT a FROM t) x",
+    "SELECT COUNT(*)",
+])
+def test_plan_approximation_rejects(sql):
+    with pytest.raises(ValueError):
+        plan_approximation(sql)
+
+
+def test_table_references_and_substitution():
+    sql = "SELECT COUNT(*) FROM shop.orders o JOIN `items` WHERE o.id = 1"
+    orders, items = table_references(sql)
+    assert (orders["database"], orders["table"], orders["alias"]) == ("shop", "orders", "o")
+    assert (items["database"], items["table"], items["alias"]) == (None, "items", None)
+    assert substitute_table(sql, orders, "samples.s1") == "SELECT COUNT(*) FROM samples.s1 o JOIN `items` WHERE o.id = 1"
+    assert substitute_table(sql, items, "samples.s2") == (
+        "SELECT COUNT(*) FROM shop.orders o JOIN samples.s2 AS `items` WHERE o.id = 1"
+    )
+
+
+def test_sample_table_name_fits_identifier_limit():
+    assert sample_table_name("shop", "orders") == "shop__orders"
+    long_name = sample_table_name("d" * 40, "t" * 40)
+    assert len(long_name) == 64
+    assert long_name != sample_table_name("d" * 40, "t" * 39 + "u")
+
+
+def test_estimate_scales_sums_and_counts():
+    plan = plan_approximation("SELECT region, COUNT(*), SUM(amount), AVG(amount) FROM sales GROUP BY region")
+    # One group sampled at 10%: 4 rows with amounts 1, 2, 3, 4.
+    row = ("north", 4, 10, 2.5, 30, 30, 4)
+    headers, rows, margins = estimate(plan, ["region", "c", "s", "a", "h0", "h1", "h2"], [row], scale=10)
+    assert headers == ["region", "c", "s", "a"]
+    assert rows == [["north", 40, 100.0, 2.5]]
+    assert margins["c"][0] == pytest.approx(Z_SCORE * math.sqrt(10 * 9 * 4))
+    assert margins["s"][0] == pytest.approx(Z_SCORE * math.sqrt(10 * 9 * 30))
+    sample_variance = (30 - 4 * 2.5 ** 2) / 3
+    assert margins["a"][0] == pytest.approx(Z_SCORE * math.sqrt(0.9 * sample_variance / 4))
+
+
+def test_estimate_handles_nulls():
+    plan = plan_approximation("SELECT SUM(amount) FROM sales")
+    _, rows, margins = estimate(plan, ["s", "h0"], [(None, None)], scale=5)
+    assert rows == [[None]]
+    assert margins == {"s": [None]}
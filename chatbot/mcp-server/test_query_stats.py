@@ -0,0 +1,59 @@
+from query_stats import QueryStats, percentile, query_fingerprint
+
+
+def test_fingerprint_replaces_literals():
+    sql = "SELECT /*+ MAX_EXECUTION_TIME(2500) */ * FROM t WHERE id IN (1, 2,3) AND name = 'x''y' LIMIT 10"
+    assert query_fingerprint(sql) == "select * from t where id in (...) and name = ? limit ?"
+    assert query_fingerprint("INSERT INTO t VALUES (1,'a'),(2,'b')") == "insert into t values (...)"
+    assert query_fingerprint("SELECT `t1`.a FROM t1") == "select `t1`.a from t1"
+
+
+def test_fingerprint_does_not_cut_at_comment_characters_in_literals():
+    first = query_fingerprint("SELECT * FROM t WHERE code = 'A#1' AND n = 2")
+    second = query_fingerprint("SELECT * FROM t WHERE code = 'A#1' OR m = 3")
+    assert first == "select * from t where code = ? and n = ?"
+    assert first != second
+    assert query_fingerprint("SELECT * FROM t WHERE c LIKE '%--%' AND d = 1") == "select * from t where c like ? and d = ?"
+
+
+def test_percentile_within_a_bucket():
+    stats = QueryStats("/nonexistent/stats.json")
+    for milliseconds in (10,) * 90 + (1000,) * 10:
+        stats.record("SELECT 1", milliseconds)
+    (entry,) = stats._entries.values()
+    histogram = entry["histogram"]
+    assert 9 <= percentile(histogram, 0.5) <= 11
+    assert 900 <= percentile(histogram, 0.99) <= 1100
+    assert percentile({}, 0.5) is None
+
+
+def test_record_and_top(tmp_path):
+    stats = QueryStats(str(tmp_path / "stats.json"))
+    for i in range(3):
+        stats.record(f"SELECT * FROM a WHERE id = {i}", 5, rows=2)
+    stats.record("SELECT * FROM b", 50, error=True)
+    top = stats.top(1)
+    assert top["fingerprints"] == 2
+    assert top["calls"] == 4
+    assert top["top_frequent"][0]["calls"] == 3
+    assert top["top_frequent"][0]["avg_rows"] == 2
+    assert top["top_slow"][0]["fingerprint"] == "select * from b"
+    assert top["top_slow"][0]["error_rate"] == 1
+
+
+def test_eviction_keeps_the_most_used(tmp_path):
+    stats = QueryStats(str(tmp_path / "stats.json"), max_fingerprints=10)
+    for _ in range(5):
+        stats.record("SELECT * FROM busy", 1)
+    for i in range(20):
+        stats.record(f"SELECT * FROM t{i}", 1)
+    assert len(stats._entries) <= 10
+    assert "select * from busy" in {entry["fingerprint"] for entry in stats._entries.values()}
+
+
+def test_flush_and_reload(tmp_path):
+    path = str(tmp_path / "sub" / "stats.json")
+    stats = QueryStats(path)
+    stats.record("SELECT 1", 3)
+    stats.flush()
+    assert QueryStats(path).top()["calls"] == 1
@@ -0,0 +1,85 @@
+from rag_postprocess import (
+    assign_by_rank, format_pages, fuse_candidates, join_overlapping, merge_adjacent, mmr, pack_passages, parse_chunk_id,
+    trim_to_match
+)
+
+
+def test_parse_chunk_id():
+    assert parse_chunk_id("bao_cao.pdf_chunk_12") == ("bao_cao.pdf", 12)
+    assert parse_chunk_id("other-id") == ("other-id", None)
+
+
+def test_mmr_skips_near_duplicates():
+    relevance = [1.0, 0.99, 0.5]
+    embeddings = [[1, 0], [1, 0.01], [0, 1]]
+    assert mmr(relevance, embeddings, 2) == [0, 1]
+    assert mmr(relevance, embeddings, 2, lambda_mult=0.5) == [0, 2]
+    assert mmr(relevance, embeddings, 5, lambda_mult=0.5) == [0, 2, 1]
+    assert mmr([], [], 3) == []
+
+
+def test_join_overlapping_drops_shared_text():
+    shared = "x" * 25
+    assert join_overlapping("abc " + shared, shared + " def", 50) == "abc " + shared + " def"
+    assert join_overlapping("abc", "def", 50) == "abc\ndef"
+
+
+def test_merge_adjacent_joins_consecutive_chunks():
+    hits = [
+        {"id": "a.pdf_chunk_2", "document": "two", "metadata": {"page": 2}},
+        {"id": "b.pdf_chunk_0", "document": "other"},
+        {"id": "a.pdf_chunk_1", "document": "one", "metadata": {"page": 1}},
+        {"id": "a.pdf_chunk_5", "document": "five"},
+    ]
+    passages = merge_adjacent(hits, 50)
+    assert [passage["ids"] for passage in passages] == [["a.pdf_chunk_1", "a.pdf_chunk_2"], ["b.pdf_chunk_0"], ["a.pdf_chunk_5"]]
+    assert passages[0]["document"] == "one\ntwo"
+    assert passages[0]["pages"] == [1, 2]
+    assert passages[0]["rank"] == 0
+
+
+def test_trim_to_match_keeps_best_sentence_and_neighbours():
+    text = "Mở đầu. Thời tiết đẹp. Doanh thu tăng mạnh. Kết luận. Phụ lục."
+    excerpt = trim_to_match(text, {"doanh", "thu"}, 200)
+    assert excerpt == "…Thời tiết đẹp. Doanh thu tăng mạnh. Kết luận.…"
+    assert trim_to_match(text, {"xyz"}, 200) == text
+    assert len(trim_to_match(text, {"xyz"}, 20)) <= 20
+    assert trim_to_match(text, {"doanh"}, 0) == ""
+
+
+def test_format_pages():
+    assert format_pages([]) is None
+    assert format_pages([5, 5]) == 5
+    assert format_pages([6, 5]) == "5-6"
+
+
+def test_pack_passages_respects_budget():
+    passages = [
+        {"source": "a.pdf", "document": "Doanh thu tăng. " * 20, "pages": [3]},
+        {"source": "b.pdf", "document": "Doanh thu giảm. " * 20},
+    ]
+    packed = pack_passages(passages, "doanh thu", 150, min_chars=50)
+    assert packed[0]["source"] == "a.pdf"
+    assert packed[0]["page"] == 3
+    assert sum(len(entry["text"]) for entry in packed) <= 150
+    assert pack_passages(passages, "doanh thu", 40, min_chars=50) == []
+
+
+def candidates(*ids):
+    return [{"id": doc_id, "score": 1 / (rank + 1), "document": doc_id.upper()} for rank, doc_id in enumerate(ids)]
+
+
+def test_assign_by_rank_gives_each_chunk_to_its_best_query():
+    assigned = assign_by_rank([candidates("a", "b", "c"), candidates("b", "d"), candidates("a", "c", "e")])
+    assert [[c["id"] for c in query] for query in assigned] == [["a"], ["b", "d"], ["c", "e"]]
+    assert assign_by_rank([]) == []
+
+
+def test_fuse_candidates_across_shards():
+    shared, uploads = candidates("s1", "s2"), candidates("u1", "u2", "u3")
+    fused = fuse_candidates([shared, uploads], 3)
+    assert [c["id"] for c in fused] == ["s1", "u1", "s2"]
+    assert [c["score"] for c in fused] == [1, 1 / 2, 1 / 3]
+    assert fused[1]["document"] == "U1"
+    assert fuse_candidates([uploads], 2) is uploads
+    assert fuse_candidates([[], []], 3) == []
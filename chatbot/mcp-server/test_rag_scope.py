@@ -0,0 +1,59 @@
+import pytest
+
+from rag_scope import SHARED_FILTER, chroma_where, document_metadata, resolve_scope, scope_of, shard_for
+
+OWNERS = {"34": "12", "35": "12", "99": "7"}
+
+
+def test_document_metadata():
+    assert document_metadata("12_34_1750851614786.pdf") == {
+        "source": "12_34_1750851614786.pdf", "owner": "12", "conversation": "34", "shared": False
+    }
+    assert document_metadata("Bao cao thuong nien.pdf") == {"source": "Bao cao thuong nien.pdf", "shared": True}
+    assert scope_of({"source": "x", "owner": "12", "shared": False}) == {"owner": "12", "shared": False}
+
+
+def test_conversation_scope_includes_shared_documents():
+    assert resolve_scope("none", OWNERS, conversation_id=34) == {"main": [SHARED_FILTER, {"conversation": "34"}]}
+    assert resolve_scope("user", OWNERS, conversation_id="34") == {
+        "main": [SHARED_FILTER], "user_12": [{"conversation": "34"}]
+    }
+    assert resolve_scope("conversation", OWNERS, conversation_id="34") == {
+        "main": [SHARED_FILTER], "conversation_34": [{"conversation": "34"}]
+    }
+
+
+def test_owner_scope_covers_every_conversation_of_the_user():
+    assert resolve_scope("none", OWNERS, conversation_id="34", scope="owner") == {"main": [SHARED_FILTER, {"owner": "12"}]}
+    assert resolve_scope("user", OWNERS, conversation_id="34", scope="owner") == {
+        "main": [SHARED_FILTER], "user_12": [{"owner": "12"}]
+    }
+    assert resolve_scope("conversation", OWNERS, conversation_id="34", scope="owner") == {
+        "main": [SHARED_FILTER], "conversation_34": [{"owner": "12"}], "conversation_35": [{"owner": "12"}]
+    }
+    assert resolve_scope("none", OWNERS, user_id=7, scope="owner") == {"main": [SHARED_FILTER, {"owner": "7"}]}
+
+
+def test_unknown_conversation_searches_its_uploads_and_shared_documents():
+    # Nothing was uploaded to it yet, so its user is unknown.
+    assert resolve_scope("user", OWNERS, conversation_id="50", scope="owner") == {
+        "main": [SHARED_FILTER, {"conversation": "50"}]
+    }
+    assert resolve_scope("none", OWNERS) == {"main": [SHARED_FILTER]}
+    with pytest.raises(ValueError):
+        resolve_scope("none", OWNERS, conversation_id="34", scope="everyone")
+
+
+def test_shard_for():
+    assert shard_for("none", OWNERS, "12", "34") == "main"
+    assert shard_for("user", OWNERS, conversation="99") == "user_7"
+    assert shard_for("user", OWNERS) == "main"
+    assert shard_for("conversation", OWNERS, "12", "34") == "conversation_34"
+
+
+def test_chroma_where():
+    assert chroma_where({}) is None
+    assert chroma_where([SHARED_FILTER, {}]) is None
+    assert chroma_where({"conversation": "34"}) == {"conversation": "34"}
+    assert chroma_where([{"owner": "12", "conversation": "34"}]) == {"$and": [{"owner": "12"}, {"conversation": "34"}]}
+    assert chroma_where([SHARED_FILTER, {"conversation": "34"}]) == {"$or": [{"shared": True}, {"conversation": "34"}]}
@@ -0,0 +1,71 @@
+import result_cache
+from result_cache import ResultCache, result_size
+from sql_text import referenced_tables
+
+ROWS = {"columns": ["a"], "rows": [[1], [2]]}
+
+
+def test_hit_and_miss():
+    cache = ResultCache(max_bytes=10_000)
+    assert cache.get("k") is None
+    cache.put("k", ROWS, {"t"}, markers={"t": 3})
+    entry = cache.get("k")
+    assert entry["result"] == ROWS
+    assert entry["markers"] == {"t": 3}
+    cache.hit(entry)
+    stats = cache.stats
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+    assert stats["bytes_saved"] == result_size(ROWS)
+
+
+def test_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(result_cache.time, "time", lambda: now[0])
+    cache = ResultCache(max_bytes=10_000, ttl_seconds=60)
+    cache.put("k", ROWS, {"t"})
+    now[0] += 61
+    assert cache.get("k") is None
+    assert cache.stats["bytes"] == 0
+
+
+def test_evicts_least_recently_used():
+    size = result_size(ROWS)
+    cache = ResultCache(max_bytes=2 * size)
+    cache.put("a", ROWS, {"t"})
+    cache.put("b", ROWS, {"t"})
+    cache.get("a")
+    cache.put("c", ROWS, {"t"})
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.stats["evictions"] == 1
+    assert cache.stats["bytes"] == 2 * size
+
+
+def test_oversized_results_are_not_stored():
+    cache = ResultCache(max_bytes=10)
+    cache.put("k", ROWS, {"t"})
+    assert cache.stats["entries"] == 0
+    assert not ResultCache(max_bytes=0).enabled
+
+
+def test_invalidate_tables():
+    cache = ResultCache(max_bytes=10_000)
+    cache.put("orders", ROWS, {"orders"})
+    cache.put("join", ROWS, {"orders", "items"})
+    cache.put("customers", ROWS, {"customers"})
+    cache.invalidate_tables({"items"})
+    assert cache.get("join") is None
+    assert cache.get("orders") is not None
+    cache.discard("orders")
+    assert cache.stats["invalidations"] == 2
+    cache.invalidate_tables()
+    assert cache.stats["entries"] == 0
+    assert cache.stats["bytes"] == 0
+
+
+def test_comma_joined_tables_are_invalidated():
+    cache = ResultCache(max_bytes=10_000)
+    query = "SELECT * FROM shop.orders o, shop.customers c WHERE o.customer_id = c.id"
+    cache.put(query, ROWS, referenced_tables(query))
+    cache.invalidate_tables(referenced_tables("UPDATE shop.customers SET name = 'x' WHERE id = 1"))
+    assert cache.get(query) is None
@@ -0,0 +1,75 @@
+import datetime
+import decimal
+
+import pytest
+
+from result_encoding import column_type, decode_columnar, dictionary_encode, encode_result, encode_text
+
+HEADERS = ["ticker", "day", "close", "volume", "note"]
+ROWS = [
+    ("HPG", datetime.date(2024, 1, 2), decimal.Decimal("27.5"), 100, None),
+    ("HPG", datetime.date(2024, 1, 3), decimal.Decimal("28"), 200, "a|b"),
+    ("VNM", datetime.date(2024, 1, 2), 70, None, "x\ny"),
+    ("HPG", datetime.date(2024, 1, 4), 29.25, 50, None),
+]
+
+
+def test_column_type():
+    assert column_type([1, None, 2]) == "int"
+    assert column_type([1, 2.5]) == "float"
+    assert column_type([True, False]) == "bool"
+    assert column_type([1, "a"]) == "str"
+    assert column_type([None, None]) == "null"
+    assert column_type([datetime.datetime(2024, 1, 1)]) == "datetime"
+
+
+def test_dictionary_encode_only_repeated_values():
+    assert dictionary_encode(["a", "b", "a", None, "a"]) == (["a", "b"], [0, 1, 0, None, 0])
+    assert dictionary_encode(["a", "b", "c"]) is None
+
+
+def test_columnar_round_trip():
+    result = encode_result({"headers": HEADERS, "data": ROWS, "truncated": False}, "columnar")
+    assert result["format"] == "columnar"
+    assert result["truncated"] is False
+    assert "data" not in result
+    ticker, _, close = result["columns"][:3]
+    assert ticker["dictionary"] == ["HPG", "VNM"]
+    assert close["type"] == "float"
+    rows = decode_columnar(result)
+    assert rows[1] == {"ticker": "HPG", "day": "2024-01-03", "close": 28.0, "volume": 200, "note": "a|b"}
+    assert rows[2]["volume"] is None
+
+
+def test_text_escapes_cells():
+    lines = encode_text(HEADERS, ROWS).split("\n")
+    assert lines[0] == "ticker:str|day:date|close:float|volume:int|note:str"
+    assert lines[1] == "HPG|2024-01-02|27.5|100|NULL"
+    assert lines[2].endswith("|a\\|b")
+    assert lines[3].endswith("|x\\ny")
+    assert len(lines) == 5
+
+
+def test_empty_result():
+    result = encode_result({"headers": ["a"], "data": []}, "columnar")
+    assert result["row_count"] == 0
+    assert result["columns"] == [{"name": "a", "type": "null", "values": []}]
+
+
+def test_rows_and_errors_pass_through():
+    result = {"headers": HEADERS, "data": ROWS}
+    assert encode_result(result, "rows") is result
+    assert encode_result({"error": "x"}, "text") == {"error": "x"}
+    with pytest.raises(ValueError):
+        encode_result(result, "xml")
+
+
+def test_arrow_round_trip():
+    pytest.importorskip("pyarrow")
+    from result_encoding import decode_arrow
+
+    result = encode_result({"headers": HEADERS + ["close"], "data": [row + (1,) for row in ROWS]}, "arrow")
+    frame = decode_arrow(result["arrow_ipc_base64"])
+    assert list(frame.columns) == HEADERS + ["close_1"]
+    assert list(frame["ticker"]) == ["HPG", "HPG", "VNM", "HPG"]
+    assert frame["close"].tolist() == [27.5, 28.0, 70.0, 29.25]
@@ -0,0 +1,58 @@
+import schema_cache
+from schema_cache import SchemaCache, split_identifier, table_document
+
+TABLES = {
+    "orders": {"id": "int", "orderDate": "date", "customer_id": "int", "primary_key": "id"},
+    "customers": {"id": "int", "full_name": "varchar(100)", "primary_key": "id"},
+    "stock_prices": {"ticker": "varchar(10)", "close_price": "decimal", "primary_key": "ticker"},
+}
+
+
+def test_split_identifier():
+    assert split_identifier("orderDate") == ["order", "date"]
+    assert split_identifier("customer_id2") == ["customer", "id", "2"]
+    assert split_identifier("HTTPCode") == ["http", "code"]
+
+
+def test_table_document_contains_split_words():
+    document = table_document("stock_prices", {"closePrice": "decimal"})
+    assert "stock prices" in document
+    assert "close price" in document
+
+
+def test_fingerprint_check_and_reload(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(schema_cache.time, "time", lambda: now[0])
+    cache = SchemaCache(check_seconds=30)
+    assert cache.needs_check("shop")
+    assert cache.put("shop", "fp1", TABLES)["version"] == 1
+    assert not cache.needs_check("shop")
+    now[0] += 30
+    assert cache.needs_check("shop")
+    assert cache.confirm("shop", "fp1")
+    assert not cache.needs_check("shop")
+    assert not cache.confirm("shop", "fp2")
+    assert not cache.confirm("other", "fp1")
+    assert cache.put("shop", "fp2", TABLES)["version"] == 2
+    assert cache.info()["databases"]["shop"]["version"] == 2
+    assert cache.info()["reloads"] == 2
+
+
+def test_relevant_tables_ranks_by_question():
+    cache = SchemaCache()
+    cache.put("shop", "fp", TABLES)
+    relevant = cache.relevant_tables("shop", "orders by order date", max_tables=1)
+    assert list(relevant["tables"]) == ["orders"]
+    assert set(relevant["other_tables"]) == {"customers", "stock_prices"}
+    assert relevant["version"] == 1
+
+
+def test_wide_tables_keep_key_and_matching_columns():
+    columns = {f"col_{i}": "int" for i in range(30)}
+    columns.update({"id": "int", "closePrice": "decimal", "primary_key": "id"})
+    cache = SchemaCache()
+    cache.put("market", "fp", {"prices": columns})
+    sliced = cache.relevant_tables("market", "prices close price", max_columns=5)["tables"]["prices"]
+    assert {"id", "closePrice", "primary_key"} <= set(sliced)
+    assert len(sliced) == 6
+    assert sliced["omitted_columns"] == len(columns) - 5
@@ -0,0 +1,118 @@
+import threading
+
+import mysql.connector
+import pytest
+
+from sql_pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    def __init__(self):
+        self.alive = True
+        self.closed = False
+        self.pings = 0
+        self.connected_checks = 0
+
+    def ping(self, reconnect=False):
+        self.pings += 1
+        if not self.alive:
+            raise mysql.connector.InterfaceError("gone away")
+
+    def is_connected(self):
+        self.connected_checks += 1
+        return self.alive
+
+    def close(self):
+        self.closed = True
+
+
+def make_pool(**kwargs):
+    created = []
+
+    def connect():
+        created.append(FakeConnection())
+        return created[-1]
+
+    return ConnectionPool(connect, **kwargs), created
+
+
+def test_connections_are_reused():
+    pool, created = make_pool(size=2)
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        assert second is first
+    assert len(created) == 1
+    assert pool.stats["checkouts"] == 2
+    assert pool.stats["in_use"] == 0
+    assert pool.stats["idle"] == 1
+
+
+def test_checkout_times_out_when_pool_is_full():
+    pool, _ = make_pool(size=1)
+    held = pool.acquire()
+    with pytest.raises(PoolTimeout):
+        pool.acquire(timeout=0.01)
+    assert pool.stats["timeouts"] == 1
+    pool.release(held)
+    pool.release(pool.acquire(timeout=0.01))
+
+
+def test_waiter_gets_released_connection():
+    pool, created = make_pool(size=1)
+    held = pool.acquire()
+    threading.Timer(0.05, pool.release, args=(held,)).start()
+    assert pool.acquire(timeout=2) is held
+    assert pool.stats["waits"] == 1
+    assert len(created) == 1
+
+
+def test_dead_idle_connection_is_replaced():
+    pool, created = make_pool(ping_after_seconds=0)
+    with pool.connection() as first:
+        pass
+    first.alive = False
+    with pool.connection() as second:
+        assert second is not first
+    assert first.closed
+    assert pool.stats["reconnects"] == 1
+    assert len(created) == 2
+
+
+def test_broken_connection_is_discarded():
+    pool, created = make_pool()
+    with pytest.raises(mysql.connector.OperationalError):
+        with pool.connection() as first:
+            raise mysql.connector.OperationalError("lost")
+    assert first.closed
+    assert pool.stats["discarded"] == 1
+    assert pool.stats["idle"] == 0
+
+
+def test_release_does_not_reach_the_server():
+    pool, created = make_pool(ping_after_seconds=60)
+    for _ in range(3):
+        with pool.connection():
+            pass
+    assert (created[0].pings, created[0].connected_checks) == (0, 0)
+    assert pool.stats["idle"] == 1
+
+
+def test_failed_connect_frees_the_slot():
+    def connect():
+        raise mysql.connector.InterfaceError("refused")
+
+    pool = ConnectionPool(connect, size=1)
+    for _ in range(2):
+        with pytest.raises(mysql.connector.InterfaceError):
+            pool.acquire(timeout=0.01)
+    assert pool.stats["timeouts"] == 0
+
+
+def test_close_all():
+    pool, created = make_pool()
+    with pool.connection():
+        pass
+    pool.close_all()
+    assert created[0].closed
+    assert pool.stats["idle"] == 0
@@ -0,0 +1,139 @@
+import json
+
+import mysql.connector
+import pytest
+
+from sql_sources import DataSource, Server, SourceRegistry, load_sources, parse_hosts, replication_lag
+from sql_text import referenced_databases
+
+
+def make_server(name, role="replica"):
+    return Server(name, role, "localhost", 3306, "root", "", {})
+
+
+def make_source(name="default", replicas=2, **kwargs):
+    return DataSource(
+        name, make_server(f"{name}/primary", "primary"),
+        [make_server(f"{name}/replica-{i + 1}") for i in range(replicas)], **kwargs
+    )
+
+
+def test_parse_hosts():
+    assert parse_hosts("r1, r2:3307,,", 3306) == [("r1", 3306), ("r2", 3307)]
+    assert parse_hosts(None, 3306) == []
+
+
+def test_writes_go_to_the_primary():
+    source = make_source()
+    assert source.route(read_only=False) == [source.primary]
+
+
+def test_reads_rotate_over_replicas_then_fall_back():
+    source = make_source()
+    first, second = source.route(read_only=True), source.route(read_only=True)
+    assert first[-2:] == [source.primary, source.primary]
+    assert {first[0].name, second[0].name} == {"default/replica-1", "default/replica-2"}
+    assert make_source(replicas=0).route(read_only=True)[0].role == "primary"
+
+
+def test_reads_after_a_write_stay_on_the_primary():
+    source = make_source(read_after_write_seconds=60)
+    source.wrote()
+    assert source.route(read_only=True) == [source.primary, source.primary]
+    source = make_source(read_after_write_seconds=0)
+    source.wrote()
+    assert source.route(read_only=True)[0].role == "replica"
+
+
+def test_mark_down_skips_replicas_but_not_the_primary():
+    source = make_source()
+    replica = source.replicas[0]
+    source.mark_down(replica, 60, "lost connection")
+    assert not replica.available
+    assert replica.failovers == 1
+    assert replica not in source.route(read_only=True)
+    source.mark_down(source.primary, 60, "lost connection")
+    assert source.primary.available
+    assert source.primary_only.route(read_only=True) == [source.primary, source.primary]
+
+
+class FakeCursor:
+    def __init__(self, results):
+        self.results = results
+        self.rows = None
+
+    def execute(self, statement):
+        result = self.results[statement]
+        if isinstance(result, Exception):
+            raise result
+        self.rows = result
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, results):
+        self.results = results
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self.results)
+
+
+def test_replication_lag():
+    unknown = mysql.connector.ProgrammingError("unknown statement")
+    assert replication_lag(FakeConnection({"SHOW REPLICA STATUS": [{"Seconds_Behind_Source": 3}]})) == 3.0
+    assert replication_lag(FakeConnection({
+        "SHOW REPLICA STATUS": unknown, "SHOW SLAVE STATUS": [{"Seconds_Behind_Master": None}]
+    })) == float("inf")
+    assert replication_lag(FakeConnection({"SHOW REPLICA STATUS": []})) is None
+    with pytest.raises(mysql.connector.OperationalError):
+        replication_lag(FakeConnection({"SHOW REPLICA STATUS": mysql.connector.OperationalError("gone")}))
+
+
+def test_for_databases():
+    default, analytics = make_source("default", 0), make_source("analytics", 0)
+    registry = SourceRegistry({"default": default, "analytics": analytics}, {"events": "analytics"})
+    assert registry.for_database("shop") is default
+    assert registry.for_databases(["events", "information_schema"]) is analytics
+    assert registry.for_databases([]) is default
+    with pytest.raises(ValueError, match="different servers"):
+        registry.for_databases(["events", "shop"])
+
+
+def test_comma_joins_are_routed_by_every_table():
+    default, analytics = make_source("default", 0), make_source("analytics", 0)
+    registry = SourceRegistry({"default": default, "analytics": analytics}, {"events": "analytics"})
+    assert registry.for_databases(referenced_databases("SELECT * FROM clicks c, events.sessions s")) is analytics
+    with pytest.raises(ValueError, match="different servers"):
+        registry.for_databases(referenced_databases("SELECT * FROM shop.orders o, events.sessions s WHERE 1"))
+    with pytest.raises(ValueError, match="different servers"):
+        registry.for_databases(referenced_databases(
+            "SELECT * FROM shop.orders WHERE id IN (SELECT order_id FROM shop.items i, events.clicks c)"
+        ))
+
+
+def test_load_sources(tmp_path):
+    path = tmp_path / "tool_source.json"
+    path.write_text(json.dumps({"databases": [
+        {"name": "shop"}, {"name": "events", "source": "analytics"}, {"name": "old", "source": "legacy"}
+    ]}))
+    environ = {
+        "MYSQL_HOST": "db", "MYSQL_USER": "app", "MYSQL_REPLICAS": "db-r1,db-r2:3307",
+        "SQL_SOURCES": "analytics", "SQL_SOURCE_ANALYTICS_HOST": "olap", "SQL_SOURCE_ANALYTICS_PORT": "3310"
+    }
+    registry, unknown = load_sources(str(path), {}, environ=environ)
+    assert unknown == ["legacy"]
+    default, analytics = registry.sources["default"], registry.sources["analytics"]
+    assert [(s.host, s.port) for s in default.servers] == [("db", 3306), ("db-r1", 3306), ("db-r2", 3307)]
+    assert (analytics.primary.host, analytics.primary.port) == ("olap", 3310)
+    assert analytics.primary._user == "app"
+    assert registry.for_database("events") is analytics
+    assert registry.for_database("old") is default
+
+    registry, unknown = load_sources(str(tmp_path / "missing.json"), {}, environ={})
+    assert list(registry.sources) == ["default"]
+    assert registry.default.primary.host == "localhost"
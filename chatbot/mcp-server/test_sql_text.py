@@ -0,0 +1,111 @@
+from sql_text import (
+    add_execution_time_hint, add_limit, count_statement, first_keyword, has_aggregate, is_pageable, is_read_only,
+    is_single_statement, is_volatile, normalize_sql, page_statement, referenced_databases, referenced_tables, strip_comments
+)
+
+
+def test_strip_comments_keeps_quoted_text():
+    assert strip_comments("SELECT 'a#b', \"c -- d\", `e#f` # note") == "SELECT 'a#b', \"c -- d\", `e#f`  "
+    assert strip_comments("SELECT 1 /* x */ -- y\nFROM t") == "SELECT 1    \nFROM t"
+    assert strip_comments("SELECT 'it''s #1'") == "SELECT 'it''s #1'"
+    assert strip_comments(r"SELECT 'a\'#b'") == r"SELECT 'a\'#b'"
+
+
+def test_double_dash_needs_whitespace():
+    assert strip_comments("SELECT 5--1") == "SELECT 5--1"
+    assert strip_comments("SELECT 5 --") == "SELECT 5  "
+
+
+def test_single_statement():
+    assert is_single_statement("SELECT 1")
+    assert is_single_statement("SELECT 1;  ")
+    assert is_single_statement("SELECT ';' AS a, `b;c` FROM t -- ; trailing")
+    assert not is_single_statement("SELECT 1; DROP TABLE db.t")
+    assert not is_single_statement("SELECT 1 /* ; */; SELECT 2")
+
+
+def test_read_only():
+    assert is_read_only("  (SELECT 1)")
+    assert is_read_only("/* DELETE */ SHOW TABLES")
+    assert is_read_only("WITH x AS (SELECT 'DELETE' AS a) SELECT * FROM x")
+    assert not is_read_only("WITH x AS (SELECT 1) DELETE FROM t")
+    assert not is_read_only("UPDATE t SET a = 1")
+    assert not is_read_only("SELECT 1; DROP TABLE db.t")
+    assert not is_read_only("SELECT 'x'; DROP TABLE db.t;")
+
+
+def test_first_keyword_skips_comments():
+    assert first_keyword("-- hi\n/* there */ select 1") == "SELECT"
+    assert first_keyword("") == ""
+
+
+def test_normalize_sql_keeps_literals_apart():
+    # Result cache keys: statements differing only after a # or -- in a literal must not collide.
+    assert normalize_sql("SELECT * FROM t WHERE code = 'A#1'") != normalize_sql("SELECT * FROM t WHERE code = 'A#2'")
+    assert normalize_sql("SELECT * FROM t WHERE c LIKE '%--%' AND d = 1") == "SELECT * FROM t WHERE c LIKE '%--%' AND d = 1"
+
+
+def test_normalize_sql_collapses_layout():
+    assert normalize_sql("SELECT  a,\n  b -- note\nFROM t ;") == "SELECT a, b FROM t"
+    assert normalize_sql("SELECT 'a  b'") == "SELECT 'a  b'"
+
+
+def test_volatile_and_tables():
+    assert is_volatile("SELECT NOW()")
+    assert not is_volatile("SELECT a FROM t -- RAND()")
+    assert referenced_tables("SELECT * FROM db.`Orders` o JOIN items ON 1") == {"orders", "items"}
+
+
+def test_referenced_tables_of_comma_joins():
+    assert referenced_tables("SELECT * FROM shop.orders o, shop.customers c WHERE o.customer_id = c.id") == {
+        "orders", "customers"
+    }
+    assert referenced_tables("SELECT * FROM a JOIN b ON a.x = b.x, `c` AS cc, d.e WHERE 1") == {"a", "b", "c", "e"}
+    assert referenced_tables("SELECT * FROM (SELECT 1 FROM p, q) AS t, r ORDER BY 1") == {"p", "q", "r"}
+    assert referenced_tables("SELECT * FROM a WHERE EXISTS (SELECT 1 FROM b, c WHERE b.id IN (1, 2)) AND d > 0") == {
+        "a", "b", "c"
+    }
+    assert referenced_tables("UPDATE a, b SET a.x = 1, b.y = 2 WHERE a.id = b.id") == {"a", "b"}
+    # Commas in literals and select lists are not list items.
+    assert referenced_tables("SELECT x, y FROM t WHERE note = 'FROM u, v'") == {"t"}
+    assert referenced_tables("SELECT 1 FROM DUAL") == set()
+
+
+def test_add_limit_keeps_quoted_comment_characters():
+    assert add_limit("select * from t where a = '#1' ", 10) == "select * from t where a = '#1' LIMIT 10"
+    assert add_limit("SELECT * FROM t WHERE b LIKE '--x' -- why\n", 5) == "SELECT * FROM t WHERE b LIKE '--x' LIMIT 5"
+
+
+def test_add_limit():
+    assert add_limit("SELECT * FROM t LIMIT 3;", 10) == "SELECT * FROM t LIMIT 3"
+    assert add_limit("SELECT * FROM t FOR UPDATE", 10) == "SELECT * FROM t LIMIT 10 FOR UPDATE"
+
+
+def test_add_execution_time_hint():
+    assert add_execution_time_hint("SELECT 1", 2.5) == "SELECT /*+ MAX_EXECUTION_TIME(2500) */ 1"
+    assert add_execution_time_hint(" (select a FROM t)", 0) == " (SELECT /*+ MAX_EXECUTION_TIME(1) */ a FROM t)"
+    assert add_execution_time_hint("SHOW TABLES", 1) == "SHOW TABLES"
+
+
+def test_paging_statements():
+    assert is_pageable("WITH x AS (SELECT 1) SELECT * FROM x")
+    assert not is_pageable("SHOW TABLES")
+    assert page_statement("SELECT a FROM t;", 20, 10) == "SELECT * FROM (\nSELECT a FROM t\n) AS page_rows LIMIT 10 OFFSET 20"
+    assert count_statement(" SELECT a FROM t ; ") == "SELECT COUNT(*) FROM (\nSELECT a FROM t\n) AS counted_rows"
+
+
+def test_has_aggregate():
+    assert has_aggregate("SELECT COUNT (*) FROM t")
+    assert has_aggregate("SELECT DISTINCT a FROM t")
+    assert has_aggregate("SELECT a FROM t GROUP  BY a")
+    assert not has_aggregate("SELECT counter FROM t -- GROUP BY a")
+
+
+def test_referenced_databases():
+    assert referenced_databases("SELECT * FROM shop.orders o JOIN `crm`.`customers` c ON 1") == {"shop", "crm"}
+    assert referenced_databases("SELECT * FROM orders") == set()
+    assert referenced_databases("SHOW COLUMNS FROM orders IN `shop`") == {"shop"}
+    assert referenced_databases("SELECT * FROM orders o, crm.customers c") == {"crm"}
+    assert referenced_databases("SELECT * FROM shop.orders o WHERE o.id IN (SELECT order_id FROM x, events.clicks)") == {
+        "shop", "events"
+    }
@@ -42,6 +42,10 @@ const bucketName = process.env.MINIO_BUCKET || 'chat-files';
     }
 })();
 
+// Tabular files the MCP table service can query (CSV/TSV/Excel/Parquet)
+const TABLE_EXTENSIONS = ['csv', 'tsv', 'xlsx', 'xls', 'parquet'];
+const isTableFile = (name) => TABLE_EXTENSIONS.includes(name.split('.').pop().toLowerCase());
+
 // Configure multer for file upload
 const upload = multer({
     storage: multer.memoryStorage(),
@@ -49,11 +53,11 @@ const upload = multer({
         fileSize: 20 * 1024 * 1024, // 20MB limit
     },
     fileFilter: (req, file, cb) => {
-        // Allow only PDF files
-        if (file.mimetype === 'application/pdf') {
+        // Allow PDF files and tabular data files
+        if (file.mimetype === 'application/pdf' || isTableFile(file.originalname)) {
             cb(null, true);
         } else {
-            cb(new Error('Only PDF files are allowed'), false);
+            cb(new Error('Only PDF, CSV, Excel and Parquet files are allowed'), false);
         }
     }
 });
@@ -361,8 +365,9 @@ router.post('/conversations/:id/upload', authenticateToken, upload.single('file'
             }
         );
 
-        // Save to data folder for RAG processing (only for PDF files)
-        if (file.mimetype === 'application/pdf') {
+        // Save to data folder for RAG processing (PDF files) or table queries (tabular files).
+        // When the MCP services read straight from MinIO the extra copy is not needed.
+        if ((file.mimetype === 'application/pdf' || isTableFile(originalName)) && process.env.RAG_INGEST_SOURCE !== 'minio') {
             // Create data directory if it doesn't exist
             const dataDir = join(__dirname, "../", "../", '../chatbot/mcp-server/data');
             try {
@@ -372,10 +377,10 @@ router.post('/conversations/:id/upload', authenticateToken, upload.single('file'
                 logMessage("INF", `Created data directory: ${dataDir}`);
             }
 
-            // Save PDF file to data directory
+            // Save file to data directory
             const dataFilePath = join(dataDir, fileName);
             await fs.writeFile(dataFilePath, file.buffer);
-            logMessage("INF", `PDF saved to data folder for RAG processing: ${dataFilePath}`);
+            logMessage("INF", `File saved to data folder for processing: ${dataFilePath}`);
         }
 
         // Save file info to database
@@ -475,16 +480,35 @@ router.delete('/conversations/:id/files/:fileId', authenticateToken, async (req,
         // Delete from MinIO
         await minioClient.removeObject(bucketName, file.fileName);
 
+        // Uploaded tables are dropped by the table service once their file is gone
+        if (isTableFile(file.fileName) && process.env.RAG_INGEST_SOURCE !== 'minio') {
+            try {
+                await fs.unlink(join(__dirname, "../", "../", '../chatbot/mcp-server/data', file.fileName));
+            } catch (error) {
+                logMessage("WRN", `Could not delete table file from data folder: ${error.message}`);
+            }
+        }
+
         // Delete from data folder if it's a PDF
         if (file.mimeType === 'application/pdf') {
+            const dataDir = join(__dirname, "../", "../", '../chatbot/mcp-server/data');
+            const dataFilePath = join(dataDir, file.fileName);
             try {
-                const dataDir = join(__dirname, "../", "../", '../chatbot/mcp-server/data');
-                const dataFilePath = join(dataDir, file.fileName);
                 await fs.unlink(dataFilePath);
                 logMessage("INF", `PDF deleted from data folder: ${dataFilePath}`);
             } catch (error) {
                 logMessage("WRN", `Could not delete PDF from data folder: ${error.message}`);
             }
+
+            // Ask the RAG service to drop the file's indexed chunks. In MinIO ingest
+            // mode it notices the removed object by itself.
+            if (process.env.RAG_INGEST_SOURCE !== 'minio') {
+                try {
+                    await fs.writeFile(`${dataFilePath}.delete`, '');
+                } catch (error) {
+                    logMessage("WRN", `Could not request chunk deletion for ${file.fileName}: ${error.message}`);
+                }
+            }
         }
 
         // Delete from database
@@ -28,7 +28,7 @@ const ChatInput = ({
       <div className="flex items-center gap-3">
         <input
           type="file"
-          accept="application/pdf"
+          accept="application/pdf,.csv,.tsv,.xlsx,.xls,.parquet"
           onChange={handleFileChange}
           ref={fileInputRef}
           className="hidden"
@@ -252,8 +252,9 @@ const Chatbox = () => {
 
   const handleFileUpload = async (file) => {
     if (!file || !selectedConversationId) return;
-    if (file.type !== "application/pdf") {
-      setUploadError("Chỉ hỗ trợ file PDF");
+    const isTable = /\.(csv|tsv|xlsx|xls|parquet)$/i.test(file.name);
+    if (file.type !== "application/pdf" && !isTable) {
+      setUploadError("Chỉ hỗ trợ file PDF, CSV, Excel hoặc Parquet");
       return;
     }
     if (file.size > 20 * 1024 * 1024) {